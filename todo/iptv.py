@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
+import asyncio
 import os
-import subprocess
 import sys
 import time
 import re
@@ -25,6 +25,17 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from selenium.webdriver.chrome.service import Service
 import cloudscraper
+from iptv_browser import WebDriverPool, BrowserSupervisor, wait_for_page_load, capture_network_media_urls
+from iptv_verify import AIOHTTP_AVAILABLE, verify_streams_async, interleave_by_host, stream_host
+from iptv_hls import is_hls_url, probe_hls_sync, probe_media_sync, check_freshness_sync
+from iptv_ffprobe import ffprobe_stream_sync, describe_media
+from iptv_cache import VerificationCache
+from iptv_monitor import HealthMonitor
+from iptv_server import PlaylistServer
+from iptv_relay import HLSRelay
+from iptv_failover import FailoverRedirector
+from iptv_m3u import iter_m3u
+from iptv_groups import classify_group
 # import js2py  # Removido por compatibilidad
 # import execjs  # Removido por compatibilidad
 
@@ -83,12 +94,14 @@ class ProxyManager:
             return False
 
 class IPTVExtractor:
-    def __init__(self):
+    def __init__(self, driver_pool_size=3):
         self.proxy_manager = ProxyManager()
         self.session = requests.Session()
         self.cloudscraper = cloudscraper.create_scraper()
         self.setup_headers()
-        self.driver = None
+        self.browser_supervisor = BrowserSupervisor(max_browsers=driver_pool_size, max_memory_mb=1500)
+        self.driver_pool = WebDriverPool(size=driver_pool_size, supervisor=self.browser_supervisor)
+        self.verification_cache = VerificationCache()
         self.lock = threading.Lock()
         
     def setup_headers(self):
@@ -114,48 +127,15 @@ class IPTVExtractor:
         self.session.headers.update(headers)
         self.cloudscraper.headers.update(headers)
     
-    def setup_webdriver(self):
-        """Configura Selenium WebDriver con opciones anti-detección"""
-        if self.driver is not None:
-            return self.driver
-            
-        try:
-            options = Options()
-            options.add_argument('--headless')  # Modo headless por defecto
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            options.add_argument('--disable-extensions')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--disable-web-security')
-            options.add_argument('--allow-running-insecure-content')
-            options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            options.add_experimental_option('useAutomationExtension', False)
-            options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-            
-            # Intentar usar ChromeDriver
-            try:
-                self.driver = webdriver.Chrome(options=options)
-                # Ejecutar script para ocultar que es un bot
-                self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-                return self.driver
-            except Exception as e:
-                print(f"⚠️ No se pudo configurar Selenium: {e}")
-                return None
-                
-        except Exception as e:
-            print(f"Error configurando WebDriver: {e}")
-            return None
-    
     def make_request(self, url, use_proxy=False, use_cloudscraper=False, use_selenium=False):
         """Hace una petición usando diferentes métodos"""
         try:
             if use_selenium:
-                driver = self.setup_webdriver()
-                if driver:
-                    driver.get(url)
-                    time.sleep(3)  # Esperar a que cargue
-                    return driver.page_source
+                with self.driver_pool.driver() as driver:
+                    if driver:
+                        driver.get(url)
+                        wait_for_page_load(driver)
+                        return driver.page_source
                 
             # Desactivar proxies por defecto debido a problemas de conexión
             proxies = None
@@ -177,6 +157,18 @@ class IPTVExtractor:
             
         return None
     
+    def make_request_capturing_streams(self, url, timeout=15):
+        """Carga la página en Selenium capturando el tráfico de red: devuelve (page_source, media_urls)"""
+        try:
+            with self.driver_pool.driver() as driver:
+                if driver:
+                    media_urls = capture_network_media_urls(driver, url, timeout=timeout)
+                    return driver.page_source, media_urls
+        except Exception as e:
+            print(f"Error en petición Selenium a {url}: {e}")
+        
+        return None, []
+    
     def extract_from_javascript(self, content):
         """Extrae URLs de streams desde código JavaScript"""
         streams = []
@@ -805,23 +797,18 @@ class IPTVExtractor:
         
         return filtered_urls[:5]  # Retornar máximo 5 URLs
     
-    def verify_streams(self, m3u_file):
-        """Verifica streams de un archivo M3U"""
+    def verify_streams(self, m3u_file, freshness=False, force_refresh=False):
+        """Verifica streams de un archivo M3U (freshness: los HLS deben avanzar; force_refresh: ignora la caché)"""
         try:
             # Parsear archivo M3U
-            streams, channel_names, _ = parse_m3u(m3u_file)
-            if not streams:
+            stream_list = parse_m3u(m3u_file)
+            if not stream_list:
                 print("❌ No se encontraron streams en el archivo")
                 return 0
             
-            # Convertir a formato de diccionario
-            stream_list = []
-            for url, name in zip(streams, channel_names):
-                if name is not None:
-                    stream_list.append({'url': url, 'name': name})
-            
             # Verificar streams
-            results, offline_streams = check_streams_threaded(stream_list)
+            results, offline_streams = check_streams_threaded(stream_list, freshness=freshness,
+                                                              cache=self.verification_cache, force_refresh=force_refresh)
             
             # Contar streams online
             online_count = len(stream_list) - len(offline_streams)
@@ -838,80 +825,51 @@ class IPTVExtractor:
             return 0
     
     def close_driver(self):
-        """Cierra el WebDriver"""
-        if self.driver:
-            self.driver.quit()
-            self.driver = None
+        """Cierra todos los WebDrivers del pool y mata los navegadores rezagados"""
+        self.driver_pool.close()
+        self.browser_supervisor.shutdown()
 
 def parse_m3u(file_path):
-    """Parse an M3U file and extract stream URLs along with their channel names."""
-    streams = []
-    channel_names = []
-    original_lines = []
-    
+    """Streams {'url', 'name', 'group'} de un M3U, leído en streaming con iter_m3u
+
+    El nombre es tvg-name o, si falta, el título del #EXTINF; se omiten las
+    entradas marcadas con caracteres de estado (✦●✦, ❌, ✅)
+    """
+    stream_list = []
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            lines = file.readlines()
-            original_lines = lines
-            
-            for line in lines:
-                line = line.strip()
-                if line.startswith("#EXTINF:"):
-                    # Extract channel name (tvg-name)
-                    match = re.search(r'tvg-name="([^"]+)"', line)
-                    if match:
-                        channel_name = match.group(1)
-                        # Ignore lines with tvg-name containing special characters
-                        if not any(char in channel_name for char in ['✦●✦', '❌', '✅']):
-                            channel_names.append(channel_name)
-                        else:
-                            channel_names.append(None)  # Add None for this stream to skip later
-                    else:
-                        # Si no hay tvg-name, buscar el nombre al final
-                        parts = line.split(',')
-                        if len(parts) > 1:
-                            channel_names.append(parts[-1].strip())
-                        else:
-                            channel_names.append("Unknown Channel")
-                elif line and not line.startswith("#"):
-                    streams.append(line)
+        for entry in iter_m3u(file_path):
+            name = entry.tvg_name or entry.title or "Unknown Channel"
+            if any(char in name for char in ['✦●✦', '❌', '✅']):
+                continue
+            stream_list.append({'url': entry.url, 'name': name, 'group': entry.group_title})
     except FileNotFoundError:
         print(f"Error: File '{file_path}' not found.")
-        return [], [], []
+        return []
 
-    return streams, channel_names, original_lines
+    return stream_list
 
 def check_stream_ffprobe(url):
     """Check if a stream is online using ffprobe."""
-    try:
-        command = [
-            "ffprobe", 
-            "-hide_banner", 
-            "-loglevel", "error", 
-            "-i", url
-        ]
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=10)
-        if result.returncode == 0:
-            return True  # Stream is online
-        else:
-            return False  # Stream is offline
-    except subprocess.TimeoutExpired:
-        return False  # Timeout indicates offline stream
-    except Exception as e:
-        print(f"Error checking stream {url}: {e}")
-        return False
+    return ffprobe_stream_sync(url, timeout=10)['ok']
 
 def check_stream_requests(url):
-    """Verifica stream usando requests como alternativa a ffprobe"""
+    """Verifica stream usando requests como alternativa a ffprobe (sonda HLS nativa para .m3u8)"""
+    if is_hls_url(url):
+        return probe_hls_sync(url)['status'] == 'online'
     try:
         response = requests.head(url, timeout=10, allow_redirects=True)
         return response.status_code in [200, 206]  # 206 para contenido parcial
     except:
         return False
 
+def check_stream_freshness(url):
+    """Estado del live edge de un HLS: 'live', 'frozen' o 'dead'"""
+    return check_freshness_sync(url)['status']
+
 def generate_m3u_content(streams, title="IPTV Streams"):
     """Genera el contenido M3U a partir de una lista de streams"""
-    content = f"#EXTM3U\n"
+    # Líneas en una lista y un solo join: con content += el coste crece cuadráticamente con la lista
+    lines = ["#EXTM3U\n"]
     
     # Mapeo de nombres de fuentes más amigables
     source_names = {
@@ -934,19 +892,25 @@ def generate_m3u_content(streams, title="IPTV Streams"):
         # Obtener nombre amigable de la fuente
         source_display = source_names.get(source, source.upper())
         
-        # Agregar el nombre de la página al nombre del canal
+        # Agregar el nombre de la página al nombre del canal (y la calidad si se conoce)
         channel_name_with_source = f"{name} [{source_display}]"
+        if stream.get('media'):
+            channel_name_with_source += f" {describe_media(stream['media'])}"
         
-        content += f'#EXTINF:-1 tvg-name="{name}" tvg-logo="" group-title="{source_display}",{channel_name_with_source}\n'
-        content += f'{url}\n'
+        # Grupo por categoría con la misma tabla que iptv_definitivo (la fuente ya va en el título)
+        group_title = classify_group(name, source)
+        lines.append(f'#EXTINF:-1 tvg-name="{name}" tvg-logo="" group-title="{group_title}",{channel_name_with_source}\n')
+        lines.append(f'{url}\n')
     
-    return content
+    return ''.join(lines)
 
 def save_m3u_file(content, filename):
-    """Guarda el contenido M3U en un archivo"""
+    """Guarda el contenido M3U en un archivo (temporal + rename: nunca queda a medio escribir)"""
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
+        temp_path = f"{filename}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
             f.write(content)
+        os.replace(temp_path, filename)
         print(f"✅ Archivo guardado: {filename}")
     except Exception as e:
         print(f"❌ Error guardando archivo {filename}: {e}")
@@ -961,25 +925,108 @@ def display_progress_bar(current, total, prefix="Progress"):
         sys.stdout.write(f"\r{prefix}: {bar} {current}/{total} ({percentage}%)")
         sys.stdout.flush()
 
-def check_streams_threaded(streams, max_workers=10):
-    """Verifica streams usando múltiples hilos"""
+def format_stream_status(url, name, online, detail=None, media=None):
+    """Texto de estado de un stream ('Online - 1080p H264' / 'Offline - nombre - url (frozen)')"""
+    status = "Online" if online else f"Offline - {name} - {url}"
+    if detail and not online:
+        status += f" ({detail})"
+    if media:
+        status += f" - {describe_media(media)}"
+    return status
+
+def check_streams_threaded(streams, max_workers=50, per_host_limit=4, freshness=False, deep_probe=False, sniff=False,
+                           cache=None, force_refresh=False, autotune=True):
+    """Verifica streams con el verificador asíncrono (sniff/deep_probe: codec y resolución; cache: solo lo caducado)
+
+    autotune: max_workers es solo el punto de partida; la concurrencia se ajusta según throughput y errores
+    """
+    results = {}
+    offline_streams = []
+    mode = 'freshness' if freshness else 'liveness'
+    
+    if cache is not None:
+        cached, streams = cache.split(streams, mode=mode, force_refresh=force_refresh)
+        for stream, entry in cached:
+            detail = entry['status'] if entry['status'] not in ('online', 'offline') else None
+            status = format_stream_status(stream['url'], stream.get('name', ''), entry['online'], detail, entry.get('media'))
+            results[stream['url']] = status
+            if not entry['online']:
+                offline_streams.append(status)
+        if cached:
+            print(f"♻️ {len(cached)} resultados desde caché, {len(streams)} streams por verificar")
+    
+    down_hosts = {}
+    
+    def on_result(result, checked, total):
+        detail = result['freshness']['status'] if 'freshness' in result else None
+        if result.get('host_verdict'):
+            detail = f"host caído: {result['host_verdict']}"
+            host = urlparse(result['url']).netloc
+            down_hosts[host] = down_hosts.get(host, 0) + 1
+        status = format_stream_status(result['url'], result['name'], result['online'], detail, result.get('media'))
+        results[result['url']] = status
+        if not result['online']:
+            offline_streams.append(status)
+        if cache is not None:
+            cache.put_result(result, mode=mode)
+        display_progress_bar(checked, total, "🔍 Verificando streams")
+    
+    if streams and not AIOHTTP_AVAILABLE:
+        print("⚠️ aiohttp no disponible, usando verificación con hilos (pip install aiohttp)")
+        legacy_results, legacy_offline = check_streams_legacy_threaded(
+            streams, max_workers=min(max_workers, 10), per_host_limit=per_host_limit, freshness=freshness, sniff=sniff,
+            cache=cache)
+        results.update(legacy_results)
+        offline_streams.extend(legacy_offline)
+    elif streams:
+        try:
+            verify_streams_async(streams, max_concurrency=max_workers, per_host_limit=per_host_limit,
+                                 on_result=on_result, freshness=freshness, deep_probe=deep_probe, sniff=sniff,
+                                 autotune=autotune)
+        except Exception as e:
+            print(f"\n❌ Error verificando streams: {e}")
+        print("\n")
+        if down_hosts:
+            print(f"⚡ {sum(down_hosts.values())} streams marcados offline sin sondear ({len(down_hosts)} hosts caídos)")
+    
+    if cache is not None:
+        cache.save()
+    return results, offline_streams
+
+def check_streams_legacy_threaded(streams, max_workers=10, per_host_limit=4, freshness=False, sniff=False, cache=None):
+    """Verifica streams usando múltiples hilos (fallback sin aiohttp), por turnos entre hosts"""
     results = {}
     offline_streams = []
     checked_count = 0
+    progress_lock = threading.Lock()
+    host_limits = {}
+    # En orden de archivo los hilos acaban todos contra el mismo origen y este nos limita
+    streams = interleave_by_host(streams)
     
     def check_single_stream(stream_data):
         nonlocal checked_count
         url = stream_data['url']
         name = stream_data['name']
+        with progress_lock:
+            host_limit = host_limits.setdefault(stream_host(url), threading.BoundedSemaphore(per_host_limit))
         
-        # Intentar primero con requests, luego con ffprobe si está disponible
-        is_online = check_stream_requests(url)
-        if not is_online:
-            is_online = check_stream_ffprobe(url)
+        # Intentar primero con requests, luego con ffprobe si está disponible (no para HLS)
+        freshness_status = None
+        with host_limit:
+            if freshness and is_hls_url(url):
+                freshness_status = check_stream_freshness(url)
+                is_online = freshness_status == 'live'
+            else:
+                is_online = check_stream_requests(url)
+            if not is_online and not is_hls_url(url):
+                is_online = check_stream_ffprobe(url)
         
-        status = "Online" if is_online else f"Offline - {name} - {url}"
+        media = probe_media_sync(url)['media'] if is_online and sniff else None
+        status = format_stream_status(url, name, is_online, freshness_status, media)
+        if cache is not None:
+            cache.put(url, is_online, mode='freshness' if freshness else 'liveness', status=freshness_status, media=media)
         
-        with threading.Lock():
+        with progress_lock:
             results[url] = status
             if not is_online:
                 offline_streams.append(status)
@@ -1008,7 +1055,9 @@ def show_main_menu():
     print("="*60)
     print("1. 📡 Extraer streams de páginas web")
     print("2. ✅ Verificar archivo M3U existente")
-    print("3. 🚪 Salir")
+    print("3. 🩺 Monitor continuo de un archivo M3U")
+    print("4. 🌐 Servir playlists por HTTP")
+    print("5. 🚪 Salir")
     print("="*60)
 
 def show_extraction_menu():
@@ -1167,27 +1216,39 @@ def extract_direct_streams_from_channels():
     
     print(f"\n📡 Procesando {len(channels)} canales específicos...\n")
     
-    for i, channel in enumerate(channels, 1):
-        print(f"🔍 Canal {i}/{len(channels)}: {channel['name']}")
-        print(f"   📍 URL: {channel['url']}")
-        
-        try:
-            # Extraer streams directos de esta página específica
-            direct_streams = extract_direct_streams_from_page(extractor, channel['url'], channel['name'], channel['source'])
+    def process_channel(channel):
+        # Extraer streams directos de esta página específica
+        direct_streams = extract_direct_streams_from_page(extractor, channel['url'], channel['name'], channel['source'])
+        time.sleep(2)  # Pausa para no sobrecargar el servidor
+        return direct_streams
+    
+    # Un worker por driver del pool: el fallback a Selenium corre en paralelo
+    try:
+        with ThreadPoolExecutor(max_workers=extractor.driver_pool.size) as executor:
+            future_to_channel = {executor.submit(process_channel, channel): channel for channel in channels}
             
-            if direct_streams:
-                all_direct_streams.extend(direct_streams)
-                print(f"   ✅ Encontrados {len(direct_streams)} streams directos")
-                for j, stream in enumerate(direct_streams, 1):
-                    print(f"      {j}. {stream['url'][:80]}...")
-            else:
-                print(f"   ❌ No se encontraron streams directos")
+            for i, future in enumerate(as_completed(future_to_channel), 1):
+                channel = future_to_channel[future]
+                print(f"🔍 Canal {i}/{len(channels)}: {channel['name']}")
+                print(f"   📍 URL: {channel['url']}")
                 
-        except Exception as e:
-            print(f"   ❌ Error procesando {channel['name']}: {e}")
-        
-        print()  # Línea en blanco para separar
-        time.sleep(2)  # Pausa para no sobrecargar el servidor
+                try:
+                    direct_streams = future.result()
+                    
+                    if direct_streams:
+                        all_direct_streams.extend(direct_streams)
+                        print(f"   ✅ Encontrados {len(direct_streams)} streams directos")
+                        for j, stream in enumerate(direct_streams, 1):
+                            print(f"      {j}. {stream['url'][:80]}...")
+                    else:
+                        print(f"   ❌ No se encontraron streams directos")
+                        
+                except Exception as e:
+                    print(f"   ❌ Error procesando {channel['name']}: {e}")
+                
+                print()  # Línea en blanco para separar
+    finally:
+        extractor.close_driver()
     
     return all_direct_streams
 
@@ -1253,8 +1314,19 @@ def extract_direct_streams_from_page(extractor, page_url, channel_name, source):
     
     # Método 2: Con Selenium si no encontramos nada
     if not streams:
-        print(f"      🤖 Intentando con Selenium...")
-        selenium_content = extractor.make_request(page_url, use_selenium=True)
+        print(f"      🤖 Intentando con Selenium (captura de red)...")
+        selenium_content, network_urls = extractor.make_request_capturing_streams(page_url)
+        
+        # Manifiestos vistos en la red (XHR/fetch del player)
+        for network_url in network_urls:
+            if is_valid_direct_stream(network_url):
+                streams.append({
+                    'name': channel_name,
+                    'url': network_url,
+                    'source': source,
+                    'type': 'network'
+                })
+        
         if selenium_content:
             for pattern in direct_stream_patterns:
                 matches = re.findall(pattern, selenium_content, re.IGNORECASE)
@@ -1332,7 +1404,7 @@ def main():
     try:
         while True:
             show_main_menu()
-            main_choice = get_user_choice(3)
+            main_choice = get_user_choice(5)
             
             if main_choice == 1:
                 # Extraer streams
@@ -1377,7 +1449,8 @@ def main():
                                     channel_name_with_source = f"{stream['name']} [{source_display}]"
                                     
                                     # Generar entrada M3U
-                                    f.write(f"#EXTINF:-1 group-title=\"{source_display}\",{channel_name_with_source}\n")
+                                    group_title = classify_group(stream['name'], stream['source'])
+                                    f.write(f"#EXTINF:-1 group-title=\"{group_title}\",{channel_name_with_source}\n")
                                     f.write(f"{stream['url']}\n\n")
                             
                             print(f"📁 Archivo generado: {m3u_filename}")
@@ -1529,19 +1602,17 @@ def main():
                 print(f"🔍 Verificando streams en '{filename}'...")
                 
                 # Parsear archivo M3U
-                streams, channel_names, original_lines = parse_m3u(filename)
-                if not streams:
+                stream_list = parse_m3u(filename)
+                if not stream_list:
                     print("❌ No se encontraron streams en el archivo")
                     continue
                 
-                # Convertir a formato de diccionario
-                stream_list = []
-                for url, name in zip(streams, channel_names):
-                    if name is not None:  # Skip streams with special characters
-                        stream_list.append({'url': url, 'name': name})
-                
                 # Verificar streams
-                results, offline_streams = check_streams_threaded(stream_list)
+                freshness = input("🧊 ¿Detectar HLS congelados (el manifiesto debe avanzar)? (s/n): ").lower().strip() == 's'
+                sniff = input("📐 ¿Detectar codec y resolución (lee ~384 KB por stream)? (s/n): ").lower().strip() == 's'
+                force_refresh = input("♻️ ¿Ignorar la caché de verificación? (s/n): ").lower().strip() == 's'
+                results, offline_streams = check_streams_threaded(stream_list, freshness=freshness, sniff=sniff,
+                                                                  cache=VerificationCache(), force_refresh=force_refresh)
                 
                 # Mostrar resumen
                 online_count = len(stream_list) - len(offline_streams)
@@ -1558,6 +1629,51 @@ def main():
                         print(f"  ... y {len(offline_streams) - 10} más")
             
             elif main_choice == 3:
+                # Monitor continuo: reverifica por prioridad hasta Ctrl+C
+                filename = input("\n📁 Ingresa el nombre del archivo M3U: ")
+                if not os.path.exists(filename):
+                    print(f"❌ Archivo '{filename}' no encontrado")
+                    continue
+                
+                budget = input("⏱️ Presupuesto de sondeos por minuto (600): ").strip()
+                favorites = input("⭐ Canales prioritarios (regex separadas por comas, vacío = ninguno): ").strip()
+                freshness = input("🧊 ¿Detectar HLS congelados (el manifiesto debe avanzar)? (s/n): ").lower().strip() == 's'
+                monitor = HealthMonitor(
+                    filename,
+                    budget=int(budget) if budget.isdigit() else 600,
+                    favorites=[pattern.strip() for pattern in favorites.split(',') if pattern.strip()],
+                    freshness=freshness,
+                    cache=VerificationCache(),
+                )
+                print("🩺 Monitor en marcha (Ctrl+C para volver al menú)")
+                try:
+                    asyncio.run(monitor.run())
+                except KeyboardInterrupt:
+                    print("\n⚠️ Monitor detenido")
+                monitor.report()
+            
+            elif main_choice == 4:
+                # Servidor local: los reproductores piden la lista por HTTP (ETag, gzip, rangos, filtros)
+                if not AIOHTTP_AVAILABLE:
+                    print("❌ aiohttp no está instalado (pip install aiohttp)")
+                    continue
+                port = input("🔌 Puerto (8080): ").strip()
+                use_relay = input("🔁 ¿Activar relay HLS con caché compartida de segmentos? (s/n): ").lower().strip() == 's'
+                server = PlaylistServer('.', port=int(port) if port.isdigit() else 8080,
+                                        relay=HLSRelay() if use_relay else None,
+                                        failover=FailoverRedirector(VerificationCache()))
+                print("🌐 Sirviendo los .m3u de este directorio (Ctrl+C para volver al menú)")
+                print("   Ejemplos: /latest.m3u  /<nombre>.m3u?group=Deportes  /<nombre>.m3u?source=tvplusgratis2")
+                print("   Failover: /failover/<nombre>.m3u (cada canal salta solo a su mejor alternativa)")
+                if use_relay:
+                    print("   Relay: /relay/<nombre>.m3u (todos los reproductores comparten los segmentos descargados)")
+                try:
+                    asyncio.run(server.run())
+                except KeyboardInterrupt:
+                    print("\n⚠️ Servidor detenido")
+                server.report()
+            
+            elif main_choice == 5:
                 print("\n👋 ¡Gracias por usar IPTV Extractor Avanzado!")
                 break
                 
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🎛️ IPTV AUTOTUNE - Ajuste automático de la concurrencia durante la ejecución
+Escalada de colina sobre el throughput medido por ventanas: sube el límite
+mientras el rendimiento mejora, se queda quieto en la meseta y retrocede
+ante bloqueos, errores, latencia disparada o CPU local saturada
+"""
+
+import os
+import time
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+
+def cpu_load():
+    """Uso de CPU local en [0, 1] (psutil o loadavg / núcleos); None si no se puede medir"""
+    if PSUTIL_AVAILABLE:
+        return psutil.cpu_percent(interval=None) / 100
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ConcurrencyTuner:
+    """Límite de concurrencia que se reajusta cada ventana de muestras (record → ready → adjust)"""
+
+    def __init__(self, initial, min_limit=1, max_limit=64, min_samples=20, min_window=1.0, plateau=0.05,
+                 max_error_rate=0.10, max_block_rate=0.05, max_cpu=0.90, latency_factor=2.0, probe_every=4):
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.initial = self.limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.min_samples = min_samples
+        self.min_window = min_window
+        self.plateau = plateau
+        self.max_error_rate = max_error_rate
+        self.max_block_rate = max_block_rate
+        self.max_cpu = max_cpu
+        self.latency_factor = latency_factor
+        self.probe_every = probe_every
+
+        self.direction = 1
+        self.holds = 0
+        # Techo aprendido: no se vuelve a subir hasta el límite que provocó bloqueos o errores
+        self.ceiling = max_limit
+        self.previous_throughput = None
+        self.baseline_p95 = None
+        self.best = (0.0, self.limit)
+        self.history = []
+        self.last_metrics = None
+        self._reset_window()
+        if PSUTIL_AVAILABLE:
+            # La primera llamada de psutil.cpu_percent(None) siempre devuelve 0
+            psutil.cpu_percent(interval=None)
+
+    def _reset_window(self):
+        self.window_started = time.monotonic()
+        self.latencies = []
+        self.errors = 0
+        self.blocks = 0
+
+    def record(self, latency, ok=True, blocked=False):
+        """Una operación terminada: latencia (s), si falló por causas transitorias y si fue un bloqueo"""
+        if latency is not None:
+            self.latencies.append(latency)
+        if not ok:
+            self.errors += 1
+        if blocked:
+            self.blocks += 1
+
+    @property
+    def samples(self):
+        return len(self.latencies)
+
+    def ready(self):
+        """Ventana completa: bastantes muestras (2× el límite) y al menos min_window segundos"""
+        return (self.samples >= max(self.min_samples, 2 * self.limit)
+                and time.monotonic() - self.window_started >= self.min_window)
+
+    def _set(self, limit, reason, metrics):
+        limit = max(self.min_limit, min(int(round(limit)), self.ceiling))
+        if limit != self.limit:
+            self.history.append({'from': self.limit, 'to': limit, 'reason': reason, **metrics})
+        self.limit = limit
+        return limit
+
+    def adjust(self):
+        """Cierra la ventana actual, decide el nuevo límite y lo devuelve"""
+        elapsed = max(time.monotonic() - self.window_started, 1e-6)
+        samples = max(self.samples, 1)
+        # Goodput: las respuestas 429 rápidas no cuentan como rendimiento
+        good = max(0, self.samples - self.errors - self.blocks)
+        metrics = {
+            'throughput': round(good / elapsed, 2),
+            'p50': percentile(self.latencies, 0.50),
+            'p95': percentile(self.latencies, 0.95),
+            'error_rate': round(self.errors / samples, 3),
+            'block_rate': round(self.blocks / samples, 3),
+            'cpu': cpu_load(),
+        }
+        self.last_metrics = metrics
+        self._reset_window()
+
+        throughput = metrics['throughput']
+        if throughput > self.best[0]:
+            self.best = (throughput, self.limit)
+        if self.baseline_p95 is None and metrics['p95'] is not None:
+            self.baseline_p95 = metrics['p95']
+        previous = self.previous_throughput
+        self.previous_throughput = throughput
+
+        # Retrocesos: lo que indica que vamos demasiado rápido manda sobre el throughput
+        if metrics['block_rate'] > self.max_block_rate:
+            self.ceiling = max(self.min_limit, self.limit - 1)
+            return self._back_off(0.5, 'bloqueos', metrics)
+        if metrics['error_rate'] > self.max_error_rate:
+            self.ceiling = max(self.min_limit, self.limit - 1)
+            return self._back_off(0.75, 'errores', metrics)
+        if metrics['cpu'] is not None and metrics['cpu'] > self.max_cpu:
+            return self._back_off(0.8, 'cpu', metrics)
+        if (self.baseline_p95 and metrics['p95'] and metrics['p95'] > self.baseline_p95 * self.latency_factor
+                and previous is not None and throughput <= previous * (1 + self.plateau)):
+            return self._back_off(0.8, 'latencia', metrics)
+
+        if previous is None and self.history:
+            # Primera ventana tras un retroceso: solo sirve de nueva referencia
+            return self.limit
+
+        step = max(1, round(self.limit * 0.25))
+        if previous is None or throughput > previous * (1 + self.plateau):
+            # Mejora: seguir en la misma dirección (al principio, hacia arriba)
+            self.holds = 0
+            return self._set(self.limit + step * self.direction, 'mejora', metrics)
+        if throughput < previous * (1 - self.plateau):
+            # Empeoró: deshacer el último paso y quedarse en la meseta
+            self.direction = -self.direction
+            self.holds = 0
+            return self._set(self.limit + step * self.direction, 'empeora', metrics)
+
+        # Meseta: mantener y, de vez en cuando, tantear un escalón más
+        self.holds += 1
+        if self.holds >= self.probe_every:
+            self.holds = 0
+            self.direction = 1
+            return self._set(self.limit + step, 'tanteo', metrics)
+        return self.limit
+
+    def _back_off(self, factor, reason, metrics):
+        self.direction = 1
+        self.holds = 0
+        # El throughput de la ventana forzada no es comparable con el de la siguiente
+        self.previous_throughput = None
+        return self._set(self.limit * factor, reason, metrics)
+
+    def report(self):
+        return {
+            'initial': self.initial,
+            'limit': self.limit,
+            'best_limit': self.best[1],
+            'best_throughput': self.best[0],
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'ceiling': self.ceiling,
+            'adjustments': len(self.history),
+            'last': self.last_metrics,
+        }
+
+    def describe(self):
+        """Resumen de una línea para el final de la ejecución"""
+        report = self.report()
+        text = f"{report['initial']} → {report['limit']} (mejor: {report['best_limit']} a {report['best_throughput']:.1f}/s"
+        last = report['last']
+        if last:
+            text += f", p95 {last['p95'] or 0:.2f}s, errores {last['error_rate']:.0%}, bloqueos {last['block_rate']:.0%}"
+        return text + f", {report['adjustments']} ajustes)"
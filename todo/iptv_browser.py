@@ -0,0 +1,709 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🤖 IPTV BROWSER - Infraestructura de navegadores headless para los extractores
+Pool de Selenium WebDrivers reutilizables y thread-safe
+Captura de tráfico de red (performance logs) para detectar manifiestos m3u8
+Supervisor de procesos de navegador con presupuesto de memoria y deadlines
+"""
+
+import asyncio
+import atexit
+import itertools
+import json
+import os
+import queue
+import re
+import signal
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+try:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+    SELENIUM_AVAILABLE = True
+except ImportError:
+    SELENIUM_AVAILABLE = False
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Patrones de URLs de media (compartidos con el handler de respuestas de Playwright)
+MEDIA_URL_PATTERNS = [
+    # HLS Streams (más importantes)
+    r'https?://[^"\']*master\.m3u8[^"\']*',
+    r'https?://[^"\']*playlist\.m3u8[^"\']*',
+    r'https?://[^"\']*index\.m3u8[^"\']*',
+    r'https?://cdn\d*\.videok\.pro/[^"\']*\.m3u8[^"\']*',
+    r'https?://[^"\']*\.m3u8[^"\']*',
+    # Video files directos
+    r'https?://[^"\']*\.mp4[^"\']*',
+    r'https?://[^"\']*\.mkv[^"\']*',
+    r'https?://[^"\']*\.ts[^"\']*',
+    # Servicios de streaming conocidos
+    r'https?://[^"\']*doodstream[^"\']*',
+    r'https?://[^"\']*streamtape[^"\']*',
+    r'https?://[^"\']*vidmoly[^"\']*',
+    r'https?://[^"\']*okru[^"\']*',
+    r'https?://[^"\']*hlswish[^"\']*',
+    r'https?://[^"\']*streamhide[^"\']*',
+    r'https?://[^"\']*embed[^"\']*\.php',
+    r'https?://[^"\']*player[^"\']*'
+]
+
+IGNORED_MEDIA_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico']
+
+# MIME types con los que los servidores HLS entregan los manifiestos
+MANIFEST_MIME_TYPES = ['application/vnd.apple.mpegurl', 'application/x-mpegurl', 'audio/mpegurl', 'audio/x-mpegurl']
+
+_MEDIA_URL_REGEXES = [re.compile(pattern, re.IGNORECASE) for pattern in MEDIA_URL_PATTERNS]
+
+
+def is_media_url(url):
+    """Clasifica una URL de red como media (misma lógica que el sniffing de Playwright)"""
+    if not url:
+        return False
+    if any(url.lower().endswith(ext) for ext in IGNORED_MEDIA_EXTENSIONS):
+        return False
+    return any(regex.search(url) for regex in _MEDIA_URL_REGEXES)
+
+
+def is_manifest_url(url, mime_type=''):
+    """True si la URL (o su MIME type) corresponde a un manifiesto HLS"""
+    return '.m3u8' in url.lower() or (mime_type or '').lower() in MANIFEST_MIME_TYPES
+
+
+def build_chrome_options(user_agent=DEFAULT_USER_AGENT, capture_network=False):
+    """Opciones de Chrome anti-detección compartidas por todos los drivers"""
+    options = Options()
+    options.add_argument('--headless')  # Modo headless por defecto
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-web-security')
+    options.add_argument('--allow-running-insecure-content')
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    options.add_argument(f'--user-agent={user_agent}')
+    if capture_network:
+        # Performance logs = eventos DevTools Network.* (XHR incluidas)
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        # driver.get() vuelve en DOMContentLoaded; el resto se sigue por los logs
+        options.page_load_strategy = 'eager'
+    return options
+
+
+def create_chrome_driver(options=None):
+    """Crea un Chrome WebDriver con el script que oculta navigator.webdriver"""
+    if not SELENIUM_AVAILABLE:
+        return None
+
+    try:
+        driver = webdriver.Chrome(options=options or build_chrome_options())
+        # Ejecutar script para ocultar que es un bot
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        return driver
+    except Exception as e:
+        print(f"⚠️ No se pudo configurar Selenium: {e}")
+        return None
+
+
+def wait_for_page_load(driver, timeout=10, settle=0.5):
+    """Espera a document.readyState == 'complete' en lugar de un sleep fijo"""
+    try:
+        WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script("return document.readyState") == "complete"
+        )
+    except TimeoutException:
+        pass
+    # Margen corto para que los players inyecten sus fuentes
+    if settle:
+        time.sleep(settle)
+
+
+def read_network_media_urls(driver):
+    """Lee los performance logs pendientes y devuelve (media_urls, manifest_urls) en orden de aparición"""
+    media_urls = []
+    manifest_urls = []
+
+    try:
+        logs = driver.get_log('performance')
+    except Exception:
+        return media_urls, manifest_urls
+
+    for entry in logs:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError, TypeError):
+            continue
+
+        method = message.get('method')
+        params = message.get('params', {})
+        if method == 'Network.requestWillBeSent':
+            url = params.get('request', {}).get('url', '')
+            mime_type = ''
+        elif method == 'Network.responseReceived':
+            response = params.get('response', {})
+            url = response.get('url', '')
+            mime_type = response.get('mimeType', '')
+        else:
+            continue
+
+        if not url.startswith('http'):
+            continue
+
+        if is_manifest_url(url, mime_type):
+            if url not in manifest_urls:
+                manifest_urls.append(url)
+        elif is_media_url(url) and url not in media_urls:
+            media_urls.append(url)
+
+    return media_urls, manifest_urls
+
+
+def capture_network_media_urls(driver, url, timeout=15, poll_interval=0.25):
+    """Carga una página y devuelve las URLs de media vistas en la red, terminando en cuanto aparece un manifiesto"""
+    # Descartar eventos de la página anterior de este driver
+    read_network_media_urls(driver)
+
+    media_urls = []
+    manifest_urls = []
+    try:
+        driver.get(url)
+    except Exception as e:
+        print(f"⚠️ Error cargando {url[:60]}... en Selenium: {e}")
+
+    deadline = time.time() + timeout
+    while True:
+        new_media, new_manifests = read_network_media_urls(driver)
+        media_urls.extend(u for u in new_media if u not in media_urls)
+        manifest_urls.extend(u for u in new_manifests if u not in manifest_urls)
+
+        if manifest_urls or time.time() >= deadline:
+            break
+        time.sleep(poll_interval)
+
+    # Manifiestos primero, igual que la priorización de extract_video_urls_advanced
+    return manifest_urls + media_urls
+
+
+class WebDriverPool:
+    """Pool de Chrome WebDrivers con checkout/checkin, límite de páginas y recuperación de fallos"""
+
+    def __init__(self, size=3, max_pages_per_driver=30, checkout_timeout=120, driver_factory=None, capture_network=True, supervisor=None):
+        self.size = max(1, size)
+        self.max_pages_per_driver = max_pages_per_driver
+        self.checkout_timeout = checkout_timeout
+        self.capture_network = capture_network
+        self.driver_factory = driver_factory or self._default_driver_factory
+        self.supervisor = supervisor
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._page_counts = {}
+        self._supervised = {}
+        self._closed = False
+
+        self.created_count = 0
+        self.recycled_count = 0
+        self.crashed_count = 0
+
+    def _default_driver_factory(self):
+        """Chrome con las opciones estándar (y performance logs si se captura red)"""
+        if not SELENIUM_AVAILABLE:
+            return None
+        return create_chrome_driver(build_chrome_options(capture_network=self.capture_network))
+
+    def _spawn(self):
+        """Crea un driver nuevo y lo registra en el pool (y en el supervisor si hay uno)"""
+        if self.supervisor and not self.supervisor.reserve(timeout=self.checkout_timeout):
+            print("⚠️ Presupuesto de navegadores agotado, no se crea un nuevo WebDriver")
+            return None
+
+        driver = self.driver_factory()
+        if driver is None:
+            if self.supervisor:
+                self.supervisor.release_reservation()
+            return None
+
+        with self._lock:
+            self._page_counts[id(driver)] = 0
+            self.created_count += 1
+        if self.supervisor:
+            session_id = self.supervisor.register_selenium_driver(driver, from_reservation=True)
+            if session_id is None:
+                self.supervisor.release_reservation()
+            else:
+                self._supervised[id(driver)] = session_id
+        return driver
+
+    def _discard(self, driver):
+        """Cierra un driver y lo elimina del registro"""
+        with self._lock:
+            self._page_counts.pop(id(driver), None)
+            session_id = self._supervised.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        if session_id is not None:
+            # Mata chromedriver/Chrome si quit() los dejó colgados
+            self.supervisor.unregister(session_id, kill=True)
+
+    def is_healthy(self, driver):
+        """Health check: el driver responde y la sesión sigue viva"""
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def checkout(self, timeout=None):
+        """Obtiene un driver sano del pool (bloquea si todos están ocupados)"""
+        if self._closed:
+            return None
+
+        timeout = self.checkout_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            print("⚠️ Pool de WebDrivers agotado, timeout esperando un driver libre")
+            return None
+
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+
+                if self.is_healthy(driver):
+                    return driver
+
+                # El driver murió mientras estaba inactivo
+                self.crashed_count += 1
+                self._discard(driver)
+
+            driver = self._spawn()
+            if driver is None:
+                self._slots.release()
+            return driver
+
+        except Exception:
+            self._slots.release()
+            raise
+
+    def checkin(self, driver, broken=False):
+        """Devuelve un driver al pool, reciclándolo si falló o superó su límite de páginas"""
+        if driver is None:
+            return
+
+        try:
+            with self._lock:
+                pages = self._page_counts.get(id(driver), 0) + 1
+                self._page_counts[id(driver)] = pages
+
+            if broken:
+                self.crashed_count += 1
+                self._discard(driver)
+            elif self._closed or pages >= self.max_pages_per_driver:
+                self.recycled_count += 1
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """Context manager: checkout del driver y checkin automático (marcado roto si crashea)"""
+        driver = self.checkout(timeout)
+        try:
+            yield driver
+        finally:
+            if driver is not None:
+                self.checkin(driver, broken=not self.is_healthy(driver))
+
+    def stats(self):
+        """Estadísticas del pool"""
+        with self._lock:
+            alive = len(self._page_counts)
+        return {
+            'size': self.size,
+            'alive': alive,
+            'idle': self._idle.qsize(),
+            'created': self.created_count,
+            'recycled': self.recycled_count,
+            'crashed': self.crashed_count,
+        }
+
+    def close(self):
+        """Cierra todos los drivers inactivos; los ocupados se cierran al hacer checkin"""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+
+def _descendant_pids(pid):
+    """PIDs de todos los descendientes de un proceso (psutil o /proc como fallback)"""
+    if PSUTIL_AVAILABLE:
+        try:
+            return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+
+    if not os.path.isdir('/proc'):
+        return []
+
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # El nombre del proceso va entre paréntesis y puede contener espacios
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    result = []
+    pending = [pid]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            result.append(child)
+            pending.append(child)
+    return result
+
+
+# Ejecutables de Chromium que lanza Playwright (chrome, chromium, headless_shell, crashpad...)
+BROWSER_PROCESS_NAMES = ('chrom', 'headless_shell', 'msedge')
+
+
+def _is_browser_process(pid):
+    """True si el PID es un proceso de navegador (por nombre); False si no existe o no se puede leer"""
+    try:
+        if PSUTIL_AVAILABLE:
+            name = psutil.Process(pid).name()
+        else:
+            with open(f'/proc/{pid}/comm', 'r') as f:
+                name = f.read()
+    except Exception:
+        return False
+    name = name.strip().lower()
+    return any(marker in name for marker in BROWSER_PROCESS_NAMES)
+
+
+def _rss_mb(pids):
+    """Memoria residente total (MB) de una lista de PIDs"""
+    total = 0
+    for pid in pids:
+        if PSUTIL_AVAILABLE:
+            try:
+                total += psutil.Process(pid).memory_info().rss
+            except psutil.Error:
+                continue
+        else:
+            try:
+                with open(f'/proc/{pid}/status', 'r') as f:
+                    for line in f:
+                        if line.startswith('VmRSS:'):
+                            total += int(line.split()[1]) * 1024
+                            break
+            except (OSError, ValueError):
+                continue
+    return total / (1024 * 1024)
+
+
+def _kill_pids(pids):
+    """Mata (SIGKILL) una lista de PIDs ignorando los que ya no existen"""
+    for pid in pids:
+        try:
+            if PSUTIL_AVAILABLE:
+                psutil.Process(pid).kill()
+            else:
+                os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+        except Exception:
+            continue
+
+
+_SUPERVISORS = weakref.WeakSet()
+
+
+def shutdown_all_supervisors():
+    """Mata los navegadores de todos los supervisores vivos (registrado con atexit)"""
+    for supervisor in list(_SUPERVISORS):
+        supervisor.shutdown()
+
+
+atexit.register(shutdown_all_supervisors)
+
+
+class BrowserSupervisor:
+    """Supervisa los navegadores headless lanzados por los extractores: límites de procesos, RAM y deadlines"""
+
+    def __init__(self, max_browsers=2, max_memory_mb=1500, deadline=180, check_interval=5):
+        self.max_browsers = max(1, max_browsers)
+        self.max_memory_mb = max_memory_mb
+        self.deadline = deadline
+        self.check_interval = check_interval
+
+        self._sessions = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._reserved = 0
+        # Un asyncio.Lock por event loop: serializa la foto de PIDs antes/después de cada lanzamiento
+        self._launch_locks = weakref.WeakKeyDictionary()
+        self._watchdog = None
+        self._stop = threading.Event()
+        # Última RSS medida por el watchdog: reservar un hueco no recorre /proc con el lock tomado
+        self._memory_mb = 0.0
+
+        self.launched_count = 0
+        self.killed_count = 0
+        self.memory_kills = 0
+        self.deadline_kills = 0
+        self.peak_running = 0
+
+        _SUPERVISORS.add(self)
+
+        if not PSUTIL_AVAILABLE and not os.path.isdir('/proc'):
+            print("⚠️ psutil no disponible: el límite de memoria de navegadores no se aplicará (pip install psutil)")
+
+    # ------------------------------------------------------------------ slots
+
+    def _has_room(self):
+        if len(self._sessions) + self._reserved >= self.max_browsers:
+            return False
+        return self.max_memory_mb is None or self._memory_mb < self.max_memory_mb
+
+    def reserve(self, timeout=None):
+        """Reserva un hueco para lanzar un navegador (bloqueante, para hilos)"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._slot_freed:
+            while not self._has_room():
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._slot_freed.wait(timeout=min(remaining or self.check_interval, self.check_interval))
+            self._reserved += 1
+            return True
+
+    async def reserve_async(self, timeout=None):
+        """Reserva un hueco para lanzar un navegador sin bloquear el event loop"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                if self._has_room():
+                    self._reserved += 1
+                    return True
+            if deadline is not None and time.time() >= deadline:
+                return False
+            await asyncio.sleep(0.5)
+
+    def release_reservation(self):
+        with self._slot_freed:
+            self._reserved = max(0, self._reserved - 1)
+            self._slot_freed.notify_all()
+
+    # --------------------------------------------------------------- sesiones
+
+    def register(self, label, pids, deadline=-1, from_reservation=True):
+        """Registra los procesos de un navegador; deadline=-1 usa el deadline por defecto, None sin deadline"""
+        if deadline == -1:
+            deadline = self.deadline
+        session_id = next(self._ids)
+        with self._lock:
+            if from_reservation:
+                self._reserved = max(0, self._reserved - 1)
+            self._sessions[session_id] = {
+                'label': label,
+                'pids': set(pids),
+                'started': time.time(),
+                'deadline': time.time() + deadline if deadline else None,
+            }
+            self.launched_count += 1
+            self.peak_running = max(self.peak_running, len(self._sessions))
+        self.start_watchdog()
+        return session_id
+
+    def unregister(self, session_id, kill=True):
+        """Da de baja una sesión; con kill=True mata cualquier proceso rezagado"""
+        with self._slot_freed:
+            session = self._sessions.pop(session_id, None)
+            if not self._sessions:
+                self._memory_mb = 0.0
+            self._slot_freed.notify_all()
+        if session and kill:
+            leftovers = self._session_pids(session)
+            alive = [pid for pid in leftovers if self._pid_alive(pid)]
+            if alive:
+                _kill_pids(alive)
+                self.killed_count += 1
+
+    def _pid_alive(self, pid):
+        if PSUTIL_AVAILABLE:
+            return psutil.pid_exists(pid)
+        try:
+            os.kill(pid, 0)
+            return True
+        except OSError:
+            return False
+
+    def _session_pids(self, session):
+        """Raíces registradas más sus descendientes actuales (renderers, GPU, etc.)"""
+        pids = set(session['pids'])
+        for pid in list(session['pids']):
+            pids.update(_descendant_pids(pid))
+        return pids
+
+    def _claimed_pids(self):
+        """PIDs (con descendientes) de todas las sesiones registradas"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        claimed = set()
+        for session in sessions:
+            claimed.update(self._session_pids(session))
+        return claimed
+
+    def _new_browser_pids(self, before):
+        """Procesos de navegador aparecidos desde before que no son de otra sesión (renderers nuevos, etc.)"""
+        new_pids = set(_descendant_pids(os.getpid())) - before - self._claimed_pids()
+        return {pid for pid in new_pids if _is_browser_process(pid)}
+
+    def _launch_lock(self):
+        loop = asyncio.get_running_loop()
+        lock = self._launch_locks.get(loop)
+        if lock is None:
+            lock = self._launch_locks[loop] = asyncio.Lock()
+        return lock
+
+    def _sample_memory(self):
+        """Mide la RSS de todas las sesiones (fuera del lock) y la deja como cifra vigente para _has_room"""
+        self._memory_mb = usage = _rss_mb(self._claimed_pids())
+        return usage
+
+    # ------------------------------------------------------------- vigilancia
+
+    def enforce(self):
+        """Mata sesiones vencidas y, si se supera el presupuesto de RAM, las más antiguas"""
+        now = time.time()
+        with self._lock:
+            sessions = sorted(self._sessions.items(), key=lambda item: item[1]['started'])
+
+        for session_id, session in sessions:
+            if session['deadline'] and now > session['deadline']:
+                print(f"⏰ Navegador rezagado ({session['label'][:50]}) superó su deadline, terminando")
+                self.deadline_kills += 1
+                self.unregister(session_id, kill=True)
+
+        usage = self._sample_memory()
+        if self.max_memory_mb is None:
+            return
+
+        with self._lock:
+            sessions = sorted(self._sessions.items(), key=lambda item: item[1]['started'])
+
+        for session_id, session in sessions:
+            if usage <= self.max_memory_mb:
+                break
+            print(f"🧠 Memoria de navegadores {usage:.0f}MB > {self.max_memory_mb}MB, terminando {session['label'][:50]}")
+            self.memory_kills += 1
+            self.unregister(session_id, kill=True)
+            usage = self._sample_memory()
+
+    def _watchdog_loop(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.enforce()
+            except Exception as e:
+                print(f"⚠️ Error en supervisor de navegadores: {e}")
+
+    def start_watchdog(self):
+        """Arranca (una sola vez) el hilo que aplica los límites periódicamente"""
+        with self._lock:
+            if self._watchdog is not None and self._watchdog.is_alive():
+                return
+            self._stop.clear()
+            self._watchdog = threading.Thread(target=self._watchdog_loop, name="browser-supervisor", daemon=True)
+            self._watchdog.start()
+
+    def running_count(self):
+        """Número de navegadores vivos bajo supervisión"""
+        with self._lock:
+            return len(self._sessions)
+
+    def memory_usage_mb(self):
+        return self._sample_memory()
+
+    def stats(self):
+        """Estadísticas del supervisor"""
+        return {
+            'running': self.running_count(),
+            'memory_mb': round(self.memory_usage_mb(), 1),
+            'launched': self.launched_count,
+            'killed': self.killed_count,
+            'deadline_kills': self.deadline_kills,
+            'memory_kills': self.memory_kills,
+            'peak_running': self.peak_running,
+        }
+
+    def shutdown(self):
+        """Detiene el watchdog y mata todos los navegadores que sigan vivos"""
+        self._stop.set()
+        with self._lock:
+            session_ids = list(self._sessions)
+        for session_id in session_ids:
+            self.unregister(session_id, kill=True)
+
+    # ------------------------------------------------------------ integraciones
+
+    @asynccontextmanager
+    async def playwright_browser(self, playwright, label, close_timeout=10, **launch_kwargs):
+        """Lanza Chromium con Playwright bajo supervisión; garantiza close() y mata rezagados"""
+        if not await self.reserve_async():
+            raise RuntimeError("Presupuesto de navegadores agotado")
+
+        # Playwright no expone el PID de Chromium (cuelga del driver de node): se atribuyen por
+        # diferencia de árbol, con los lanzamientos en serie para que dos canales del mismo lote
+        # no se queden cada uno con los procesos del otro. El recorrido de /proc va a un hilo
+        async with self._launch_lock():
+            try:
+                before = await asyncio.to_thread(lambda: set(_descendant_pids(os.getpid())))
+                browser = await playwright.chromium.launch(**launch_kwargs)
+            except BaseException:
+                self.release_reservation()
+                raise
+            new_pids = await asyncio.to_thread(self._new_browser_pids, before)
+            session_id = self.register(label, new_pids)
+        try:
+            yield browser
+        finally:
+            try:
+                await asyncio.wait_for(browser.close(), timeout=close_timeout)
+            except Exception:
+                pass
+            self.unregister(session_id, kill=True)
+
+    def register_selenium_driver(self, driver, label="selenium", from_reservation=False):
+        """Registra chromedriver (y su Chrome hijo) de un driver de Selenium sin deadline"""
+        try:
+            pid = driver.service.process.pid
+        except AttributeError:
+            return None
+        return self.register(label, [pid], deadline=None, from_reservation=from_reservation)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+♻️ IPTV CACHE - Caché persistente de resultados de verificación
+Clave: URL canónica del stream. TTL distinto para resultados positivos y
+negativos, y force_refresh para ignorarla cuando haga falta
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_CACHE_FILE = 'verification_cache.json'
+CACHE_VERSION = 1
+DEFAULT_POSITIVE_TTL = 30 * 60
+DEFAULT_NEGATIVE_TTL = 5 * 60
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonical_stream_url(url):
+    """URL normalizada: esquema/host en minúsculas, sin puerto por defecto, sin fragmento, query ordenada"""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{port}'
+    if parts.username:
+        credentials = parts.username + (f':{parts.password}' if parts.password else '')
+        host = f'{credentials}@{host}'
+
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+class VerificationCache:
+    """Resultados de verificación por URL canónica (y modo: liveness/freshness), persistidos en un JSON"""
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, positive_ttl=DEFAULT_POSITIVE_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL, max_entries=100000):
+        self.path = path
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def read_entries(self):
+        """Entradas del archivo en disco ({} si no existe, es de otra versión o está corrupto)"""
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            # Caché corrupta: se empieza de cero y se sobrescribe en el próximo save()
+            print(f"⚠️ Caché de verificación ilegible ({e}), se ignora")
+            return {}
+        if isinstance(data, dict) and data.get('version') == CACHE_VERSION:
+            return data.get('entries', {})
+        return {}
+
+    def load(self):
+        self.entries = self.read_entries()
+
+    def merge(self, entries):
+        """Incorpora entradas de otro proceso: por URL y modo gana el checked_at más reciente"""
+        for key, modes in entries.items():
+            current = self.entries.setdefault(key, {})
+            for mode, entry in modes.items():
+                if entry.get('checked_at', 0) > current.get(mode, {}).get('checked_at', 0):
+                    current[mode] = entry
+
+    def save(self):
+        """Escritura atómica solo si hubo cambios, fusionando antes lo que otro proceso haya guardado
+
+        Sin la fusión, dos procesos con la misma caché (monitor + extracción) se pisarían:
+        el último save() borraría todo lo que el otro verificó desde su load()
+        """
+        if not self.path or not self.dirty:
+            return
+        on_disk = self.read_entries()
+        with self.lock:
+            self.merge(on_disk)
+            self.prune()
+            snapshot = {'version': CACHE_VERSION,
+                        'entries': {key: dict(modes) for key, modes in self.entries.items()}}
+            self.dirty = False
+
+        # Temporal único en el mismo directorio: os.replace es atómico solo dentro del mismo sistema de archivos
+        directory = os.path.dirname(os.path.abspath(self.path))
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(self.path)}.', suffix='.tmp', dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar la caché de verificación: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def ttl_for(self, entry):
+        return self.positive_ttl if entry.get('online') else self.negative_ttl
+
+    def is_fresh(self, entry, now=None):
+        now = time.time() if now is None else now
+        return now - entry.get('checked_at', 0) < self.ttl_for(entry)
+
+    def get(self, url, mode='liveness', force_refresh=False):
+        """Entrada vigente para la URL (y el mismo modo de verificación) o None"""
+        if force_refresh:
+            self.misses += 1
+            return None
+        with self.lock:
+            entry = self.entries.get(canonical_stream_url(url), {}).get(mode)
+        if entry and self.is_fresh(entry):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, url, online, mode='liveness', status=None, latency=None, error=None, http_status=None, media=None):
+        entry = {
+            'online': bool(online),
+            'status': status or ('online' if online else 'offline'),
+            'latency': latency,
+            'error': error,
+            'http_status': http_status,
+            'media': media,
+            'checked_at': time.time(),
+        }
+        with self.lock:
+            self.entries.setdefault(canonical_stream_url(url), {})[mode] = entry
+            self.dirty = True
+        return entry
+
+    def put_result(self, result, mode='liveness'):
+        """Guarda un resultado de StreamVerifier / check_stream_*"""
+        status = None
+        if 'freshness' in result:
+            status = result['freshness']['status']
+        return self.put(
+            result['url'], result['online'], mode=mode, status=status,
+            latency=result.get('latency'), error=result.get('error'), http_status=result.get('http_status'),
+            media=result.get('media'),
+        )
+
+    def split(self, streams, mode='liveness', force_refresh=False):
+        """Separa streams ({'url', ...}) en (cacheados [(stream, entry)], pendientes de verificar)"""
+        cached = []
+        stale = []
+        for stream in streams:
+            entry = self.get(stream['url'], mode=mode, force_refresh=force_refresh)
+            if entry:
+                cached.append((stream, entry))
+            else:
+                stale.append(stream)
+        return cached, stale
+
+    def prune(self, now=None):
+        """Elimina entradas caducadas y, si sobran, las URLs verificadas hace más tiempo"""
+        now = time.time() if now is None else now
+        expired = 0
+        for key in list(self.entries):
+            modes = self.entries[key]
+            for mode in [mode for mode, entry in modes.items() if not self.is_fresh(entry, now)]:
+                del modes[mode]
+                expired += 1
+            if not modes:
+                del self.entries[key]
+
+        if len(self.entries) > self.max_entries:
+            newest = lambda key: max(entry.get('checked_at', 0) for entry in self.entries[key].values())
+            for key in sorted(self.entries, key=newest)[:len(self.entries) - self.max_entries]:
+                del self.entries[key]
+        return expired
+
+    def stats(self):
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
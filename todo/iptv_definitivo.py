@@ -21,11 +21,25 @@ import random
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import base64
+import contextvars
 import itertools
 import hashlib
 import ssl
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
+from iptv_browser import MEDIA_URL_PATTERNS, is_media_url, BrowserSupervisor
+from iptv_hls import is_hls_url, check_freshness_sync, probe_media_sync, fetch_variants_sync, select_variant
+from iptv_ffprobe import describe_media
+from iptv_cache import VerificationCache
+from iptv_verify import AIOHTTP_AVAILABLE, run_sync, interleave_by_host
+from iptv_sampling import StratifiedSampleVerifier, load_playlist_streams
+from iptv_ranking import rank_stream_urls
+from iptv_autotune import ConcurrencyTuner
+from iptv_index import PlaylistIndex
+from iptv_writer import StreamingM3UWriter, recover_interrupted
+from iptv_groups import classify_group
+from iptv_export import EXPORT_FORMATS, export_channels
+from iptv_monitor import load_stream_status
 
 # Desactivar advertencias SSL
 import urllib3
@@ -69,6 +83,11 @@ FREE_PROXIES = [
     # Se cargarán dinámicamente o se mantendrá lista básica
 ]
 
+# Bloqueos del canal en curso: cada tarea de un lote pone su propio contador y
+# asyncio.to_thread copia el contexto, así que los requests en hilos suman al suyo
+_CHANNEL_BLOCKS = contextvars.ContextVar('channel_blocks', default=None)
+
+
 class IPTVExtractorDefinitivo:
     """Extractor IPTV definitivo con todas las técnicas integradas"""
     
@@ -80,7 +99,23 @@ class IPTVExtractorDefinitivo:
         self.init_proxies()
         self.request_count = 0
         self.blocked_count = 0
+        # Los canales de un lote piden en hilos a la vez (asyncio.to_thread): contadores,
+        # rotación de sesión y fallos de proxy se tocan bajo este lock
+        self.request_lock = threading.Lock()
         self.session_rotation_interval = 50  # Rotar sesión cada X requests
+        # Presupuesto fijo de navegadores headless (procesos, RAM y deadline por navegador)
+        self.browser_supervisor = BrowserSupervisor(max_browsers=2, max_memory_mb=1500, deadline=180)
+        # Resultados de verificación persistentes: repetir la opción 5 solo sondea lo caducado
+        self.verification_cache = VerificationCache()
+        # Ordenar principal + backups por TTFB/throughput medidos (necesita aiohttp)
+        self.rank_candidates = AIOHTTP_AVAILABLE
+        # Abrir los master.m3u8 para conocer sus variantes; con techo (bit/s) se elige la que cabe,
+        # y per_quality_entries añade una entrada por calidad además de la adaptativa
+        self.expand_variants = True
+        self.max_bandwidth = None
+        self.per_quality_entries = False
+        # Calidad sondeada (1080p H264 AAC) en el título de cada canal del M3U incremental
+        self.sniff_media = False
         
     def init_anti_detection(self):
         """Inicializar técnicas anti-detección avanzadas"""
@@ -203,7 +238,8 @@ class IPTVExtractorDefinitivo:
         """Marcar proxy como fallido"""
         if proxy:
             proxy_key = str(proxy)
-            self.proxy_failures[proxy_key] = self.proxy_failures.get(proxy_key, 0) + 1
+            with self.request_lock:
+                self.proxy_failures[proxy_key] = self.proxy_failures.get(proxy_key, 0) + 1
     
     def create_new_session(self):
         """Crear nueva sesión con configuración anti-detección mejorada"""
@@ -288,28 +324,8 @@ class IPTVExtractorDefinitivo:
     
     def init_patterns(self):
         """Inicializar patrones de detección de video"""
-        # Patrones prioritarios para streams directos
-        self.video_patterns = [
-            # HLS Streams (más importantes)
-            r'https?://[^"\']*master\.m3u8[^"\']*',
-            r'https?://[^"\']*playlist\.m3u8[^"\']*', 
-            r'https?://[^"\']*index\.m3u8[^"\']*',
-            r'https?://cdn\d*\.videok\.pro/[^"\']*\.m3u8[^"\']*',
-            r'https?://[^"\']*\.m3u8[^"\']*',
-            # Video files directos
-            r'https?://[^"\']*\.mp4[^"\']*',
-            r'https?://[^"\']*\.mkv[^"\']*',
-            r'https?://[^"\']*\.ts[^"\']*',
-            # Servicios de streaming conocidos
-            r'https?://[^"\']*doodstream[^"\']*',
-            r'https?://[^"\']*streamtape[^"\']*',
-            r'https?://[^"\']*vidmoly[^"\']*',
-            r'https?://[^"\']*okru[^"\']*',
-            r'https?://[^"\']*hlswish[^"\']*',
-            r'https?://[^"\']*streamhide[^"\']*',
-            r'https?://[^"\']*embed[^"\']*\.php',
-            r'https?://[^"\']*player[^"\']*'
-        ]
+        # Patrones prioritarios para streams directos (compartidos con la captura de red de Selenium)
+        self.video_patterns = list(MEDIA_URL_PATTERNS)
         
         # Patrones JavaScript para extracción avanzada
         self.js_patterns = [
@@ -476,20 +492,22 @@ class IPTVExtractorDefinitivo:
     
     def safe_request_with_retries(self, url, site_config, max_retries=5, timeout=30):
         """Request ultra-seguro con múltiples técnicas anti-detección y reintentos"""
-        self.request_count += 1
-        
-        # Rotar sesión periódicamente
-        if self.request_count % self.session_rotation_interval == 0:
-            self.log("🔄 Rotando sesión para evitar detección", "DEBUG")
-            self.session = self.create_new_session()
-            if CLOUDSCRAPER_AVAILABLE:
-                self.scraper = cloudscraper.create_scraper(
-                    browser={
-                        'browser': random.choice(['chrome', 'firefox']),
-                        'platform': random.choice(['windows', 'darwin', 'linux']),
-                        'desktop': True
-                    }
-                )
+        with self.request_lock:
+            self.request_count += 1
+            
+            # Rotar sesión periódicamente (las peticiones en curso siguen con la sesión que tomaron)
+            if self.request_count % self.session_rotation_interval == 0:
+                self.log("🔄 Rotando sesión para evitar detección", "DEBUG")
+                self.session = self.create_new_session()
+                if CLOUDSCRAPER_AVAILABLE:
+                    self.scraper = cloudscraper.create_scraper(
+                        browser={
+                            'browser': random.choice(['chrome', 'firefox']),
+                            'platform': random.choice(['windows', 'darwin', 'linux']),
+                            'desktop': True
+                        }
+                    )
+            session, scraper = self.session, self.scraper
         
         for attempt in range(max_retries):
             try:
@@ -508,11 +526,11 @@ class IPTVExtractorDefinitivo:
                 headers = self.get_random_headers(site_config=site_config)
                 
                 # Método de request según configuración
-                session_to_use = self.session
+                session_to_use = session
                 method_name = "requests"
                 
                 if CLOUDSCRAPER_AVAILABLE and site_config.get("anti_cloudflare", False):
-                    session_to_use = self.scraper
+                    session_to_use = scraper
                     method_name = "cloudscraper"
                 
                 self.log(f"🌐 Intento {attempt + 1}: {method_name} {'+ proxy' if proxy else 'directo'} -> {url[:50]}...", "DEBUG")
@@ -541,7 +559,7 @@ class IPTVExtractorDefinitivo:
                     
                     if any(indicator in content_lower for indicator in block_indicators):
                         self.log(f"🚫 Detectado bloqueo/captcha en intento {attempt + 1}", "WARNING")
-                        self.blocked_count += 1
+                        self.note_block()
                         if proxy:
                             self.mark_proxy_failure(proxy)
                         continue
@@ -556,7 +574,7 @@ class IPTVExtractorDefinitivo:
                 
                 elif response.status_code in [403, 429, 503, 502]:
                     self.log(f"🚫 Bloqueo detectado: {response.status_code}", "WARNING")
-                    self.blocked_count += 1
+                    self.note_block()
                     if proxy:
                         self.mark_proxy_failure(proxy)
                     continue
@@ -591,6 +609,14 @@ class IPTVExtractorDefinitivo:
         self.log(f"💀 Falló después de {max_retries} intentos: {url[:50]}...", "ERROR")
         return None
     
+    def note_block(self):
+        """Cuenta un bloqueo en el total y en el canal que lo sufrió (si hay uno en curso)"""
+        with self.request_lock:
+            self.blocked_count += 1
+        channel_blocks = _CHANNEL_BLOCKS.get()
+        if channel_blocks is not None:
+            channel_blocks[0] += 1
+    
     def safe_request(self, url, site_config, timeout=30):
         """Wrapper para mantener compatibilidad con el código existente"""
         return self.safe_request_with_retries(url, site_config, timeout=timeout)
@@ -639,8 +665,13 @@ class IPTVExtractorDefinitivo:
         return cleaned
     
     def detect_duplicates(self, channels):
-        """Detectar y manejar canales duplicados manteniendo ambos si tienen URLs diferentes"""
-        seen_names = {}
+        """Detectar canales duplicados: las páginas con URLs diferentes forman un grupo de failover
+        
+        Todas conservan el nombre limpio y se procesan por separado; cada una lleva
+        duplicate_group, option (orden de preferencia) y group_size para que
+        collect_failover las junte en un solo canal con sus alternativas ordenadas
+        """
+        groups = {}
         unique_channels = []
         duplicates_info = []
         
@@ -651,37 +682,33 @@ class IPTVExtractorDefinitivo:
             name_key = clean_name.lower().strip()
             name_key = re.sub(r'\s+', '', name_key)  # Remover espacios para comparación
             
-            if name_key in seen_names:
-                # Es un duplicado
-                existing_channel = seen_names[name_key]
-                
-                # Verificar si tienen URLs diferentes
-                if channel['url'] != existing_channel['url']:
-                    # URLs diferentes - mantener ambos con sufijos
-                    duplicates_info.append({
-                        'name': clean_name,
-                        'urls': [existing_channel['url'], channel['url']]
-                    })
-                    
-                    # Actualizar el existente con sufijo
-                    existing_channel['name'] = f"{clean_name} (Opción 1)"
-                    existing_channel['duplicate_group'] = name_key
-                    
-                    # Agregar el nuevo con sufijo
-                    channel['name'] = f"{clean_name} (Opción 2)"
-                    channel['duplicate_group'] = name_key
-                    unique_channels.append(channel)
-                else:
-                    # URLs iguales - es realmente duplicado, ignorar
-                    self.log(f"Duplicado ignorado: {clean_name}", "DEBUG")
-            else:
+            group = groups.get(name_key)
+            if group is None:
                 # Primer occurrence
-                channel['name'] = clean_name
-                seen_names[name_key] = channel
-                unique_channels.append(channel)
+                group = groups[name_key] = []
+            elif any(member['url'] == channel['url'] for member in group):
+                # URLs iguales - es realmente duplicado, ignorar
+                self.log(f"Duplicado ignorado: {clean_name}", "DEBUG")
+                continue
+            
+            channel['name'] = clean_name
+            channel['option'] = len(group) + 1
+            group.append(channel)
+            unique_channels.append(channel)
+        
+        for name_key, group in groups.items():
+            if len(group) < 2:
+                continue
+            for member in group:
+                member['duplicate_group'] = name_key
+                member['group_size'] = len(group)
+            duplicates_info.append({
+                'name': group[0]['name'],
+                'urls': [member['url'] for member in group]
+            })
         
         if duplicates_info:
-            self.log(f"📋 Detectados {len(duplicates_info)} canales con múltiples opciones:", "INFO")
+            self.log(f"📋 Detectados {len(duplicates_info)} canales con múltiples opciones (se agrupan para failover):", "INFO")
             for dup in duplicates_info:
                 self.log(f"   • {dup['name']}: {len(dup['urls'])} URLs diferentes", "INFO")
         
@@ -904,7 +931,9 @@ class IPTVExtractorDefinitivo:
         self.log(f"🎭 Playwright: {channel_url[:60]}...")
         
         async with async_playwright() as p:
-            browser = await p.chromium.launch(
+            async with self.browser_supervisor.playwright_browser(
+                p,
+                channel_url,
                 headless=True,
                 args=[
                     '--disable-blink-features=AutomationControlled',
@@ -916,75 +945,67 @@ class IPTVExtractorDefinitivo:
                     '--disable-plugins',
                     '--disable-images'
                 ]
-            )
-            
-            context = await browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent=random.choice(self.user_agents),
-                ignore_https_errors=True
-            )
+            ) as browser:
+                context = await browser.new_context(
+                    viewport={'width': 1920, 'height': 1080},
+                    user_agent=random.choice(self.user_agents),
+                    ignore_https_errors=True
+                )
             
-            page = await context.new_page()
-            video_urls = []
+                page = await context.new_page()
+                video_urls = []
             
-            async def handle_response(response):
-                url = response.url
-                if any(url.lower().endswith(ext) for ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp']):
-                    return
-                
-                for pattern in self.video_patterns:
-                    if re.search(pattern, url, re.IGNORECASE):
+                async def handle_response(response):
+                    url = response.url
+                    if is_media_url(url):
                         self.log(f"🎥 Playwright detectó: {url[:80]}...", "SUCCESS")
                         video_urls.append(url)
-                        return
             
-            page.on('response', handle_response)
+                page.on('response', handle_response)
             
-            try:
-                await page.goto(channel_url, wait_until='networkidle', timeout=60000)
-                await page.wait_for_timeout(5000)
+                try:
+                    await page.goto(channel_url, wait_until='networkidle', timeout=60000)
+                    await page.wait_for_timeout(5000)
                 
-                # Buscar y hacer clic en elementos de reproducción
-                play_selectors = [
-                    'button[class*="play"]', '.play-button', '.btn-play',
-                    'button', '[onclick*="play"]', '.player-button'
-                ]
+                    # Buscar y hacer clic en elementos de reproducción
+                    play_selectors = [
+                        'button[class*="play"]', '.play-button', '.btn-play',
+                        'button', '[onclick*="play"]', '.player-button'
+                    ]
                 
-                for selector in play_selectors:
-                    try:
-                        elements = await page.query_selector_all(selector)
-                        for element in elements[:3]:
-                            try:
-                                if await element.is_visible():
-                                    await element.click(timeout=10000)
-                                    await page.wait_for_timeout(8000)
-                                    if video_urls:
-                                        break
-                            except:
-                                continue
-                        if video_urls:
-                            break
-                    except:
-                        continue
+                    for selector in play_selectors:
+                        try:
+                            elements = await page.query_selector_all(selector)
+                            for element in elements[:3]:
+                                try:
+                                    if await element.is_visible():
+                                        await element.click(timeout=10000)
+                                        await page.wait_for_timeout(8000)
+                                        if video_urls:
+                                            break
+                                except:
+                                    continue
+                            if video_urls:
+                                break
+                        except:
+                            continue
                 
-                # Buscar iframes
-                iframes = await page.query_selector_all('iframe')
-                for iframe in iframes:
-                    try:
-                        src = await iframe.get_attribute('src')
-                        if src and any(service in src.lower() for service in ['stream', 'player', 'embed']):
-                            video_urls.append(src)
-                    except:
-                        continue
+                    # Buscar iframes
+                    iframes = await page.query_selector_all('iframe')
+                    for iframe in iframes:
+                        try:
+                            src = await iframe.get_attribute('src')
+                            if src and any(service in src.lower() for service in ['stream', 'player', 'embed']):
+                                video_urls.append(src)
+                        except:
+                            continue
                 
-                await page.wait_for_timeout(10000)
-                await browser.close()
-                return video_urls
+                    await page.wait_for_timeout(10000)
+                    return video_urls
                 
-            except Exception as e:
-                self.log(f"Error Playwright: {e}", "ERROR")
-                await browser.close()
-                return []
+                except Exception as e:
+                    self.log(f"Error Playwright: {e}", "ERROR")
+                    return []
     
     async def process_channel(self, channel, site_config):
         """Procesar canal individual para extraer streams"""
@@ -1018,7 +1039,8 @@ class IPTVExtractorDefinitivo:
                     'source': channel.get('source', 'unknown'),
                     'original_page': channel_url,
                     'backup_urls': video_urls[1:3] if len(video_urls) > 1 else [],
-                    'duplicate_group': channel.get('duplicate_group')
+                    'duplicate_group': channel.get('duplicate_group'),
+                    'option': channel.get('option')
                 }
             
             self.log(f"❌ Sin streams: {channel_name}", "WARNING")
@@ -1028,8 +1050,11 @@ class IPTVExtractorDefinitivo:
             self.log(f"❌ Error {channel_name}: {e}", "ERROR")
             return None
     
-    async def extract_site_complete_protected(self, site_name):
-        """Extraer sitio completo con protección avanzada anti-detección"""
+    async def extract_site_complete_protected(self, site_name, writer=None):
+        """Extraer sitio completo con protección avanzada anti-detección
+        
+        Con writer (StreamingM3UWriter) cada canal se escribe en el M3U en cuanto se resuelve
+        """
         self.log(f"🚀 EXTRACCIÓN PROTEGIDA: {site_name.upper()}")
         
         site_config = self.site_configs.get(site_name)
@@ -1054,36 +1079,62 @@ class IPTVExtractorDefinitivo:
             
             # Paso 2: Procesar canales con técnicas anti-detección
             working_channels = []
-            batch_size = 3  # Reducir batch size para evitar detección
+            failover_pending = {}
+            # Tamaño de lote auto-ajustado: empieza en 3 (anti-detección) y solo crece mientras
+            # el throughput mejore sin bloqueos; cada bloqueo lo reduce a la mitad
+            tuner = ConcurrencyTuner(3, min_limit=1, max_limit=8, min_samples=3, max_block_rate=0.1)
+            position = 0
+            batch_num = 0
+            
+            async def process_paced(channel):
+                # Contador propio de esta tarea: los bloqueos de otros canales del lote no cuentan
+                channel_blocks = [0]
+                _CHANNEL_BLOCKS.set(channel_blocks)
+                started = time.monotonic()
+                try:
+                    result = await self.process_channel_protected(channel, site_config)
+                    ok = True
+                except Exception as e:
+                    self.log(f"❌ Error procesando {channel.get('name', 'Unknown')}: {e}", "ERROR")
+                    result, ok = None, False
+                latency = time.monotonic() - started
+                
+                # Pausa inteligente entre canales
+                delay = random.uniform(3, 8)
+                if self.blocked_count > initial_blocked_count:
+                    delay *= 2  # Duplicar delay si hay bloqueos
+                await asyncio.sleep(delay)
+                return result, latency, ok, channel_blocks[0] > 0
             
-            for i in range(0, len(channels), batch_size):
-                batch = channels[i:i+batch_size]
-                batch_num = i//batch_size + 1
-                total_batches = (len(channels) + batch_size - 1) // batch_size
+            while position < len(channels):
+                batch = channels[position:position + tuner.limit]
+                position += len(batch)
+                batch_num += 1
                 
-                self.log(f"🔄 Lote protegido {batch_num}/{total_batches} ({len(batch)} canales)")
+                self.log(f"🔄 Lote protegido {batch_num} ({len(batch)} canales, {position}/{len(channels)})")
                 
                 # Monitorear tasa de bloqueo
                 if self.blocked_count > initial_blocked_count + 5:
                     self.log(f"⚠️ Alta tasa de bloqueo detectada, aumentando delays", "WARNING")
                     await asyncio.sleep(random.uniform(10, 20))
                 
-                for channel in batch:
-                    try:
-                        result = await self.process_channel_protected(channel, site_config)
-                        if result:
-                            working_channels.append(result)
-                        
-                        # Pausa inteligente entre canales
-                        delay = random.uniform(3, 8)
-                        if self.blocked_count > initial_blocked_count:
-                            delay *= 2  # Duplicar delay si hay bloqueos
-                        
-                        await asyncio.sleep(delay)
-                        
-                    except Exception as e:
-                        self.log(f"❌ Error procesando {channel.get('name', 'Unknown')}: {e}", "ERROR")
-                        continue
+                outcomes = await asyncio.gather(*(process_paced(channel) for channel in batch))
+                batch_entries = []
+                for index, (result, latency, ok, blocked) in enumerate(outcomes):
+                    # Las opciones de un mismo canal se esperan entre sí y salen como un único canal
+                    for ready in self.collect_failover(failover_pending, batch[index], result):
+                        batch_entries.extend(self.quality_entries(ready))
+                    tuner.record(latency, ok=ok, blocked=blocked)
+                if writer is not None and self.sniff_media and batch_entries:
+                    # Antes de escribir: el título lleva la calidad detectada
+                    await asyncio.to_thread(self.annotate_media, batch_entries)
+                working_channels.extend(batch_entries)
+                if writer is not None:
+                    writer.add_many(batch_entries)
+                if tuner.ready():
+                    previous_limit = tuner.limit
+                    if tuner.adjust() != previous_limit:
+                        self.log(f"🎛️ Canales simultáneos: {previous_limit} → {tuner.limit} ({tuner.history[-1]['reason']})", "DEBUG")
                 
                 # Pausa entre lotes más larga
                 batch_delay = random.uniform(8, 15)
@@ -1101,6 +1152,9 @@ class IPTVExtractorDefinitivo:
             self.log(f"   Requests realizados: {final_request_count}", "INFO")
             self.log(f"   Bloqueos detectados: {final_blocked_count}", "INFO")
             self.log(f"   Tasa de éxito: {((final_request_count - final_blocked_count) / max(final_request_count, 1) * 100):.1f}%", "INFO")
+            self.log(f"   Canales simultáneos auto-ajustados: {tuner.describe()}", "INFO")
+            browser_stats = self.browser_supervisor.stats()
+            self.log(f"   Navegadores activos: {browser_stats['running']} ({browser_stats['memory_mb']}MB) | lanzados: {browser_stats['launched']} | terminados a la fuerza: {browser_stats['killed']}", "INFO")
             
             self.log(f"🎉 {site_name}: {len(working_channels)} canales con streams")
             return working_channels
@@ -1281,7 +1335,8 @@ class IPTVExtractorDefinitivo:
         
         try:
             # Método básico con protección
-            response = self.safe_request_with_retries(channel_url, site_config, max_retries=3)
+            # En un hilo: los canales de un lote se procesan a la vez y requests es bloqueante
+            response = await asyncio.to_thread(self.safe_request_with_retries, channel_url, site_config, max_retries=3)
             
             if not response:
                 self.log(f"❌ No accesible (protegido): {channel_name}", "WARNING")
@@ -1299,18 +1354,26 @@ class IPTVExtractorDefinitivo:
                     self.log(f"Error Playwright para {channel_name}: {e}", "WARNING")
             
             if video_urls:
-                best_url = video_urls[0]  # Ya están priorizados
+                url_scores = {}
+                if self.rank_candidates and len(video_urls) > 1:
+                    video_urls, url_scores = await self.rank_channel_urls(channel_name, channel_url, video_urls)
+                best_url = video_urls[0]  # Priorizados por medición o, si no, por PRIORITY:
                 
                 self.log(f"✅ {channel_name}: {best_url[:60]}...", "SUCCESS")
-                return {
+                result = {
                     'name': channel_name,
                     'url': best_url,
                     'source': channel.get('source', 'unknown'),
                     'original_page': channel_url,
                     'backup_urls': video_urls[1:3] if len(video_urls) > 1 else [],
+                    'url_scores': url_scores,
                     'duplicate_group': channel.get('duplicate_group'),
+                    'option': channel.get('option'),
                     'extraction_method': 'protected'
                 }
+                if self.expand_variants and is_hls_url(best_url):
+                    await asyncio.to_thread(self.expand_master_variants, result)
+                return result
             
             self.log(f"❌ Sin streams (protegido): {channel_name}", "WARNING")
             return None
@@ -1319,6 +1382,107 @@ class IPTVExtractorDefinitivo:
             self.log(f"❌ Error protegido {channel_name}: {e}", "ERROR")
             return None
     
+    def expand_master_variants(self, channel):
+        """Abre el master del canal y guarda sus variantes; con max_bandwidth la URL pasa a la variante que cabe
+        
+        El master queda como primer respaldo (reproducción adaptativa si la variante elegida cae)
+        """
+        result = fetch_variants_sync(channel['url'], self.session, timeout=10)
+        if not result['is_master']:
+            return channel
+        
+        master_url = channel['url']
+        channel['master_url'] = master_url
+        channel['variants'] = result['variants']
+        labels = ', '.join(variant['label'] for variant in result['variants'])
+        self.log(f"📶 {channel['name']}: {len(result['variants'])} calidades ({labels})", "DEBUG")
+        
+        if self.max_bandwidth:
+            chosen = select_variant(result['variants'], self.max_bandwidth)
+            channel['url'] = chosen['url']
+            channel['quality'] = chosen['label']
+            channel['backup_urls'] = [master_url] + [url for url in channel.get('backup_urls', []) if url != master_url]
+            fits = chosen['bandwidth'] <= self.max_bandwidth
+            self.log(f"📶 {channel['name']}: variante {chosen['label']} ({chosen['bandwidth'] / 1_000_000:.1f} Mbps)"
+                     + ("" if fits else " — ninguna cabe en el techo, se usa la más ligera"), "DEBUG")
+        return channel
+    
+    def quality_entries(self, channel):
+        """El canal y, si per_quality_entries, una entrada más por cada variante del master (ESPN (720p)...)"""
+        if not self.per_quality_entries or not channel.get('variants'):
+            return [channel]
+        entries = [channel]
+        for variant in channel['variants']:
+            if variant['url'] == channel['url']:
+                continue
+            entries.append({
+                **channel,
+                'name': f"{channel['name']} ({variant['label']})",
+                'url': variant['url'],
+                'quality': variant['label'],
+                'backup_urls': [channel.get('master_url', channel['url'])],
+                'variants': None,
+            })
+        return entries
+    
+    def collect_failover(self, pending, channel, result):
+        """Canales listos para escribir tras procesar channel (result puede ser None si falló)
+        
+        Sin grupo de duplicados sale tal cual; con grupo se guarda en pending hasta que
+        han terminado todas sus opciones y entonces sale fusionado
+        """
+        group_key = channel.get('duplicate_group')
+        if not group_key:
+            return [result] if result else []
+        results = pending.setdefault(group_key, [])
+        results.append(result)
+        if len(results) < channel.get('group_size', 1):
+            return []
+        del pending[group_key]
+        merged = self.merge_failover_group([member for member in results if member])
+        return [merged] if merged else []
+    
+    def merge_failover_group(self, results):
+        """Opciones resueltas de un canal → un canal: la primera opción manda y backup_urls
+        lleva, en orden, sus respaldos y después las URLs de las demás opciones"""
+        if not results:
+            return None
+        results = sorted(results, key=lambda member: member.get('option') or 0)
+        primary = results[0]
+        candidates = []
+        for member in results:
+            for url in [member['url']] + list(member.get('backup_urls') or []):
+                if url not in candidates:
+                    candidates.append(url)
+        if len(results) > 1:
+            self.log(f"🛟 {primary['name']}: {len(results)} opciones → {len(candidates)} URLs de failover", "DEBUG")
+        return {
+            **primary,
+            'backup_urls': candidates[1:],
+            'failover_group': primary.get('duplicate_group'),
+            'alternate_pages': [member['original_page'] for member in results[1:]],
+        }
+    
+    async def rank_channel_urls(self, channel_name, channel_url, video_urls):
+        """Mide todas las candidatas del canal en paralelo y las reordena por puntuación"""
+        headers = {'Referer': channel_url, 'User-Agent': random.choice(self.premium_user_agents)}
+        try:
+            ranked, measurements = await rank_stream_urls(video_urls, headers=headers)
+        except Exception as e:
+            self.log(f"Error midiendo candidatas de {channel_name}: {e}", "WARNING")
+            return video_urls, {}
+        
+        url_scores = {m['url']: m['score'] for m in measurements}
+        for m in measurements:
+            if m['ok']:
+                self.log(f"🏁 {channel_name}: {m['score']:.2f} pts | TTFB {m['ttfb']:.2f}s | "
+                         f"{m['throughput'] * 8 / 1_000_000:.1f} Mbps | estab. {m['stability']:.2f} | {m['url'][:50]}", "DEBUG")
+            else:
+                self.log(f"🏁 {channel_name}: ✗ {m['error']} | {m['url'][:50]}", "DEBUG")
+        if ranked[0] != video_urls[0]:
+            self.log(f"🔀 {channel_name}: origen más rápido promovido a principal", "INFO")
+        return ranked, url_scores
+    
     async def extract_with_playwright_protected(self, channel_url, site_config):
         """Extracción Playwright con protección anti-detección"""
         if not PLAYWRIGHT_AVAILABLE:
@@ -1328,7 +1492,9 @@ class IPTVExtractorDefinitivo:
         
         try:
             async with async_playwright() as p:
-                browser = await p.chromium.launch(
+                async with self.browser_supervisor.playwright_browser(
+                    p,
+                    channel_url,
                     headless=True,
                     args=[
                         '--disable-blink-features=AutomationControlled',
@@ -1346,169 +1512,224 @@ class IPTVExtractorDefinitivo:
                         '--disable-backgrounding-occluded-windows',
                         '--disable-renderer-backgrounding'
                     ]
-                )
-                
-                # User agent aleatorio
-                user_agent = random.choice(self.premium_user_agents)
-                
-                context = await browser.new_context(
-                    viewport={'width': 1920, 'height': 1080},
-                    user_agent=user_agent,
-                    ignore_https_errors=True,
-                    java_script_enabled=True
-                )
-                
-                # Stealth mode básico
-                await context.add_init_script("""
-                    Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
-                    Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]});
-                    Object.defineProperty(navigator, 'languages', {get: () => ['es-ES', 'es', 'en-US', 'en']});
-                """)
-                
-                page = await context.new_page()
-                video_urls = []
-                
-                async def handle_response(response):
-                    url = response.url
-                    if any(url.lower().endswith(ext) for ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico']):
-                        return
-                    
-                    for pattern in self.video_patterns:
-                        if re.search(pattern, url, re.IGNORECASE):
+                ) as browser:
+                    # User agent aleatorio
+                    user_agent = random.choice(self.premium_user_agents)
+                
+                    context = await browser.new_context(
+                        viewport={'width': 1920, 'height': 1080},
+                        user_agent=user_agent,
+                        ignore_https_errors=True,
+                        java_script_enabled=True
+                    )
+                
+                    # Stealth mode básico
+                    await context.add_init_script("""
+                        Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
+                        Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]});
+                        Object.defineProperty(navigator, 'languages', {get: () => ['es-ES', 'es', 'en-US', 'en']});
+                    """)
+                
+                    page = await context.new_page()
+                    video_urls = []
+                
+                    async def handle_response(response):
+                        url = response.url
+                        if is_media_url(url):
                             self.log(f"🎥 Playwright detectó: {url[:80]}...", "SUCCESS")
                             video_urls.append(url)
-                            return
                 
-                page.on('response', handle_response)
+                    page.on('response', handle_response)
                 
-                # Navegar con timeout extendido
-                await page.goto(channel_url, wait_until='networkidle', timeout=90000)
-                await page.wait_for_timeout(8000)
+                    # Navegar con timeout extendido
+                    await page.goto(channel_url, wait_until='networkidle', timeout=90000)
+                    await page.wait_for_timeout(8000)
                 
-                # Buscar y hacer clic en elementos de reproducción con más paciencia
-                play_selectors = [
-                    'button[class*="play"]', '.play-button', '.btn-play', '.play-btn',
-                    'button', '[onclick*="play"]', '.player-button', '.video-play',
-                    '.play-icon', '[data-play]', '.start-button', '.player-start'
-                ]
+                    # Buscar y hacer clic en elementos de reproducción con más paciencia
+                    play_selectors = [
+                        'button[class*="play"]', '.play-button', '.btn-play', '.play-btn',
+                        'button', '[onclick*="play"]', '.player-button', '.video-play',
+                        '.play-icon', '[data-play]', '.start-button', '.player-start'
+                    ]
                 
-                for selector in play_selectors:
-                    try:
-                        elements = await page.query_selector_all(selector)
-                        for element in elements[:5]:  # Probar más elementos
-                            try:
-                                if await element.is_visible():
-                                    await element.click(timeout=15000)
-                                    await page.wait_for_timeout(12000)  # Esperar más tiempo
-                                    if video_urls:
-                                        break
-                            except:
-                                continue
-                        if video_urls:
-                            break
-                    except:
-                        continue
+                    for selector in play_selectors:
+                        try:
+                            elements = await page.query_selector_all(selector)
+                            for element in elements[:5]:  # Probar más elementos
+                                try:
+                                    if await element.is_visible():
+                                        await element.click(timeout=15000)
+                                        await page.wait_for_timeout(12000)  # Esperar más tiempo
+                                        if video_urls:
+                                            break
+                                except:
+                                    continue
+                            if video_urls:
+                                break
+                        except:
+                            continue
                 
-                # Buscar iframes con más detalle
-                iframes = await page.query_selector_all('iframe')
-                for iframe in iframes:
-                    try:
-                        src = await iframe.get_attribute('src')
-                        data_src = await iframe.get_attribute('data-src')
-                        for url in [src, data_src]:
-                            if url and any(service in url.lower() for service in ['stream', 'player', 'embed', 'video']):
-                                video_urls.append(url)
-                    except:
-                        continue
+                    # Buscar iframes con más detalle
+                    iframes = await page.query_selector_all('iframe')
+                    for iframe in iframes:
+                        try:
+                            src = await iframe.get_attribute('src')
+                            data_src = await iframe.get_attribute('data-src')
+                            for url in [src, data_src]:
+                                if url and any(service in url.lower() for service in ['stream', 'player', 'embed', 'video']):
+                                    video_urls.append(url)
+                        except:
+                            continue
                 
-                await page.wait_for_timeout(15000)  # Espera final más larga
-                await browser.close()
-                return video_urls
+                    await page.wait_for_timeout(15000)  # Espera final más larga
+                    return video_urls
                 
         except Exception as e:
             self.log(f"Error Playwright protegido: {e}", "ERROR")
             return []
     
-    def generate_m3u_enhanced(self, all_channels, filename="iptv_definitivo"):
+    def generate_m3u_enhanced(self, all_channels, filename="iptv_definitivo", sniff_media=False):
         """Generar M3U optimizado con manejo de duplicados"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return self.generate_m3u_fixed_name(all_channels, f"{filename}_{timestamp}.m3u", sniff_media=sniff_media)
+    
+    def export_channels(self, all_channels, base_path, formats=EXPORT_FORMATS):
+        """Exporta los canales a JSONL / XSPF / JSON estilo Xtream / M3U gzip en una pasada; {formato: ruta}"""
+        try:
+            paths = export_channels(all_channels, base_path, formats, format_entry=self.format_m3u_entry,
+                                    cache=self.verification_cache, status=load_stream_status())
+        except Exception as e:
+            self.log(f"❌ Error exportando: {e}", "ERROR")
+            return {}
+        for fmt, path in paths.items():
+            self.log(f"📦 Exportado {fmt}: {path}", "SUCCESS")
+        return paths
+    
+    def annotate_media(self, channels, max_workers=16):
+        """Añade channel['media'] (codec/resolución) con un GET parcial por canal, sin ffprobe"""
+        # Por turnos entre hosts: en orden de archivo todos los hilos irían contra el mismo origen
+        pending = interleave_by_host([channel for channel in channels if not channel.get('media')])
+        if not pending:
+            return channels
+        
+        self.log(f"📐 Detectando codec y resolución de {len(pending)} canales...")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(probe_media_sync, channel['url'], self.session): channel for channel in pending}
+            for future in as_completed(futures):
+                try:
+                    futures[future]['media'] = future.result()['media']
+                except Exception:
+                    continue
+        
+        detected = sum(1 for channel in pending if channel.get('media'))
+        self.log(f"📐 Metadatos obtenidos: {detected}/{len(pending)}", "SUCCESS" if detected else "WARNING")
+        return channels
+    
+    def format_m3u_entry(self, channel):
+        """Entrada #EXTINF + URL de un canal, tal como la escriben todos los generadores de M3U"""
+        # Nombre limpio para M3U
+        clean_name = re.sub(r'[^\w\s\-()&+]', '', channel['name']).strip()
+        source_name = channel.get('source', 'Unknown').replace('.com', '').replace('www.', '')
+        
+        # Determinar grupo (tabla de reglas compartida con iptv.py e iptv_merge.py)
+        group_title = classify_group(clean_name, channel.get('source'))
+        
+        # Título para M3U
+        title = f"{clean_name} [{source_name}]"
+        
+        # Calidad detectada (1080p H264 AAC) si se sondeó el stream
+        if channel.get('media'):
+            title = f"{title} {describe_media(channel['media'])}"
+        
+        return f'#EXTINF:-1 tvg-logo="" group-title="{group_title}",{title}\n{channel["url"]}\n'
+    
+    def open_m3u_writer(self, filename, resume=False):
+        """M3U incremental: los canales se añaden según se resuelven y finalize() lo publica de forma atómica
+        
+        resume=True continúa los segmentos que dejó una ejecución interrumpida con el mismo nombre
+        """
+        return StreamingM3UWriter(filename, self.format_m3u_entry, resume=resume)
+    
+    def generate_m3u_fixed_name(self, all_channels, filename, sniff_media=False):
+        """Generar M3U con nombre fijo (sin timestamp); sniff_media añade la calidad al título"""
         if not all_channels:
             self.log("❌ No hay canales para M3U", "ERROR")
             return None
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{filename}_{timestamp}.m3u"
+        if sniff_media:
+            self.annotate_media(all_channels)
         
+        writer = self.open_m3u_writer(filename)
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write("#EXTM3U\n")
-                f.write(f"# Generado por IPTV Extractor Definitivo - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"# Total de canales: {len(all_channels)}\n")
-                f.write("\n")
-                
-                # Agrupar por fuente para organización
-                by_source = {}
-                for channel in all_channels:
-                    source = channel.get('source', 'Unknown')
-                    if source not in by_source:
-                        by_source[source] = []
-                    by_source[source].append(channel)
-                
-                # Escribir canales agrupados por fuente
-                for source, channels in by_source.items():
-                    f.write(f"# === {source.upper()} ({len(channels)} canales) ===\n")
-                    
-                    for channel in channels:
-                        # Nombre limpio para M3U
-                        clean_name = re.sub(r'[^\w\s\-()&+]', '', channel['name']).strip()
-                        source_name = source.replace('.com', '').replace('www.', '')
-                        
-                        # Determinar grupo
-                        group_title = "IPTV Live"
-                        if any(keyword in clean_name.lower() for keyword in ['sport', 'deporte', 'espn', 'fox']):
-                            group_title = "Deportes"
-                        elif any(keyword in clean_name.lower() for keyword in ['news', 'noticia', 'cnn']):
-                            group_title = "Noticias"
-                        elif any(keyword in clean_name.lower() for keyword in ['disney', 'cartoon', 'nick']):
-                            group_title = "Infantil"
-                        elif any(keyword in clean_name.lower() for keyword in ['movie', 'cinema', 'film']):
-                            group_title = "Películas"
-                        
-                        # Título para M3U
-                        title = f"{clean_name} [{source_name}]"
-                        
-                        # Agregar información de opciones múltiples si existe
-                        if channel.get('duplicate_group'):
-                            title = f"{clean_name} [{source_name}]"
-                        
-                        f.write(f'#EXTINF:-1 tvg-logo="" group-title="{group_title}",{title}\n')
-                        f.write(f'{channel["url"]}\n')
-                    
-                    f.write("\n")
-            
+            writer.add_many(all_channels)
+            writer.finalize()
             self.log(f"✅ M3U generado: {filename}", "SUCCESS")
             return filename
             
         except Exception as e:
+            writer.abort()
             self.log(f"❌ Error generando M3U: {e}", "ERROR")
             return None
     
-    def generate_m3u_fixed_name(self, all_channels, filename):
-        """Generar M3U con nombre fijo (sin timestamp)"""
-        if not all_channels:
-            self.log("❌ No hay canales para M3U", "ERROR")
+    def verify_streams_sample(self, m3u_file, sample_size=10, freshness=False, force_refresh=False, precision=0.05):
+        """Verificar una muestra de streams de un M3U: estratificada y concurrente si hay aiohttp"""
+        if not AIOHTTP_AVAILABLE:
+            return self.verify_streams_sample_serial(m3u_file, sample_size, freshness, force_refresh)
+        return self.verify_streams_stratified(m3u_file, max_probes=sample_size, precision=precision,
+                                              freshness=freshness, force_refresh=force_refresh)
+    
+    def verify_streams_stratified(self, m3u_file, max_probes=300, precision=0.05, confidence=0.95,
+                                  freshness=False, force_refresh=False):
+        """Muestreo estratificado por fuente/host con IC por estrato y parada al alcanzar la precisión"""
+        streams = load_playlist_streams(m3u_file)
+        if not streams:
+            self.log("❌ No se encontraron URLs en el M3U", "ERROR")
             return None
         
+        self.log(f"📊 Muestreo estratificado de {m3u_file}: {len(streams)} streams, "
+                 f"máx. {max_probes} sondeos, precisión ±{precision * 100:.1f}%")
+        
+        def on_round(sampler):
+            estimate, half_width = sampler.estimate()
+            self.log(f"   🔄 {sampler.probes + sampler.cache_hits} observaciones: "
+                     f"{estimate * 100:.1f}% ±{half_width * 100:.1f}%")
+        
+        sampler = StratifiedSampleVerifier(precision=precision, confidence=confidence, max_probes=max_probes,
+                                           freshness=freshness, cache=self.verification_cache,
+                                           force_refresh=force_refresh, on_round=on_round)
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-            # Extraer URLs
-            urls = re.findall(r'https?://[^\s]+', content)
-            
-            if not urls:
-                self.log("❌ No se encontraron URLs en el M3U", "ERROR")
-                return
-            
-            # Tomar muestra aleatoria
-            sample_urls = random.sample(urls, min(sample_size, len(urls)))
+            report = run_sync(sampler.run(streams))
+        finally:
+            self.verification_cache.save()
+        
+        confidence_label = f"IC{confidence * 100:.0f}%"
+        for stratum in report['strata']:
+            if not stratum['observed']:
+                continue
+            low, high = stratum['interval']
+            self.log(f"   📡 {stratum['source']} / {stratum['host']}: {stratum['successes']}/{stratum['observed']} "
+                     f"({stratum['rate'] * 100:.0f}%) {confidence_label} [{low * 100:.0f}–{high * 100:.0f}%] "
+                     f"de {stratum['population']}")
+        
+        low, high = report['interval']
+        stop_reasons = {'precision': 'precisión alcanzada', 'budget': 'límite de sondeos', 'exhausted': 'población agotada'}
+        self.log(f"📊 Resultado: {report['estimate'] * 100:.1f}% funcionan, {confidence_label} [{low * 100:.1f}–{high * 100:.1f}%] "
+                 f"con {report['probes']} sondeos + {report['cache_hits']} de caché en {report['elapsed']}s "
+                 f"({stop_reasons[report['stopped']]})",
+                 "SUCCESS" if report['estimate'] > 0.7 else "WARNING")
+        return report
+    
+    def verify_streams_sample_serial(self, m3u_file, sample_size=10, freshness=False, force_refresh=False):
+        """Verificar una muestra aleatoria de streams de un archivo M3U, uno a uno (sin aiohttp)"""
+        self.log(f"🔍 Verificando muestra de {sample_size} streams de {m3u_file}")
+        
+        try:
+            # Muestra aleatoria vía índice mmap: solo se leen las entradas elegidas
+            with PlaylistIndex(m3u_file) as index:
+                if not len(index):
+                    self.log("❌ No se encontraron URLs en el M3U", "ERROR")
+                    return
+                sample_urls = [entry.url for entry in index.sample(sample_size)]
             
             working = 0
             total = len(sample_urls)
@@ -1517,7 +1738,35 @@ class IPTVExtractorDefinitivo:
                 try:
                     self.log(f"🧪 Verificando {i}/{total}: {url[:50]}...")
                     
+                    mode = 'freshness' if freshness and is_hls_url(url) else 'liveness'
+                    cached = self.verification_cache.get(url, mode=mode, force_refresh=force_refresh)
+                    if cached:
+                        age = time.time() - cached['checked_at']
+                        if cached['online']:
+                            working += 1
+                            self.log(f"   ♻️ Funciona (caché, hace {age:.0f}s)", "SUCCESS")
+                        else:
+                            self.log(f"   ♻️ {cached['status']} (caché, hace {age:.0f}s)", "WARNING")
+                        continue
+                    
+                    if mode == 'freshness':
+                        result = check_freshness_sync(url, session=self.session)
+                        self.verification_cache.put(url, result['status'] == 'live', mode=mode, status=result['status'],
+                                                    latency=result['latency'], error=result['error'],
+                                                    http_status=result['http_status'])
+                        if result['status'] == 'live':
+                            working += 1
+                            self.log(f"   ✅ En vivo (seq {result['media_sequence_before']} → {result['media_sequence_after']})", "SUCCESS")
+                        elif result['status'] == 'frozen':
+                            self.log(f"   🧊 Congelado: el manifiesto no avanzó en {result['waited']:.0f}s", "WARNING")
+                        else:
+                            self.log(f"   ❌ Muerto: {result['error'] or 'sin segmentos'}", "WARNING")
+                        continue
+                    
+                    started = time.time()
                     response = self.session.head(url, timeout=10)
+                    self.verification_cache.put(url, response.status_code < 400, latency=round(time.time() - started, 3),
+                                                http_status=response.status_code)
                     if response.status_code < 400:
                         working += 1
                         self.log(f"   ✅ Funciona", "SUCCESS")
@@ -1525,6 +1774,7 @@ class IPTVExtractorDefinitivo:
                         self.log(f"   ❌ Error {response.status_code}", "WARNING")
                         
                 except Exception as e:
+                    self.verification_cache.put(url, False, error=str(e)[:80])
                     self.log(f"   ❌ Error: {str(e)[:30]}...", "WARNING")
                 
                 time.sleep(1)
@@ -1535,6 +1785,8 @@ class IPTVExtractorDefinitivo:
             
         except Exception as e:
             self.log(f"❌ Error en verificación: {e}", "ERROR")
+        finally:
+            self.verification_cache.save()
     
     async def extract_main_source_fast(self, site_name="embed.ksdjugfsddeports.fun"):
         """Método ultra-rápido para extraer de la fuente principal embed.ksdjugfsddeports.fun"""
@@ -1719,6 +1971,10 @@ class IPTVExtractorDefinitivo:
             self.log(f"💥 Error crítico en extracción ultra-rápida: {e}", "CRITICAL")
             return []
 
+def ask_sniff_media():
+    """Pregunta si añadir al título de cada canal la calidad detectada (codec/resolución)"""
+    return input("📐 ¿Detectar codec y resolución de cada canal para el M3U (lee ~384 KB por stream)? (y/n): ").lower().strip() == 'y'
+
 async def main():
     """Función principal del extractor definitivo"""
     print("🔥" * 80)
@@ -1757,26 +2013,38 @@ async def main():
         all_channels = []
         sites = [name for name, config in extractor.site_configs.items() if config.get("verified_working", False)]
         
-        for site_name in sites:
-            try:
-                extractor.log(f"🌐 PROCESANDO {site_name.upper()} CON PROTECCIÓN AVANZADA")
-                site_channels = await extractor.extract_site_complete_protected(site_name)
-                all_channels.extend(site_channels)
-                
-                extractor.log(f"✅ {site_name}: {len(site_channels)} canales extraídos")
-                
-                # Pausa más larga entre sitios para evitar detección
-                await asyncio.sleep(random.uniform(15, 25))
-                
-            except Exception as e:
-                extractor.log(f"❌ Error en {site_name}: {e}", "ERROR")
-                continue
+        ceiling = input("📶 Ancho de banda máximo por canal en kbps (vacío = sin límite): ").strip()
+        if ceiling.isdigit():
+            extractor.max_bandwidth = int(ceiling) * 1000
+        extractor.per_quality_entries = input("📶 ¿Añadir una entrada por calidad de cada master? (y/n): ").lower().strip() == 'y'
+        extractor.sniff_media = ask_sniff_media()
+        
+        # El M3U se escribe según se resuelven los canales: si algo revienta a mitad, lo extraído no se pierde
+        for recovered in recover_interrupted():
+            extractor.log(f"♻️ M3U de una ejecución interrumpida recuperado: {recovered}", "WARNING")
+        filename = f"iptv_definitivo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.m3u"
+        with extractor.open_m3u_writer(filename) as writer:
+            for site_name in sites:
+                try:
+                    extractor.log(f"🌐 PROCESANDO {site_name.upper()} CON PROTECCIÓN AVANZADA")
+                    site_channels = await extractor.extract_site_complete_protected(site_name, writer=writer)
+                    all_channels.extend(site_channels)
+                    
+                    extractor.log(f"✅ {site_name}: {len(site_channels)} canales extraídos")
+                    
+                    # Pausa más larga entre sitios para evitar detección
+                    await asyncio.sleep(random.uniform(15, 25))
+                    
+                except Exception as e:
+                    extractor.log(f"❌ Error en {site_name}: {e}", "ERROR")
+                    continue
         
         if all_channels:
             extractor.log(f"🎊 EXTRACCIÓN COMPLETADA: {len(all_channels)} canales totales", "CRITICAL")
             
-            # Generar M3U
-            m3u_file = extractor.generate_m3u_enhanced(all_channels)
+            m3u_file = writer.finalize()
+            if m3u_file:
+                extractor.log(f"✅ M3U generado: {m3u_file}", "SUCCESS")
             
             if m3u_file:
                 print(f"\n🎯 RESULTADO FINAL:")
@@ -1793,6 +2061,10 @@ async def main():
                 for site, count in by_site.items():
                     print(f"   🌐 {site}: {count} canales")
                 
+                export = input(f"\n¿Exportar también a JSONL, XSPF, JSON Xtream y M3U.gz? (y/n): ").lower().strip()
+                if export == 'y':
+                    extractor.export_channels(all_channels, os.path.splitext(m3u_file)[0])
+                
                 # Preguntar por verificación
                 verify = input(f"\n¿Verificar una muestra de streams? (y/n): ").lower().strip()
                 if verify == 'y':
@@ -1813,12 +2085,13 @@ async def main():
             site_choice = int(input(f"\n👉 Seleccione sitio (1-{len(sites)}): ")) - 1
             if 0 <= site_choice < len(sites):
                 site_name = sites[site_choice]
+                sniff_media = ask_sniff_media()
                 
                 extractor.log(f"🎯 Extrayendo {site_name.upper()} con protección avanzada")
                 channels = await extractor.extract_site_complete_protected(site_name)
                 
                 if channels:
-                    m3u_file = extractor.generate_m3u_enhanced(channels, f"iptv_{site_name}")
+                    m3u_file = extractor.generate_m3u_enhanced(channels, f"iptv_{site_name}", sniff_media=sniff_media)
                     if m3u_file:
                         print(f"\n✅ Extracción completada:")
                         print(f"   📺 Canales: {len(channels)}")
@@ -1831,6 +2104,7 @@ async def main():
     elif choice == "3":
         # Prueba especial de tvplusgratis2
         extractor.log("🔥 PRUEBA ESPECIAL: TVPLUSGRATIS2.COM CON MÁXIMA PROTECCIÓN")
+        sniff_media = ask_sniff_media()
         
         try:
             channels = await extractor.extract_site_complete_protected("tvplusgratis2.com")
@@ -1839,7 +2113,7 @@ async def main():
                 extractor.log(f"🎊 EXTRACCIÓN EXITOSA: {len(channels)} canales encontrados", "CRITICAL")
                 
                 # Generar M3U especial para verificación
-                m3u_file = extractor.generate_m3u_enhanced(channels, "tvplusgratis2_prueba")
+                m3u_file = extractor.generate_m3u_enhanced(channels, "tvplusgratis2_prueba", sniff_media=sniff_media)
                 
                 if m3u_file:
                     print(f"\n🎯 RESULTADO DE PRUEBA:")
@@ -1920,8 +2194,12 @@ async def main():
                 file_choice = int(input(f"\n👉 Seleccione archivo (1-{len(m3u_files)}): ")) - 1
                 if 0 <= file_choice < len(m3u_files):
                     selected_file = m3u_files[file_choice]
-                    sample_size = int(input("Número de streams a verificar (default: 10): ") or "10")
-                    extractor.verify_streams_sample(selected_file, sample_size)
+                    sample_size = int(input("Máximo de streams a sondear (default: 300): ") or "300")
+                    precision = float(input("Precisión deseada en % (default: 5): ") or "5") / 100
+                    freshness = input("¿Comprobar que los HLS avanzan (live/frozen/dead)? (y/n): ").lower().strip() == 'y'
+                    force_refresh = input("¿Ignorar la caché de verificación? (y/n): ").lower().strip() == 'y'
+                    extractor.verify_streams_sample(selected_file, sample_size, freshness=freshness,
+                                                    force_refresh=force_refresh, precision=precision)
             except ValueError:
                 print("❌ Entrada inválida")
         else:
@@ -1946,6 +2224,7 @@ async def main():
         # Ultra-rápido: Fuente principal
         extractor.log("⚡ MODO ULTRA-RÁPIDO: FUENTE PRINCIPAL")
         extractor.log("🎯 Extrayendo de embed.ksdjugfsddeports.fun con velocidad máxima")
+        sniff_media = ask_sniff_media()
         
         try:
             channels = await extractor.extract_main_source_fast()
@@ -1954,7 +2233,7 @@ async def main():
                 extractor.log(f"🚀 EXTRACCIÓN ULTRA-RÁPIDA COMPLETADA: {len(channels)} canales", "CRITICAL")
                 
                 # Generar M3U ultra-rápido con nombre específico (sin timestamp)
-                m3u_file = extractor.generate_m3u_fixed_name(channels, "iptvfuenteprincipal.m3u")
+                m3u_file = extractor.generate_m3u_fixed_name(channels, "iptvfuenteprincipal.m3u", sniff_media=sniff_media)
                 
                 if m3u_file:
                     print(f"\n⚡ RESULTADO ULTRA-RÁPIDO:")
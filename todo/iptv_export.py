@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📦 IPTV EXPORT - Exportación de canales a formatos estructurados
+Los registros de canal resueltos (nombre, fuente, página original, URLs de
+respaldo, método de extracción, estado de verificación de la caché o del
+monitor) se escriben en una
+sola pasada a JSON Lines, XSPF, un catálogo JSON al estilo Xtream Codes y
+M3U comprimido con gzip. Cada exportador escribe en streaming sobre
+<archivo>.tmp y lo publica con un rename atómico al cerrar
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import time
+from xml.sax.saxutils import escape
+
+from iptv_groups import classify_group
+from iptv_m3u import iter_m3u
+from iptv_monitor import DEFAULT_STATUS_FILE, load_stream_status
+
+EXPORT_FORMATS = ('jsonl', 'xspf', 'xtream', 'm3u.gz')
+EXTENSIONS = {'jsonl': '.jsonl', 'xspf': '.xspf', 'xtream': '.xtream.json', 'm3u.gz': '.m3u.gz'}
+_TITLE_SOURCE_RE = re.compile(r'\s*\[([^\]]+)\]')
+
+
+def channel_record(channel, cache=None, status=None):
+    """Registro exportable de un canal
+
+    El estado de verificación sale del canal o, si no lo trae, de lo más reciente
+    entre la VerificationCache y el archivo de estado del monitor (load_stream_status)
+    """
+    verification = channel.get('verification')
+    if verification is None:
+        candidates = []
+        if cache is not None:
+            candidates.append(cache.get(channel['url']) or cache.get(channel['url'], mode='freshness'))
+        if status:
+            monitored = status.get(channel['url'])
+            if monitored and monitored['online'] is not None:
+                candidates.append(monitored)
+        latest = max((entry for entry in candidates if entry), key=lambda entry: entry['checked_at'], default=None)
+        if latest:
+            verification = {'online': latest['online'], 'status': latest['status'], 'checked_at': latest['checked_at']}
+    source = channel.get('source') or 'unknown'
+    backup_urls = list(channel.get('backup_urls') or [])
+    return {
+        'name': channel.get('name') or channel['url'],
+        'url': channel['url'],
+        'source': source,
+        'group': channel.get('group') or classify_group(channel.get('name') or '', source),
+        'original_page': channel.get('original_page'),
+        'backup_urls': backup_urls,
+        # Grupo de failover: principal + respaldos en orden de preferencia (sin repetir)
+        'candidates': list(dict.fromkeys([channel['url']] + backup_urls)),
+        'failover_group': channel.get('failover_group'),
+        'alternate_pages': list(channel.get('alternate_pages') or []),
+        'extraction_method': channel.get('extraction_method'),
+        'media': channel.get('media'),
+        'master_url': channel.get('master_url'),
+        'variants': channel.get('variants') or [],
+        'verification': verification,
+    }
+
+
+def entry_channel(entry):
+    """M3UEntry → diccionario de canal (para exportar playlists ya generadas)"""
+    title = entry.tvg_name or entry.title or entry.url
+    sources = _TITLE_SOURCE_RE.findall(entry.title or '')
+    return {
+        'name': _TITLE_SOURCE_RE.sub('', title).strip() or title,
+        'url': entry.url,
+        'source': sources[-1] if sources else 'unknown',
+        'group': entry.group_title,
+    }
+
+
+def load_failover_candidates(playlist_path):
+    """URL principal → candidatas en orden, desde el JSONL exportado junto al M3U (<playlist>.jsonl), si existe"""
+    candidates = {}
+    path = os.path.splitext(playlist_path)[0] + EXTENSIONS['jsonl']
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(record, dict) or not record.get('url'):
+                    continue
+                # Los JSONL anteriores a 'candidates' solo traen backup_urls
+                urls = record.get('candidates') or [record['url']] + list(record.get('backup_urls') or [])
+                if len(urls) > 1:
+                    candidates[record['url']] = urls
+    except OSError:
+        pass
+    return candidates
+
+
+def default_m3u_entry(record):
+    return (f'#EXTINF:-1 tvg-name="{record["name"]}" tvg-logo="" group-title="{record["group"]}",'
+            f'{record["name"]} [{record["source"]}]\n{record["url"]}\n')
+
+
+class _Exporter:
+    """Base: archivo temporal abierto en open(), write(registro) por canal y publicación atómica en close()"""
+
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = f'{path}.tmp'
+        self.count = 0
+        self.handle = None
+
+    def _open(self):
+        return open(self.temp_path, 'w', encoding='utf-8')
+
+    def open(self):
+        self.handle = self._open()
+        self.write_header()
+        return self
+
+    def write_header(self):
+        pass
+
+    def write_footer(self):
+        pass
+
+    def write(self, record, channel=None):
+        self.write_record(record, channel)
+        self.count += 1
+
+    def close(self):
+        self.write_footer()
+        self.handle.close()
+        os.replace(self.temp_path, self.path)
+        return self.path
+
+    def abort(self):
+        if self.handle is not None:
+            self.handle.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class JSONLinesExporter(_Exporter):
+    """Un objeto JSON por línea: se puede leer en streaming sin parsear M3U"""
+
+    def write_record(self, record, channel):
+        self.handle.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class XSPFExporter(_Exporter):
+    """Playlist XSPF (VLC): título, fuente como creator, grupo como album y página original como info"""
+
+    def write_header(self):
+        self.handle.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                          '<playlist version="1" xmlns="http://xspf.org/ns/0/">\n'
+                          '  <title>IPTV Extractor</title>\n'
+                          '  <trackList>\n')
+
+    def write_record(self, record, channel):
+        lines = ['    <track>', f'      <location>{escape(record["url"])}</location>',
+                 f'      <title>{escape(record["name"])}</title>',
+                 f'      <creator>{escape(record["source"])}</creator>',
+                 f'      <album>{escape(record["group"])}</album>']
+        if record['original_page']:
+            lines.append(f'      <info>{escape(record["original_page"])}</info>')
+        if record['verification']:
+            lines.append(f'      <annotation>{escape(record["verification"]["status"])}</annotation>')
+        lines.append('    </track>')
+        self.handle.write('\n'.join(lines) + '\n')
+
+    def write_footer(self):
+        self.handle.write('  </trackList>\n</playlist>\n')
+
+
+class XtreamExporter(_Exporter):
+    """Catálogo JSON con la forma de get_live_categories / get_live_streams de Xtream Codes
+
+    Los streams se escriben según llegan; las categorías (conocidas al final) van
+    después en el mismo objeto
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.categories = {}
+        self.added = str(int(time.time()))
+
+    def write_header(self):
+        self.handle.write('{"streams": [\n')
+
+    def write_record(self, record, channel):
+        category_id = self.categories.setdefault(record['group'], str(len(self.categories) + 1))
+        verification = record['verification'] or {}
+        stream = {
+            'num': self.count + 1,
+            'name': record['name'],
+            'stream_type': 'live',
+            'stream_id': self.count + 1,
+            'stream_icon': '',
+            'epg_channel_id': None,
+            'added': self.added,
+            'category_id': category_id,
+            'custom_sid': '',
+            'tv_archive': 0,
+            'direct_source': record['url'],
+            'tv_archive_duration': 0,
+            # Campos propios (no Xtream): lo que un consumidor necesitaría volver a sacar del M3U
+            'source': record['source'],
+            'backup_sources': record['backup_urls'],
+            'original_page': record['original_page'],
+            'extraction_method': record['extraction_method'],
+            'online': verification.get('online'),
+            'status': verification.get('status'),
+        }
+        separator = ',\n' if self.count else ''
+        self.handle.write(separator + json.dumps(stream, ensure_ascii=False))
+
+    def write_footer(self):
+        categories = [{'category_id': category_id, 'category_name': name, 'parent_id': 0}
+                      for name, category_id in self.categories.items()]
+        self.handle.write('\n], "categories": ' + json.dumps(categories, ensure_ascii=False) + '}\n')
+
+
+class GzipM3UExporter(_Exporter):
+    """M3U comprimido (entradas en orden de llegada, sin secciones)"""
+
+    def __init__(self, path, format_entry=None):
+        super().__init__(path)
+        self.format_entry = format_entry
+
+    def _open(self):
+        return gzip.open(self.temp_path, 'wt', encoding='utf-8', compresslevel=6)
+
+    def write_header(self):
+        self.handle.write('#EXTM3U\n')
+
+    def write_record(self, record, channel):
+        # Con format_entry (p. ej. format_m3u_entry de iptv_definitivo) las entradas salen igual que en el .m3u
+        if self.format_entry is not None and channel is not None:
+            self.handle.write(self.format_entry(channel))
+        else:
+            self.handle.write(default_m3u_entry(record))
+
+
+class MultiExporter:
+    """Reparte cada canal entre los exportadores pedidos: una pasada, varios formatos
+
+    Misma interfaz que StreamingM3UWriter (add / add_many / context manager), así
+    que sirve igual para exportar al final o según se resuelven los canales
+    """
+
+    def __init__(self, base_path, formats=EXPORT_FORMATS, format_entry=None, cache=None, status=None):
+        unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+        if unknown:
+            raise ValueError(f"Formatos no soportados: {', '.join(unknown)}")
+        self.cache = cache
+        self.status = status
+        self.exporters = {}
+        for fmt in formats:
+            path = base_path + EXTENSIONS[fmt]
+            if fmt == 'jsonl':
+                exporter = JSONLinesExporter(path)
+            elif fmt == 'xspf':
+                exporter = XSPFExporter(path)
+            elif fmt == 'xtream':
+                exporter = XtreamExporter(path)
+            else:
+                exporter = GzipM3UExporter(path, format_entry)
+            self.exporters[fmt] = exporter
+        self.count = 0
+        self.closed = False
+        try:
+            for exporter in self.exporters.values():
+                exporter.open()
+        except Exception:
+            self.abort()
+            raise
+
+    def add(self, channel):
+        record = channel_record(channel, self.cache, self.status)
+        for exporter in self.exporters.values():
+            exporter.write(record, channel)
+        self.count += 1
+        return True
+
+    def add_many(self, channels):
+        return sum(1 for channel in channels if self.add(channel))
+
+    def close(self):
+        """Publica todos los archivos; devuelve {formato: ruta}"""
+        if self.closed:
+            return {fmt: exporter.path for fmt, exporter in self.exporters.items()}
+        self.closed = True
+        return {fmt: exporter.close() for fmt, exporter in self.exporters.items()}
+
+    def abort(self):
+        self.closed = True
+        for exporter in self.exporters.values():
+            exporter.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def export_channels(channels, base_path, formats=EXPORT_FORMATS, format_entry=None, cache=None, status=None):
+    """Exporta una lista (o iterable) de canales; devuelve {formato: ruta}"""
+    with MultiExporter(base_path, formats, format_entry=format_entry, cache=cache, status=status) as exporter:
+        exporter.add_many(channels)
+    return exporter.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exporta un M3U a JSON Lines, XSPF, JSON estilo Xtream y M3U gzip')
+    parser.add_argument('playlist', help='M3U de entrada')
+    parser.add_argument('--output', default=None, help='Ruta base de salida (por defecto, la del M3U sin extensión)')
+    parser.add_argument('--formats', default=','.join(EXPORT_FORMATS),
+                        help=f"Formatos separados por comas ({', '.join(EXPORT_FORMATS)})")
+    parser.add_argument('--status', default=DEFAULT_STATUS_FILE,
+                        help='Archivo de estado del monitor (online/offline de cada stream), si existe')
+    args = parser.parse_args()
+
+    base_path = args.output or os.path.splitext(args.playlist)[0]
+    formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+    started = time.time()
+    paths = export_channels((entry_channel(entry) for entry in iter_m3u(args.playlist)), base_path, formats,
+                            status=load_stream_status(args.status))
+    for fmt, path in paths.items():
+        print(f"📦 {fmt}: {path} ({os.path.getsize(path) / 1024:.1f} KB)")
+    print(f"⏱️ Tiempo: {time.time() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
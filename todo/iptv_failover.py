@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🛟 IPTV FAILOVER - Redirección de cada canal a su candidata más sana
+Cada canal de una playlist servida tiene un grupo de failover: la URL
+principal, sus respaldos (candidates / backup_urls del JSONL exportado junto
+al M3U) y las demás entradas con el mismo nombre (listas fusionadas o con
+opciones). En /failover/<nombre>.m3u cada canal aparece una sola vez y su
+URL es /go/<nombre>/<canal>, que responde al momento con un 302 hacia la
+candidata mejor valorada por la caché de verificación y el estado del
+monitor (stream_status.json). Los canales que se
+están viendo se revisan en segundo plano: cuando la candidata activa cae,
+la siguiente petición del reproductor (su reintento) ya va a otra, sin
+cambiar de canal a mano
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+
+from iptv_cache import VerificationCache
+from iptv_export import load_failover_candidates
+from iptv_merge import MEDIA_SUFFIX_RE, channel_key
+from iptv_monitor import DEFAULT_STATUS_FILE, load_stream_status
+from iptv_server import Representation
+from iptv_verify import AIOHTTP_AVAILABLE, DEFAULT_HEADERS, StreamVerifier
+
+if AIOHTTP_AVAILABLE:
+    import aiohttp
+    from aiohttp import web
+
+_TVG_NAME_RE = re.compile(r'tvg-name="([^"]*)"')
+# Nombre visible del grupo: sin etiqueta de fuente [tvplusgratis2] ni "(Opción 2)"; la calidad "(720p)" se conserva
+_TAGS_RE = re.compile(r'\[[^\]]*\]|\((?:opci[oó]n|option)\s*\d+\)', re.IGNORECASE)
+
+
+def group_key(name):
+    """'ESPN 2 HD (Opción 2) [tvplusgratis2] 1080p H264 AAC' → 'espn2': la clave de canal de
+    iptv_merge (la misma que agrupa el relay), estable entre publicaciones y entre fuentes"""
+    return channel_key(name)
+
+
+class FailoverGroup:
+    """Candidatas de un canal en orden de preferencia + estado de la última revisión"""
+
+    __slots__ = ('slug', 'name', 'candidates', 'current', 'checked_at', 'requested_at')
+
+    def __init__(self, slug, name, candidates):
+        self.slug = slug
+        self.name = name
+        self.candidates = candidates
+        self.current = None
+        self.checked_at = 0.0
+        self.requested_at = 0.0
+
+
+def build_failover_groups(playlist, candidates_by_url=None):
+    """Playlist del servidor → ({slug: FailoverGroup}, [(líneas de la primera entrada, slug)])
+
+    Las entradas con el mismo nombre de canal (tvg-name o título sin etiquetas)
+    forman un solo grupo; las candidatas del JSONL de cada entrada van justo
+    detrás de su URL
+    """
+    candidates_by_url = candidates_by_url or {}
+    groups = {}
+    entries = []
+    for _, _, text in playlist.entries:
+        lines = text.rstrip('\n').split('\n')
+        url = lines[-1]
+        name = url
+        if lines[0].startswith('#EXTINF'):
+            found = _TVG_NAME_RE.search(lines[0])
+            name = (found.group(1) if found else '') or lines[0].rsplit(',', 1)[-1]
+        slug = group_key(name) or hashlib.blake2b(url.encode('utf-8'), digest_size=6).hexdigest()
+        group = groups.get(slug)
+        if group is None:
+            group = groups[slug] = FailoverGroup(slug, MEDIA_SUFFIX_RE.sub('', _TAGS_RE.sub('', name)).strip() or name, [])
+            entries.append((lines, slug))
+        for candidate in candidates_by_url.get(url, [url]):
+            if candidate not in group.candidates:
+                group.candidates.append(candidate)
+    return groups, entries
+
+
+class FailoverRedirector:
+    """Rutas /failover/<nombre>.m3u y /go/<nombre>/<canal> para PlaylistServer
+
+    La salud de cada URL sale de lo más reciente entre la VerificationCache (la
+    que rellena el extractor al verificar, más las revisiones propias) y el
+    archivo de estado de HealthMonitor: en línea primero, luego sin datos y por
+    último caídas; a igualdad, el orden del grupo
+    """
+
+    def __init__(self, cache=None, recheck_interval=15.0, active_window=300.0, timeout=8, headers=None,
+                 max_concurrency=16, status_file=DEFAULT_STATUS_FILE):
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp no está instalado (pip install aiohttp)")
+        self.cache = cache if cache is not None else VerificationCache(path=None)
+        self.recheck_interval = recheck_interval
+        # Solo se revisan en segundo plano los canales pedidos en los últimos active_window segundos
+        self.active_window = active_window
+        self.timeout = timeout
+        self.headers = headers or DEFAULT_HEADERS
+        self.verifier = StreamVerifier(max_concurrency=max_concurrency, timeout=timeout, use_ffprobe=False)
+        self.semaphore = None
+        self.status_file = status_file
+        self.monitor_status = {}
+        self._status_signature = None
+
+        self.indexes = {}
+        self.playlists = {}
+        self.checks = {}
+        self.session = None
+        self.server = None
+        self._watcher = None
+        self.stats = {'redirects': 0, 'not_found': 0, 'rechecks': 0, 'probes': 0, 'switches': 0}
+
+    # --- Ciclo de vida ---
+
+    def add_routes(self, app, server):
+        self.server = server
+        app.router.add_get('/failover/{name}.m3u', self.handle_playlist)
+        app.router.add_get('/go/{name}/{slug}', self.handle_redirect)
+        app.on_startup.append(self.open)
+        app.on_cleanup.append(self.close)
+
+    async def open(self, app=None):
+        await asyncio.to_thread(self.refresh_status)
+        self.semaphore = asyncio.Semaphore(self.verifier.max_concurrency)
+        self.session = aiohttp.ClientSession(headers=self.headers, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def close(self, app=None):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+        for task in list(self.checks.values()):
+            task.cancel()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        # Lo aprendido sirve también al extractor en la próxima verificación
+        await asyncio.to_thread(self.cache.save)
+
+    # --- Grupos por playlist ---
+
+    def _index(self, playlist):
+        """Grupos de la versión vigente de la playlist (se reconstruyen cuando el servidor la recarga)"""
+        key = (playlist.path, playlist.signature)
+        index = self.indexes.get(key)
+        if index is None:
+            index = self.indexes[key] = build_failover_groups(playlist, load_failover_candidates(playlist.path))
+            for stale in [other for other in self.indexes if other[0] == playlist.path and other != key]:
+                del self.indexes[stale]
+        return index
+
+    def _failover_playlist(self, playlist, name, base):
+        groups, entries = self._index(playlist)
+        out = ['#EXTM3U']
+        for lines, slug in entries:
+            out.extend(lines[:-1] + [f'{base}/go/{name}/{slug}'])
+        return '\n'.join(out) + '\n'
+
+    async def handle_playlist(self, request):
+        name = request.match_info['name']
+        playlist = self.server.store.get(name)
+        if playlist is None:
+            raise web.HTTPNotFound(text='Playlist no encontrada')
+        base = f'{request.scheme}://{request.host}'
+        key = (playlist.path, playlist.signature, name, base)
+        representation = self.playlists.get(key)
+        if representation is None:
+            groups, _ = self._index(playlist)
+            body = self._failover_playlist(playlist, name, base).encode('utf-8')
+            representation = self.playlists[key] = Representation(body, len(groups))
+            for stale in [other for other in self.playlists if other[0] == playlist.path and other[1] != playlist.signature]:
+                del self.playlists[stale]
+        return self.server.respond(request, representation)
+
+    # --- Elección y redirección ---
+
+    def refresh_status(self):
+        """Relee el archivo de estado del monitor si cambió (mtime, tamaño)"""
+        if not self.status_file:
+            return False
+        try:
+            stat = os.stat(self.status_file)
+        except OSError:
+            return False
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._status_signature:
+            return False
+        self._status_signature = signature
+        self.monitor_status = load_stream_status(self.status_file)
+        return True
+
+    def verification(self, url):
+        """Última verificación no caducada de la URL: caché o monitor, la más reciente"""
+        entry = self.cache.get(url) or self.cache.get(url, mode='freshness')
+        monitored = self.monitor_status.get(url)
+        if monitored and monitored['online'] is not None and self.cache.is_fresh(monitored):
+            if entry is None or monitored['checked_at'] > entry['checked_at']:
+                return monitored
+        return entry
+
+    def health(self, url):
+        """0 en línea, 1 sin datos vigentes, 2 caída (según la última verificación no caducada)"""
+        entry = self.verification(url)
+        if entry is None:
+            return 1
+        return 0 if entry['online'] else 2
+
+    def choose(self, group):
+        ranked = min(range(len(group.candidates)), key=lambda index: (self.health(group.candidates[index]), index))
+        return group.candidates[ranked]
+
+    async def handle_redirect(self, request):
+        playlist = self.server.store.get(request.match_info['name'])
+        group = self._index(playlist)[0].get(request.match_info['slug']) if playlist is not None else None
+        if group is None:
+            self.stats['not_found'] += 1
+            raise web.HTTPNotFound(text='Canal no encontrado')
+
+        self.stats['redirects'] += 1
+        now = time.monotonic()
+        group.requested_at = now
+        url = self.choose(group)
+        if group.current is not None and url != group.current:
+            self._switched(group, url)
+        group.current = url
+        if now - group.checked_at >= self.recheck_interval:
+            self._schedule(group)
+        # Sin caché en el reproductor ni en proxies: la próxima petición debe poder ir a otra candidata
+        raise web.HTTPFound(url, headers={'Cache-Control': 'no-store', 'X-Failover-Candidates': str(len(group.candidates))})
+
+    def _switched(self, group, url):
+        self.stats['switches'] += 1
+        previous = group.candidates.index(group.current) + 1 if group.current in group.candidates else '?'
+        print(f"🛟 {group.name}: candidata {previous} → {group.candidates.index(url) + 1} de {len(group.candidates)}")
+
+    # --- Revisión en segundo plano ---
+
+    def _schedule(self, group):
+        """Una sola revisión en curso por grupo"""
+        if group.slug in self.checks or self.session is None:
+            return
+        task = asyncio.ensure_future(self._recheck(group))
+        self.checks[group.slug] = task
+        task.add_done_callback(lambda _: self.checks.pop(group.slug, None))
+
+    async def _probe(self, url):
+        async with self.semaphore:
+            self.stats['probes'] += 1
+            result = await self.verifier.check_stream(self.session, {'url': url})
+        self.cache.put_result(result)
+        return result['online']
+
+    async def _recheck(self, group):
+        """Comprueba la candidata activa; si cayó, todas las demás a la vez"""
+        self.stats['rechecks'] += 1
+        group.checked_at = time.monotonic()
+        current = group.current or self.choose(group)
+        try:
+            if await self._probe(current):
+                return
+            others = [url for url in group.candidates if url != current]
+            if others:
+                await asyncio.gather(*(self._probe(url) for url in others))
+        except Exception as e:
+            print(f"⚠️ Error revisando {group.name}: {e}")
+            return
+        url = self.choose(group)
+        if url != group.current:
+            if group.current is not None:
+                self._switched(group, url)
+            group.current = url
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.recheck_interval)
+            await asyncio.to_thread(self.refresh_status)
+            now = time.monotonic()
+            for groups, _ in list(self.indexes.values()):
+                for group in groups.values():
+                    if now - group.requested_at < self.active_window and now - group.checked_at >= self.recheck_interval:
+                        self._schedule(group)
+
+    def report(self):
+        stats = self.stats
+        print(f"🛟 Redirecciones: {stats['redirects']} (cambios de candidata: {stats['switches']}, "
+              f"no encontradas: {stats['not_found']})  🔎 Revisiones: {stats['rechecks']} ({stats['probes']} sondas)")
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🎞️ IPTV FFPROBE - Pool asíncrono de ffprobe con extracción de metadatos
+Paralelismo acotado, deadline por sonda (el proceso se mata al vencer)
+y parseo de -show_streams -of json a codec, resolución y bitrate
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import signal
+import subprocess
+import time
+
+FFPROBE_ARGS = [
+    '-hide_banner', '-loglevel', 'error',
+    '-show_streams', '-show_format',
+    '-of', 'json',
+]
+
+# Grupo de procesos propio: al matar por timeout no quedan hijos con los pipes abiertos
+_SESSION_KWARGS = {'start_new_session': True} if os.name == 'posix' else {}
+
+
+def _kill_process_group(process):
+    try:
+        if _SESSION_KWARGS:
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _frame_rate(value):
+    """'30000/1001' → 29.97"""
+    try:
+        numerator, _, denominator = str(value).partition('/')
+        rate = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return round(rate, 2) if rate > 0 else None
+
+
+def parse_ffprobe_output(output):
+    """Convierte la salida JSON de ffprobe en metadatos compactos del stream"""
+    try:
+        data = json.loads(output or '{}')
+    except ValueError:
+        return None
+
+    streams = data.get('streams') or []
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    if video is None and audio is None:
+        return None
+
+    metadata = {
+        'video_codec': video.get('codec_name') if video else None,
+        'profile': video.get('profile') if video else None,
+        'width': _to_int(video.get('width')) if video else None,
+        'height': _to_int(video.get('height')) if video else None,
+        'fps': _frame_rate(video.get('avg_frame_rate') or video.get('r_frame_rate')) if video else None,
+        'audio_codec': audio.get('codec_name') if audio else None,
+        'audio_channels': _to_int(audio.get('channels')) if audio else None,
+        'bitrate': _to_int((data.get('format') or {}).get('bit_rate')),
+        'streams': len(streams),
+    }
+    if metadata['bitrate'] is None:
+        # Los HLS no suelen declarar bitrate global: sumar el de cada pista
+        rates = [_to_int(s.get('bit_rate')) for s in streams]
+        metadata['bitrate'] = sum(rate for rate in rates if rate) or None
+    return metadata
+
+
+def new_ffprobe_result(url):
+    return {
+        'url': url,
+        'ok': False,
+        'metadata': None,
+        'error': None,
+        'latency': None,
+    }
+
+
+def _finish(result, returncode, stdout, stderr, started):
+    result['latency'] = round(time.monotonic() - started, 3)
+    if returncode != 0:
+        message = (stderr or b'').decode('utf-8', errors='replace').strip().splitlines()
+        result['error'] = message[-1][:80] if message else f'ffprobe código {returncode}'
+        return result
+
+    result['metadata'] = parse_ffprobe_output((stdout or b'').decode('utf-8', errors='replace'))
+    result['ok'] = result['metadata'] is not None
+    if not result['ok']:
+        result['error'] = 'sin pistas de audio/vídeo'
+    return result
+
+
+class FFprobePool:
+    """Pool asíncrono de ffprobe: como mucho max_workers procesos vivos a la vez"""
+
+    def __init__(self, max_workers=4, timeout=15, ffprobe_path=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.ffprobe_path = ffprobe_path or shutil.which('ffprobe')
+        self._slots = None
+
+        self.launched = 0
+        self.killed = 0
+
+    @property
+    def available(self):
+        return self.ffprobe_path is not None
+
+    async def probe(self, url, timeout=None):
+        """Ejecuta ffprobe sobre la URL y devuelve {'ok', 'metadata', 'error', 'latency'}"""
+        result = new_ffprobe_result(url)
+        if not self.available:
+            result['error'] = 'ffprobe no disponible'
+            return result
+
+        # El semáforo se crea perezosamente para quedar ligado al event loop en uso
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+
+        async with self._slots:
+            started = time.monotonic()
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    self.ffprobe_path, *FFPROBE_ARGS, '-i', url,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    **_SESSION_KWARGS,
+                )
+            except (OSError, ValueError) as e:
+                result['error'] = str(e)[:80]
+                return result
+            self.launched += 1
+
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout or self.timeout)
+            except asyncio.TimeoutError:
+                await self._kill(process)
+                result['error'] = 'timeout'
+                result['latency'] = round(time.monotonic() - started, 3)
+                return result
+            except asyncio.CancelledError:
+                await self._kill(process)
+                raise
+
+            return _finish(result, process.returncode, stdout, stderr, started)
+
+    async def _kill(self, process):
+        if process.returncode is None:
+            _kill_process_group(process)
+            self.killed += 1
+        await process.wait()
+
+    async def probe_many(self, urls):
+        """Sondea varias URLs respetando el límite del pool; resultados en el mismo orden"""
+        return await asyncio.gather(*(self.probe(url) for url in urls))
+
+    def stats(self):
+        return {'max_workers': self.max_workers, 'launched': self.launched, 'killed': self.killed}
+
+
+def ffprobe_stream_sync(url, timeout=15):
+    """Versión bloqueante (para hilos): misma salida que FFprobePool.probe"""
+    result = new_ffprobe_result(url)
+    ffprobe_path = shutil.which('ffprobe')
+    if ffprobe_path is None:
+        result['error'] = 'ffprobe no disponible'
+        return result
+
+    started = time.monotonic()
+    try:
+        process = subprocess.Popen(
+            [ffprobe_path, *FFPROBE_ARGS, '-i', url],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            **_SESSION_KWARGS,
+        )
+    except OSError as e:
+        result['error'] = str(e)[:80]
+        return result
+
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill_process_group(process)
+        process.communicate()
+        result['error'] = 'timeout'
+        result['latency'] = round(time.monotonic() - started, 3)
+        return result
+
+    return _finish(result, process.returncode, stdout, stderr, started)
+
+
+def describe_media(metadata):
+    """Etiqueta corta para logs/M3U: '1080p H264 AAC' o 'Solo audio AAC'"""
+    if not metadata:
+        return ''
+    parts = []
+    if metadata.get('height'):
+        parts.append(f"{metadata['height']}p")
+    if metadata.get('video_codec'):
+        parts.append(metadata['video_codec'].upper())
+    elif metadata.get('audio_codec'):
+        parts.append('Solo audio')
+    if metadata.get('audio_codec'):
+        parts.append(metadata['audio_codec'].upper())
+    return ' '.join(parts)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🏷️ IPTV GROUPS - Clasificación de canales en grupos (group-title)
+Una tabla de reglas ordenada (la primera que coincide gana) con palabras
+clave y expresiones regulares, más overrides por fuente. Se compila una
+sola vez en una única expresión regular: clasificar un nombre es un solo
+match, así que todos los generadores de M3U agrupan igual sin coste
+apreciable aunque la lista tenga cientos de miles de canales
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+DEFAULT_GROUP = "IPTV Live"
+
+# Orden = prioridad. Las palabras clave se buscan como subcadena del nombre en minúsculas y
+# sin acentos; los patrones son regex sobre ese mismo texto (sin grupos con nombre)
+GROUP_RULES = [
+    {
+        'group': "Demos y Pruebas",
+        'keywords': ['big buck bunny', 'sintel', 'tears of steel', 'test stream', 'sample stream'],
+    },
+    {
+        'group': "Deportes",
+        'keywords': ['sport', 'deporte', 'espn', 'tudn', 'dazn', 'futbol', 'football', 'liga de campeones'],
+        'patterns': [r'fox(?! news)', r'\bgol\b', r'\bf1\b', r'\bnba\b', r'\bnfl\b'],
+    },
+    {
+        'group': "Noticias",
+        'keywords': ['news', 'noticia', 'cnn', 'telesur'],
+        'patterns': [r'\b24 ?h(?:oras)?\b'],
+    },
+    {
+        'group': "Infantil",
+        'keywords': ['disney', 'cartoon', 'nick', 'kids', 'infantil', 'boomerang', 'baby'],
+    },
+    {
+        'group': "Películas",
+        'keywords': ['movie', 'cinema', 'film', 'cine', 'pelicula', 'golden'],
+    },
+    {
+        'group': "Historia y Documentales",
+        'keywords': ['history', 'historia', 'discovery', 'national geographic', 'nat geo', 'animal planet',
+                     'documental', 'investigation'],
+    },
+    {
+        'group': "Entretenimiento",
+        'keywords': ['warner', 'universal', 'tnt series', 'star channel', 'sony', 'syfy', 'paramount', 'amc'],
+        'patterns': [r'\bfx\b', r'\baxn\b', r'\be!'],
+    },
+]
+
+# Fuente → grupo fijo para todos sus canales, por encima de las reglas
+# (p. ej. {'futbollibre.net': "Deportes"}); la fuente se compara sin 'www.' y en minúsculas
+SOURCE_OVERRIDES = {}
+
+
+def fold(text):
+    """Minúsculas y sin acentos (las reglas se escriben así)"""
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return text.casefold()
+
+
+def normalize_source(source):
+    source = (source or '').strip().lower()
+    return source[4:] if source.startswith('www.') else source
+
+
+class GroupClassifier:
+    """Tabla de reglas compilada: classify(nombre, fuente) → group-title"""
+
+    def __init__(self, rules=GROUP_RULES, source_overrides=SOURCE_OVERRIDES, default=DEFAULT_GROUP):
+        self.default = default
+        self.groups = []
+        self.source_overrides = {normalize_source(source): group for source, group in source_overrides.items()}
+        branches = []
+        for rule in rules:
+            alternatives = [re.escape(fold(keyword)) for keyword in rule.get('keywords', ())]
+            alternatives += list(rule.get('patterns', ()))
+            if not alternatives:
+                continue
+            # Una rama por regla, anclada al principio: re prueba las ramas en orden, así que
+            # gana la primera regla que coincide en cualquier punto del nombre, no la más a la izquierda
+            branches.append(f'.*?(?P<r{len(self.groups)}>{"|".join(alternatives)})')
+            self.groups.append(rule['group'])
+        self._matcher = re.compile('|'.join(branches), re.DOTALL) if branches else None
+
+    def classify(self, name, source=None):
+        if source and self.source_overrides:
+            override = self.source_overrides.get(normalize_source(source))
+            if override:
+                return override
+        if self._matcher is None:
+            return self.default
+        match = self._matcher.match(fold(name or ''))
+        if match is None:
+            return self.default
+        return self.groups[int(match.lastgroup[1:])]
+
+
+CLASSIFIER = GroupClassifier()
+
+
+@lru_cache(maxsize=65536)
+def classify_group(name, source=None):
+    """Grupo de un canal con la tabla por defecto (cacheado: en listas grandes los nombres se repiten)"""
+    return CLASSIFIER.classify(name, source)
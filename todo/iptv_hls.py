@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📺 IPTV HLS - Parser de manifiestos HLS y sonda de vida nativa
+GET del manifiesto, validación de #EXTM3U, selección de variante y lectura
+de unos pocos bytes de un segmento para confirmar TS/fMP4 sin lanzar ffprobe
+(con sniff=True lee lo suficiente para sacar codec y resolución, ver iptv_sniffer)
+Chequeo de frescura: el media sequence debe avanzar entre dos lecturas
+Variantes de un master: calidades disponibles y elección bajo un techo de bandwidth
+"""
+
+import asyncio
+import contextlib
+import re
+import socket
+import ssl
+import time
+from urllib.parse import urljoin
+
+from iptv_sniffer import SNIFF_BYTES, sniff_media
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+MAX_MANIFEST_BYTES = 2 * 1024 * 1024
+SEGMENT_PROBE_BYTES = 4096
+TS_PACKET_SIZE = 188
+FMP4_BOX_TYPES = {b'ftyp', b'styp', b'moof', b'moov', b'sidx', b'emsg', b'prft'}
+
+_ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def is_hls_url(url):
+    """True si la URL parece un manifiesto HLS"""
+    return '.m3u8' in url.lower()
+
+
+def parse_attributes(text):
+    """Parsea una lista de atributos HLS (BANDWIDTH=...,CODECS="...")"""
+    return {key: value.strip('"') for key, value in _ATTRIBUTE_RE.findall(text)}
+
+
+def parse_playlist(text, base_url=''):
+    """Parsea un manifiesto HLS (master o media) a un diccionario"""
+    playlist = {
+        'valid': text.lstrip('\ufeff \r\n\t').startswith('#EXTM3U'),
+        'is_master': False,
+        'variants': [],
+        'segments': [],
+        'target_duration': None,
+        'media_sequence': 0,
+        'ended': False,
+        'init_segment': None,
+    }
+    if not playlist['valid']:
+        return playlist
+
+    pending_variant = None
+    pending_duration = None
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            pending_variant = parse_attributes(line[len('#EXT-X-STREAM-INF:'):])
+        elif line.startswith('#EXTINF:'):
+            try:
+                pending_duration = float(line[len('#EXTINF:'):].split(',', 1)[0])
+            except ValueError:
+                pending_duration = 0.0
+        elif line.startswith('#EXT-X-TARGETDURATION:'):
+            try:
+                playlist['target_duration'] = float(line.split(':', 1)[1])
+            except ValueError:
+                pass
+        elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            try:
+                playlist['media_sequence'] = int(line.split(':', 1)[1])
+            except ValueError:
+                pass
+        elif line.startswith('#EXT-X-ENDLIST'):
+            playlist['ended'] = True
+        elif line.startswith('#EXT-X-MAP:'):
+            uri = parse_attributes(line[len('#EXT-X-MAP:'):]).get('URI')
+            if uri:
+                playlist['init_segment'] = urljoin(base_url, uri)
+        elif line.startswith('#'):
+            continue
+        elif pending_variant is not None:
+            bandwidth = pending_variant.get('BANDWIDTH', '0')
+            playlist['variants'].append({
+                'url': urljoin(base_url, line),
+                'bandwidth': int(bandwidth) if bandwidth.isdigit() else 0,
+                'resolution': pending_variant.get('RESOLUTION'),
+                'codecs': pending_variant.get('CODECS'),
+                'attributes': pending_variant,
+            })
+            pending_variant = None
+        else:
+            playlist['segments'].append({
+                'url': urljoin(base_url, line),
+                'duration': pending_duration,
+            })
+            pending_duration = None
+
+    playlist['is_master'] = bool(playlist['variants'])
+    return playlist
+
+
+def pick_probe_variant(variants):
+    """Variante más barata de probar (menor bandwidth declarado)"""
+    if not variants:
+        return None
+    return min(variants, key=lambda variant: variant['bandwidth'] or float('inf'))
+
+
+def pick_probe_segment(segments):
+    """Segmento cercano al live edge (3º desde el final) para que no haya expirado"""
+    if not segments:
+        return None
+    return segments[-min(3, len(segments))]
+
+
+def sniff_segment_format(data):
+    """Identifica el contenedor de un segmento por sus primeros bytes"""
+    if not data or data.lstrip()[:1] == b'<':
+        # Vacío o página HTML de error servida con 200
+        return None
+
+    # MPEG-TS: byte de sincronía 0x47 cada 188 bytes (con posible basura inicial). Hace falta
+    # al menos un segundo 0x47 presente: una 'G' suelta en un texto corto no es un paquete
+    for offset in range(max(0, min(TS_PACKET_SIZE, len(data) - TS_PACKET_SIZE))):
+        if data[offset] != 0x47:
+            continue
+        following = [position for position in (offset + TS_PACKET_SIZE * k for k in (1, 2, 3)) if position < len(data)]
+        if all(data[position] == 0x47 for position in following):
+            return 'ts'
+
+    # fMP4 / CMAF: cabecera de box ISO-BMFF
+    if len(data) >= 8 and data[4:8] in FMP4_BOX_TYPES:
+        return 'fmp4'
+
+    # Audio empaquetado (HLS solo audio): ID3 + ADTS
+    if data[:3] == b'ID3':
+        return 'id3'
+    if len(data) >= 2 and data[0] == 0xFF and (data[1] & 0xF0) == 0xF0:
+        return 'aac'
+
+    return None
+
+
+def new_probe_result(url):
+    return {
+        'url': url,
+        'status': 'offline',
+        'http_status': None,
+        'is_master': False,
+        'variant_url': None,
+        'segment_url': None,
+        'segment_format': None,
+        'media_sequence': None,
+        'target_duration': None,
+        'latency': None,
+        'manifest_latency': None,
+        'media': None,
+        'error': None,
+    }
+
+
+def _probe_steps(result, started, segment_bytes, max_depth, sniff=False):
+    """Lógica de la sonda sin I/O: hace yield de (url, max_bytes, byte_range) y recibe (status, bytes, url final)
+
+    Las URIs relativas se resuelven contra la URL final (tras redirecciones: tokens de CDN)
+    """
+    manifest_url = result['url']
+    for _ in range(max_depth):
+        status, body, final_url = yield manifest_url, MAX_MANIFEST_BYTES, None
+        result['http_status'] = status
+        if result['manifest_latency'] is None:
+            result['manifest_latency'] = round(time.monotonic() - started, 3)
+
+        if not body:
+            result['error'] = f'HTTP {status}'
+            return
+
+        playlist = parse_playlist(body.decode('utf-8', errors='replace'), final_url)
+        if not playlist['valid']:
+            result['status'] = 'invalid'
+            result['error'] = 'sin #EXTM3U'
+            return
+        if not playlist['is_master']:
+            break
+
+        result['is_master'] = True
+        manifest_url = pick_probe_variant(playlist['variants'])['url']
+        result['variant_url'] = manifest_url
+    else:
+        result['status'] = 'invalid'
+        result['error'] = 'masters anidados'
+        return
+
+    result['media_sequence'] = playlist['media_sequence']
+    result['target_duration'] = playlist['target_duration']
+
+    segment = pick_probe_segment(playlist['segments'])
+    if segment is None:
+        result['status'] = 'empty'
+        result['error'] = 'playlist sin segmentos'
+        return
+
+    result['segment_url'] = segment['url']
+    if sniff:
+        segment_bytes = max(segment_bytes, SNIFF_BYTES)
+    status, data, _ = yield segment['url'], segment_bytes, segment_bytes
+    result['http_status'] = status
+    if not data:
+        result['error'] = f'segmento HTTP {status}'
+        return
+
+    result['segment_format'] = sniff_segment_format(data)
+    if result['segment_format']:
+        result['status'] = 'online'
+    else:
+        result['status'] = 'invalid'
+        result['error'] = 'segmento no es TS/fMP4'
+        return
+
+    if sniff:
+        init_data = None
+        if result['segment_format'] == 'fmp4' and playlist['init_segment']:
+            # En fMP4 el codec y la resolución están en el init segment (EXT-X-MAP)
+            _, init_data, _ = yield playlist['init_segment'], SNIFF_BYTES, None
+        result['media'] = sniff_media(data, init_data)
+
+
+def _media_steps(result, started, sniff_bytes=SNIFF_BYTES):
+    """Metadatos de cualquier URL: sonda HLS con sniff o un único GET con rango para TS/MP4 directos"""
+    if is_hls_url(result['url']):
+        yield from _probe_steps(result, started, SEGMENT_PROBE_BYTES, 2, sniff=True)
+        return
+
+    status, data, _ = yield result['url'], sniff_bytes, sniff_bytes
+    result['http_status'] = status
+    if result['manifest_latency'] is None:
+        result['manifest_latency'] = round(time.monotonic() - started, 3)
+    if not data:
+        result['error'] = f'HTTP {status}'
+        return
+
+    result['segment_format'] = sniff_segment_format(data)
+    result['media'] = sniff_media(data)
+    if result['media']:
+        result['status'] = 'online'
+    else:
+        result['status'] = 'invalid'
+        result['error'] = 'no es TS/fMP4'
+
+
+def _finish(result, started):
+    result['latency'] = round(time.monotonic() - started, 3)
+    return result
+
+
+async def read_capped(response, max_bytes):
+    """Cuerpo hasta max_bytes o fin del stream
+
+    content.read(n) devuelve lo que haya en el buffer (a menudo un solo trozo de
+    64 KB o menos), no n bytes: se acumulan trozos hasta el tope
+    """
+    chunks = []
+    size = 0
+    async for chunk in response.content.iter_chunked(64 * 1024):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            break
+    return b''.join(chunks)[:max_bytes]
+
+
+async def _fetch(session, url, max_bytes, byte_range=None):
+    """GET limitado a max_bytes; devuelve (status, bytes, URL final tras redirecciones)"""
+    headers = {'Range': f'bytes=0-{byte_range - 1}'} if byte_range else None
+    async with session.get(url, headers=headers, allow_redirects=True) as response:
+        if response.status not in (200, 206):
+            return response.status, b'', str(response.url)
+        return response.status, await read_capped(response, max_bytes), str(response.url)
+
+
+def _error_name(e):
+    if AIOHTTP_AVAILABLE and isinstance(e, aiohttp.ClientError):
+        return type(e).__name__
+    return str(e)[:80]
+
+
+# Errores que dependen del host y no de la URL concreta: afectan a todos sus streams
+HOST_ERROR_KINDS = {'dns', 'refused', 'tls'}
+
+
+def _exception_chain(e, limit=8):
+    """La excepción y sus causas (aiohttp os_error, urllib3 reason, __cause__/__context__, args)"""
+    pending = [e]
+    seen = []
+    while pending and len(seen) < limit:
+        current = pending.pop(0)
+        if not isinstance(current, BaseException) or any(current is other for other in seen):
+            continue
+        seen.append(current)
+        pending.extend([getattr(current, 'os_error', None), getattr(current, 'reason', None),
+                        current.__cause__, current.__context__])
+        pending.extend(arg for arg in current.args if isinstance(arg, BaseException))
+    return seen
+
+
+def classify_network_error(e):
+    """'dns', 'refused', 'tls', 'timeout', 'connect' u 'other' para una excepción de aiohttp o requests"""
+    chain = _exception_chain(e)
+    if any(isinstance(error, socket.gaierror) or type(error).__name__ in ('ClientConnectorDNSError', 'NameResolutionError')
+           for error in chain):
+        return 'dns'
+    if any(isinstance(error, ConnectionRefusedError) for error in chain):
+        return 'refused'
+    if any(isinstance(error, ssl.SSLError) or type(error).__name__ in ('ClientConnectorCertificateError', 'ClientSSLError', 'SSLError')
+           for error in chain):
+        return 'tls'
+    if any(isinstance(error, (asyncio.TimeoutError, socket.timeout)) or 'Timeout' in type(error).__name__
+           for error in chain):
+        return 'timeout'
+    if any(isinstance(error, ConnectionError) or 'Connect' in type(error).__name__ for error in chain):
+        return 'connect'
+    return 'other'
+
+
+async def _run_steps_async(session, steps, result):
+    """Ejecuta una lógica de sonda con aiohttp"""
+    try:
+        request = next(steps)
+        while True:
+            request = steps.send(await _fetch(session, *request))
+    except StopIteration:
+        pass
+    except asyncio.TimeoutError:
+        result['error'] = 'timeout'
+        result['error_kind'] = 'timeout'
+    except Exception as e:
+        result['error'] = _error_name(e)
+        result['error_kind'] = classify_network_error(e)
+
+
+def _run_steps_sync(session, steps, result, timeout):
+    """Ejecuta una lógica de sonda con requests"""
+    def fetch(target, max_bytes, byte_range=None):
+        headers = {'Range': f'bytes=0-{byte_range - 1}'} if byte_range else None
+        with session.get(target, headers=headers, timeout=timeout, stream=True, allow_redirects=True) as response:
+            if response.status_code not in (200, 206):
+                return response.status_code, b'', response.url
+            return response.status_code, response.raw.read(max_bytes, decode_content=True), response.url
+
+    try:
+        request = next(steps)
+        while True:
+            request = steps.send(fetch(*request))
+    except StopIteration:
+        pass
+    except Exception as e:
+        result['error'] = str(e)[:80]
+        result['error_kind'] = classify_network_error(e)
+
+
+async def probe_hls(session, url, segment_bytes=SEGMENT_PROBE_BYTES, max_depth=2, sniff=False):
+    """Sonda HLS nativa: manifiesto → variante → rango de un segmento; nunca lanza subprocesos"""
+    result = new_probe_result(url)
+    started = time.monotonic()
+    await _run_steps_async(session, _probe_steps(result, started, segment_bytes, max_depth, sniff), result)
+    return _finish(result, started)
+
+
+def probe_hls_sync(url, session=None, timeout=10, segment_bytes=SEGMENT_PROBE_BYTES, max_depth=2, sniff=False):
+    """Versión síncrona (requests) de probe_hls para el verificador con hilos"""
+    import requests
+
+    result = new_probe_result(url)
+    started = time.monotonic()
+    _run_steps_sync(session or requests, _probe_steps(result, started, segment_bytes, max_depth, sniff), result, timeout)
+    return _finish(result, started)
+
+
+async def probe_media(session, url):
+    """Codec/resolución/perfil de un stream (HLS o directo) sin ffprobe; result['media']"""
+    result = new_probe_result(url)
+    started = time.monotonic()
+    await _run_steps_async(session, _media_steps(result, started), result)
+    return _finish(result, started)
+
+
+def probe_media_sync(url, session=None, timeout=10):
+    """Versión síncrona (requests) de probe_media"""
+    import requests
+
+    result = new_probe_result(url)
+    started = time.monotonic()
+    _run_steps_sync(session or requests, _media_steps(result, started), result, timeout)
+    return _finish(result, started)
+
+
+# Frescura del live edge: el manifiesto debe avanzar entre dos lecturas
+DEFAULT_FRESHNESS_WAIT = 6.0
+
+
+def new_snapshot(url, media_url=None):
+    return {
+        'url': url,
+        'media_url': media_url,
+        'valid': False,
+        'http_status': None,
+        'media_sequence': None,
+        'last_segment': None,
+        'segment_count': 0,
+        'target_duration': None,
+        'ended': False,
+        'error': None,
+    }
+
+
+def _snapshot_steps(snapshot, max_depth=2):
+    """Lee el media playlist (resolviendo el master si hace falta) y guarda su estado"""
+    manifest_url = snapshot['media_url'] or snapshot['url']
+    for _ in range(max_depth):
+        status, body, final_url = yield manifest_url, MAX_MANIFEST_BYTES, None
+        snapshot['http_status'] = status
+        if not body:
+            snapshot['error'] = f'HTTP {status}'
+            return
+
+        playlist = parse_playlist(body.decode('utf-8', errors='replace'), final_url)
+        if not playlist['valid']:
+            snapshot['error'] = 'sin #EXTM3U'
+            return
+        if not playlist['is_master']:
+            break
+        manifest_url = pick_probe_variant(playlist['variants'])['url']
+    else:
+        snapshot['error'] = 'masters anidados'
+        return
+
+    snapshot.update({
+        'valid': True,
+        'media_url': manifest_url,
+        'media_sequence': playlist['media_sequence'],
+        'last_segment': playlist['segments'][-1]['url'] if playlist['segments'] else None,
+        'segment_count': len(playlist['segments']),
+        'target_duration': playlist['target_duration'],
+        'ended': playlist['ended'],
+    })
+
+
+def freshness_wait(snapshot, max_wait=10.0):
+    """Tiempo entre lecturas: un target-duration (acotado)"""
+    return min(snapshot['target_duration'] or DEFAULT_FRESHNESS_WAIT, max_wait)
+
+
+def needs_second_read(snapshot):
+    return snapshot['valid'] and snapshot['segment_count'] > 0 and not snapshot['ended']
+
+
+def classify_freshness(first, second):
+    """'live' si el media sequence o la lista de segmentos avanzó, 'frozen' si no, 'dead' si no responde"""
+    if not first['valid'] or first['segment_count'] == 0:
+        return 'dead'
+    if first['ended']:
+        # #EXT-X-ENDLIST: no es un directo, nunca va a avanzar
+        return 'frozen'
+    if second is None or not second['valid']:
+        return 'dead'
+    if (second['media_sequence'] or 0) > (first['media_sequence'] or 0):
+        return 'live'
+    if second['last_segment'] != first['last_segment']:
+        return 'live'
+    return 'frozen'
+
+
+def freshness_result(url, first, second, waited, started):
+    last = second if second is not None else first
+    return {
+        'url': url,
+        'status': classify_freshness(first, second),
+        'http_status': last['http_status'],
+        'media_url': first['media_url'],
+        'media_sequence_before': first['media_sequence'],
+        'media_sequence_after': second['media_sequence'] if second else None,
+        'waited': waited,
+        'error': last['error'],
+        'error_kind': last.get('error_kind'),
+        'latency': round(time.monotonic() - started, 3),
+    }
+
+
+async def check_freshness(session, url, max_wait=10.0, limiter=None):
+    """Dos lecturas separadas un target-duration; limiter() envuelve cada lectura pero no la espera"""
+    limiter = limiter or contextlib.nullcontext
+    started = time.monotonic()
+
+    first = new_snapshot(url)
+    async with limiter():
+        await _run_steps_async(session, _snapshot_steps(first), first)
+
+    second = None
+    waited = 0.0
+    if needs_second_read(first):
+        # La espera no ocupa slot de concurrencia: otras sondas avanzan mientras tanto
+        waited = freshness_wait(first, max_wait)
+        await asyncio.sleep(waited)
+        second = new_snapshot(url, media_url=first['media_url'])
+        async with limiter():
+            await _run_steps_async(session, _snapshot_steps(second), second)
+
+    return freshness_result(url, first, second, waited, started)
+
+
+def check_freshness_sync(url, session=None, timeout=10, max_wait=10.0):
+    """Versión síncrona (requests) de check_freshness"""
+    import requests
+
+    session = session or requests
+    started = time.monotonic()
+
+    first = new_snapshot(url)
+    _run_steps_sync(session, _snapshot_steps(first), first, timeout)
+
+    second = None
+    waited = 0.0
+    if needs_second_read(first):
+        waited = freshness_wait(first, max_wait)
+        time.sleep(waited)
+        second = new_snapshot(url, media_url=first['media_url'])
+        _run_steps_sync(session, _snapshot_steps(second), second, timeout)
+
+    return freshness_result(url, first, second, waited, started)
+
+
+# Variantes de un master: calidades disponibles y elección bajo un techo de ancho de banda
+def variant_label(variant):
+    """'720p', '2.0 Mbps' o 'auto' para nombrar una entrada por calidad"""
+    resolution = variant.get('resolution') or ''
+    height = resolution.lower().partition('x')[2]
+    if height.isdigit():
+        return f"{height}p"
+    if variant.get('bandwidth'):
+        return f"{variant['bandwidth'] / 1_000_000:.1f} Mbps"
+    return 'auto'
+
+
+def select_variant(variants, max_bandwidth=None):
+    """La de más bandwidth que no pase de max_bandwidth (bit/s); si ninguna cabe, la más ligera"""
+    if not variants:
+        return None
+    if not max_bandwidth:
+        return max(variants, key=lambda variant: variant['bandwidth'])
+    fitting = [variant for variant in variants if variant['bandwidth'] and variant['bandwidth'] <= max_bandwidth]
+    if fitting:
+        return max(fitting, key=lambda variant: variant['bandwidth'])
+    return pick_probe_variant(variants)
+
+
+def new_variants_result(url):
+    return {'url': url, 'is_master': False, 'variants': [], 'error': None, 'error_kind': None}
+
+
+def _variants_steps(result):
+    """Lógica sin I/O: lee el manifiesto y, si es un master, lista sus variantes de mayor a menor bandwidth"""
+    status, body, final_url = yield result['url'], MAX_MANIFEST_BYTES
+    if not body:
+        result['error'] = f'HTTP {status}'
+        return
+    playlist = parse_playlist(body.decode('utf-8', errors='replace'), final_url)
+    if not playlist['valid']:
+        result['error'] = 'sin #EXTM3U'
+        return
+    result['is_master'] = playlist['is_master']
+    variants = []
+    for variant in playlist['variants']:
+        frame_rate = variant['attributes'].get('FRAME-RATE')
+        variants.append({
+            'url': variant['url'],
+            'bandwidth': variant['bandwidth'],
+            'resolution': variant['resolution'],
+            'codecs': variant['codecs'],
+            'frame_rate': frame_rate,
+            'label': variant_label(variant),
+        })
+    result['variants'] = sorted(variants, key=lambda variant: variant['bandwidth'], reverse=True)
+
+
+async def fetch_variants(session, url):
+    """Variantes (#EXT-X-STREAM-INF) de un master; is_master=False y lista vacía si es una playlist de medios"""
+    result = new_variants_result(url)
+    await _run_steps_async(session, _variants_steps(result), result)
+    return result
+
+
+def fetch_variants_sync(url, session=None, timeout=10):
+    """Versión síncrona (requests) de fetch_variants"""
+    import requests
+
+    result = new_variants_result(url)
+    _run_steps_sync(session or requests, _variants_steps(result), result, timeout)
+    return result
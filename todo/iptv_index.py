@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🗂️ IPTV INDEX - Índice de acceso aleatorio para playlists M3U enormes
+El M3U se lee con mmap y se guarda un sidecar (<playlist>.idx) con el
+offset de inicio/fin de cada entrada y hashes de nombre y URL. Con él,
+acceder por posición, buscar por nombre o URL, muestrear o leer un rango
+no exige parsear el archivo entero; si el M3U solo creció (append), el
+índice se actualiza escaneando únicamente lo nuevo
+"""
+
+import hashlib
+import mmap
+import os
+import random
+import re
+import struct
+from array import array
+
+from iptv_m3u import iter_m3u_text, parse_extinf
+
+INDEX_MAGIC = b'M3UIDX\x00\x01'
+INDEX_VERSION = 1
+# magic, versión, última entrada abierta (sin salto de línea final), bytes indexados, entradas,
+# huella del comienzo del archivo y huella de los últimos bytes indexados
+_HEADER = struct.Struct('<8sIIQQ16s16s')
+# inicio, fin, hash del nombre, hash de la URL (orden nativo: el sidecar es una caché local)
+_RECORD = struct.Struct('=QQQQ')
+_FIELDS = 4
+FINGERPRINT_BYTES = 4096
+
+# Una entrada: bloque #EXTINF opcional (con #EXTVLCOPT/#KODIPROP intermedios) + línea de URL
+_ENTRY_RE = re.compile(
+    rb'^(?:#EXTINF:[^\n]*\n(?:[ \t\r]*\n|#(?!EXTINF:)[^\n]*\n)*)?[ \t]*[^#\s][^\n]*(?:\n|\Z)',
+    re.MULTILINE,
+)
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8', 'replace'), digest_size=8).digest(), 'little')
+
+
+def normalize_name(name):
+    return ' '.join((name or '').split()).casefold()
+
+
+def name_hash(name):
+    return _hash64(normalize_name(name))
+
+
+def url_hash(url):
+    return _hash64(url.strip())
+
+
+def _fingerprint(data):
+    return hashlib.blake2b(bytes(data), digest_size=16).digest()
+
+
+def _add_position(lookup, key, position):
+    """Un int mientras el hash sea único; lista solo para los repetidos (menos memoria por entrada)"""
+    found = lookup.get(key)
+    if found is None:
+        lookup[key] = position
+    elif isinstance(found, int):
+        lookup[key] = [found, position]
+    else:
+        found.append(position)
+
+
+def _remove_position(lookup, key, position):
+    found = lookup.get(key)
+    if found == position:
+        del lookup[key]
+    elif isinstance(found, list) and position in found:
+        found.remove(position)
+        if len(found) == 1:
+            lookup[key] = found[0]
+
+
+class PlaylistIndex:
+    """Índice persistente de un M3U: entradas por posición, nombre o URL sin cargar la playlist"""
+
+    def __init__(self, path, index_path=None, auto_refresh=True):
+        self.path = path
+        self.index_path = index_path or f'{path}.idx'
+        self.starts = array('Q')
+        self.ends = array('Q')
+        self.name_hashes = array('Q')
+        self.url_hashes = array('Q')
+        self.indexed_size = 0
+        self.tail_open = False
+        self._file = None
+        self._map = None
+        self._fingerprints = None
+        # hash → posición (o lista de posiciones si se repite): find_url/find_name sin recorrer las columnas
+        self._by_name = {}
+        self._by_url = {}
+
+        self.last_refresh = None
+        self.load()
+        if auto_refresh:
+            self.refresh()
+
+    # --- Persistencia del sidecar ---
+
+    def load(self):
+        """Carga el sidecar si existe y es coherente; si no, el índice queda vacío"""
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False
+        if len(data) < _HEADER.size:
+            return False
+        magic, version, tail_open, indexed_size, count, head_fp, tail_fp = _HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or len(data) < _HEADER.size + count * _RECORD.size:
+            return False
+
+        records = memoryview(data)[_HEADER.size:_HEADER.size + count * _RECORD.size].cast('Q')
+        self.starts = array('Q', records[0::_FIELDS])
+        self.ends = array('Q', records[1::_FIELDS])
+        self.name_hashes = array('Q', records[2::_FIELDS])
+        self.url_hashes = array('Q', records[3::_FIELDS])
+        self.indexed_size = indexed_size
+        self.tail_open = bool(tail_open)
+        self._fingerprints = (head_fp, tail_fp)
+        self._rebuild_lookup()
+        return True
+
+    def _rebuild_lookup(self):
+        self._by_name = {}
+        self._by_url = {}
+        for position in range(len(self.starts)):
+            _add_position(self._by_name, self.name_hashes[position], position)
+            _add_position(self._by_url, self.url_hashes[position], position)
+
+    def _header(self):
+        head_fp, tail_fp = self._fingerprints = self._compute_fingerprints(self.indexed_size)
+        return _HEADER.pack(INDEX_MAGIC, INDEX_VERSION, int(self.tail_open), self.indexed_size,
+                            len(self.starts), head_fp, tail_fp)
+
+    def _records(self, first=0):
+        chunk = bytearray()
+        for i in range(first, len(self.starts)):
+            chunk += _RECORD.pack(self.starts[i], self.ends[i], self.name_hashes[i], self.url_hashes[i])
+        return chunk
+
+    def save(self, appended_from=None):
+        """Reescritura atómica completa, o append de los registros nuevos + cabecera in situ"""
+        if appended_from is not None and os.path.exists(self.index_path):
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(_HEADER.size + appended_from * _RECORD.size)
+                f.seek(0, os.SEEK_END)
+                f.write(self._records(appended_from))
+                f.seek(0)
+                f.write(self._header())
+            return
+
+        temp_path = f'{self.index_path}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(self._header())
+            f.write(self._records())
+        os.replace(temp_path, self.index_path)
+
+    # --- Construcción y actualización incremental ---
+
+    def _open_map(self):
+        self.close()
+        size = os.path.getsize(self.path)
+        if size == 0:
+            return 0
+        self._file = open(self.path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return size
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _compute_fingerprints(self, indexed_size):
+        if self._map is None or indexed_size == 0:
+            return b'\x00' * 16, b'\x00' * 16
+        head = self._map[:min(FINGERPRINT_BYTES, indexed_size)]
+        tail = self._map[max(0, indexed_size - FINGERPRINT_BYTES):indexed_size]
+        return _fingerprint(head), _fingerprint(tail)
+
+    def _reset(self):
+        self.starts = array('Q')
+        self.ends = array('Q')
+        self.name_hashes = array('Q')
+        self.url_hashes = array('Q')
+        self.indexed_size = 0
+        self.tail_open = False
+        self._by_name = {}
+        self._by_url = {}
+
+    def refresh(self):
+        """Pone el índice al día: nada si el M3U no cambió, incremental si solo creció, completo si no
+
+        "Solo creció" se comprueba con huellas del principio del archivo y de los
+        últimos bytes indexados: basta para appends y reescrituras de generadores,
+        no para ediciones a mano en mitad de la lista
+        """
+        size = self._open_map()
+        if size == 0:
+            self._reset()
+            self.last_refresh = 'empty'
+            return 0
+
+        loaded = self._fingerprints
+        appendable = (
+            loaded is not None
+            and self.indexed_size <= size
+            and loaded == self._compute_fingerprints(self.indexed_size)
+        )
+        if appendable and size == self.indexed_size:
+            self.last_refresh = 'unchanged'
+            return 0
+
+        if appendable:
+            first = len(self.starts)
+            scan_from = self.indexed_size
+            if self.tail_open and first:
+                # La última entrada no tenía salto de línea: pudo seguir creciendo, se reescanea
+                first -= 1
+                scan_from = self.starts[first]
+                _remove_position(self._by_name, self.name_hashes[first], first)
+                _remove_position(self._by_url, self.url_hashes[first], first)
+                for column in (self.starts, self.ends, self.name_hashes, self.url_hashes):
+                    del column[first:]
+            added = self._scan(scan_from)
+            self.save(appended_from=first)
+            self.last_refresh = 'incremental'
+        else:
+            self._reset()
+            added = self._scan(0)
+            self.save()
+            self.last_refresh = 'full'
+        return added
+
+    def _scan(self, start):
+        data = self._map
+        added = 0
+        end = start
+        for match in _ENTRY_RE.finditer(data, start):
+            block = match.group(0)
+            lines = block.rstrip(b'\r\n').split(b'\n')
+            url = lines[-1].strip().decode('utf-8', 'replace')
+            name = ''
+            if block.startswith(b'#EXTINF:'):
+                name = parse_extinf(lines[0].rstrip(b'\r').decode('utf-8', 'replace')).name
+            position = len(self.starts)
+            self.starts.append(match.start())
+            self.ends.append(match.end())
+            self.name_hashes.append(name_hash(name or url))
+            self.url_hashes.append(url_hash(url))
+            _add_position(self._by_name, self.name_hashes[position], position)
+            _add_position(self._by_url, self.url_hashes[position], position)
+            end = match.end()
+            added += 1
+
+        self.tail_open = bool(added) and not data[end - 1:end] == b'\n'
+        self.indexed_size = max(end, start) if added else start
+        return added
+
+    # --- Consultas ---
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _block(self, start, end):
+        return self._map[start:end].decode('utf-8', 'replace')
+
+    def entry(self, position):
+        """M3UEntry de la posición dada (negativas desde el final)"""
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError('posición fuera del índice')
+        entry = next(iter_m3u_text(self._block(self.starts[position], self.ends[position])))
+        # El número de línea real exigiría contar saltos desde el principio del archivo
+        entry.line_number = None
+        return entry
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return list(self.entries(start, stop))
+            return [self.entry(i) for i in range(start, stop, step)]
+        return self.entry(key)
+
+    def entries(self, start=0, stop=None):
+        """Entradas [start, stop) con una sola lectura contigua del mmap"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= stop:
+            return iter(())
+        return iter_m3u_text(self._block(self.starts[start], self.ends[stop - 1]))
+
+    def sample(self, count, seed=None):
+        """Muestra aleatoria sin reemplazo (se leen solo las entradas elegidas)"""
+        positions = random.Random(seed).sample(range(len(self)), min(count, len(self)))
+        return [self.entry(position) for position in positions]
+
+    @staticmethod
+    def _positions(lookup, value):
+        found = lookup.get(value)
+        if found is None:
+            return []
+        return [found] if isinstance(found, int) else list(found)
+
+    def find_url(self, url):
+        """Posiciones cuya URL es exactamente esta (el hash preselecciona, la lectura confirma)"""
+        url = url.strip()
+        return [position for position in self._positions(self._by_url, url_hash(url))
+                if self.entry(position).url == url]
+
+    def find_name(self, name):
+        """Posiciones cuyo nombre (tvg-name o título) coincide sin distinguir mayúsculas ni espacios"""
+        wanted = normalize_name(name)
+        return [position for position in self._positions(self._by_name, name_hash(name))
+                if normalize_name(self.entry(position).name) == wanted]
+
+    def stats(self):
+        return {
+            'entries': len(self),
+            'indexed_bytes': self.indexed_size,
+            'index_bytes': _HEADER.size + len(self) * _RECORD.size,
+            'last_refresh': self.last_refresh,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
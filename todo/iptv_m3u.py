@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📜 IPTV M3U - Parser en streaming de playlists M3U/M3U8
+Lee línea a línea (memoria constante aunque la lista tenga millones de
+entradas) y entrega registros M3UEntry con todos los atributos de #EXTINF
+más las opciones #EXTVLCOPT / #KODIPROP / #EXTGRP que preceden a cada URL
+"""
+
+import io
+import re
+
+_ATTRIBUTE_RE = re.compile(r'([A-Za-z0-9_-]+)="([^"]*)"')
+# Cabecera = texto sin comas fuera de comillas; el título empieza tras la primera coma libre
+_EXTINF_SPLIT_RE = re.compile(r'([^,"]*(?:"[^"]*"[^,"]*)*),(.*)', re.DOTALL)
+
+
+class M3UEntry:
+    """Una entrada de la playlist: URL + metadatos del #EXTINF y opciones del reproductor"""
+
+    __slots__ = ('url', 'title', 'duration', 'tvg_id', 'tvg_name', 'tvg_logo', 'group_title', 'attrs',
+                 'vlc_options', 'kodi_props', 'line_number')
+
+    def __init__(self, url=None, title='', duration=-1, attrs=None, line_number=0):
+        attrs = attrs or {}
+        self.url = url
+        self.title = title
+        self.duration = duration
+        self.tvg_id = attrs.pop('tvg-id', None)
+        self.tvg_name = attrs.pop('tvg-name', None)
+        self.tvg_logo = attrs.pop('tvg-logo', None)
+        self.group_title = attrs.pop('group-title', None)
+        # Resto de atributos (tvg-chno, catchup, tvg-shift...) tal cual vienen
+        self.attrs = attrs
+        self.vlc_options = {}
+        self.kodi_props = {}
+        self.line_number = line_number
+
+    @property
+    def name(self):
+        """Nombre para mostrar: tvg-name, si no el título, si no la URL"""
+        return self.tvg_name or self.title or self.url or ''
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __repr__(self):
+        return f"M3UEntry({self.name!r}, {self.url!r})"
+
+
+def split_extinf(payload):
+    """'-1 tvg-id="x" group-title="A, B",Título' → ('-1 tvg-id=... ', 'Título'): la coma de los atributos no cuenta"""
+    match = _EXTINF_SPLIT_RE.match(payload)
+    if match is None:
+        return payload, ''
+    return match.group(1), match.group(2).strip()
+
+
+def parse_extinf(line, line_number=0):
+    """Convierte una línea #EXTINF en un M3UEntry sin URL"""
+    head, title = split_extinf(line[len('#EXTINF:'):])
+    duration_text = head.split(None, 1)[0] if head.strip() else '-1'
+    try:
+        duration = float(duration_text)
+        duration = int(duration) if duration.is_integer() else duration
+    except ValueError:
+        duration = -1
+    attrs = {key.lower(): value for key, value in _ATTRIBUTE_RE.findall(head)}
+    return M3UEntry(title=title, duration=duration, attrs=attrs, line_number=line_number)
+
+
+def _split_option(payload):
+    key, _, value = payload.partition('=')
+    return key.strip(), value.strip()
+
+
+def iter_m3u(source, stats=None, keep_orphans=True):
+    """Generador de M3UEntry a partir de una ruta o un archivo de texto abierto
+
+    Un #EXTINF sin URL se descarta en cuanto aparece el siguiente (no desalinea
+    nombres y URLs); una URL sin #EXTINF se entrega con título vacío salvo que
+    keep_orphans=False. stats (dict opcional) recibe los recuentos de cada caso
+    """
+    if stats is None:
+        stats = {}
+    stats.update({'entries': 0, 'extinf_without_url': 0, 'url_without_extinf': 0, 'header': {}})
+
+    if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+        handle = open(source, 'r', encoding='utf-8', errors='replace', newline=None)
+        close = True
+    else:
+        handle = source
+        close = False
+
+    pending = None
+    vlc_options = {}
+    kodi_props = {}
+    group = None
+    try:
+        for line_number, raw_line in enumerate(handle, 1):
+            line = raw_line.strip()
+            if line_number == 1:
+                line = line.lstrip('\ufeff')
+            if not line:
+                continue
+
+            if line.startswith('#'):
+                upper = line[:12].upper()
+                if upper.startswith('#EXTINF:'):
+                    if pending is not None:
+                        stats['extinf_without_url'] += 1
+                    pending = parse_extinf(line, line_number)
+                elif upper.startswith('#EXTVLCOPT:'):
+                    key, value = _split_option(line[len('#EXTVLCOPT:'):])
+                    vlc_options[key] = value
+                elif upper.startswith('#KODIPROP:'):
+                    key, value = _split_option(line[len('#KODIPROP:'):])
+                    kodi_props[key] = value
+                elif upper.startswith('#EXTGRP:'):
+                    group = line[len('#EXTGRP:'):].strip()
+                elif upper.startswith('#EXTM3U'):
+                    stats['header'] = {key.lower(): value for key, value in _ATTRIBUTE_RE.findall(line)}
+                continue
+
+            if pending is None:
+                stats['url_without_extinf'] += 1
+                if not keep_orphans:
+                    vlc_options, kodi_props, group = {}, {}, None
+                    continue
+                pending = M3UEntry(line_number=line_number)
+
+            pending.url = line
+            if pending.group_title is None and group:
+                pending.group_title = group
+            pending.vlc_options = vlc_options
+            pending.kodi_props = kodi_props
+            stats['entries'] += 1
+            yield pending
+
+            pending = None
+            vlc_options = {}
+            kodi_props = {}
+            group = None
+
+        if pending is not None:
+            stats['extinf_without_url'] += 1
+    finally:
+        if close:
+            handle.close()
+
+
+def iter_m3u_text(text, **kwargs):
+    """iter_m3u sobre un string (playlists descargadas en memoria)"""
+    return iter_m3u(io.StringIO(text), **kwargs)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🔀 IPTV MERGE - Fusión y deduplicación de playlists M3U
+Recorre las listas con el parser en streaming, agrupa las entradas por
+canal (nombre normalizado) y descarta las URLs repetidas (URL canónica).
+Los índices guardan solo hashes de 64 bits y las entradas se vuelcan a
+cubos temporales en disco ordenados por canal, así que el coste es lineal
+y la memoria depende del número de URLs únicas, no del tamaño del texto.
+Cada canal conserva todas sus URLs alternativas, una detrás de otra
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import tempfile
+import time
+import unicodedata
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode
+
+from iptv_groups import DEFAULT_GROUP, classify_group
+from iptv_m3u import iter_m3u
+from iptv_writer import StreamingM3UWriter
+
+DEFAULT_PORTS = {'http': 80, 'https': 443, 'rtmp': 1935, 'rtsp': 554}
+# Sufijos que no cambian el canal: [fuente], (demo), calidad, "Php" de los embeds
+_BRACKETS_RE = re.compile(r'\[[^\]]*\]|\([^)]*\)')
+_QUALITY_RE = re.compile(r'\b(?:uhd|fhd|hd|sd|4k|8k|2160p|1080p|720p|576p|480p|360p|h264|h265|hevc|php)\b')
+# Calidad sondeada que format_m3u_entry añade al final del título (describe_media: '1080p H264 AAC')
+MEDIA_SUFFIX_RE = re.compile(
+    r'(?:\s+(?:\d{3,4}p|solo audio|h\.?26[45]|hevc|avc1?|mpeg-?[124]|vp[89]|av1|(?:he-?)?aac|e?ac-?3|mp[23]|opus))+\s*$',
+    re.IGNORECASE)
+_NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+# esquema://autoridad resto (sin urlsplit: es lo más caro de la primera pasada)
+_URL_RE = re.compile(r'([A-Za-z][A-Za-z0-9+.-]*)://([^/?#]*)([^?#]*)(?:\?([^#]*))?')
+
+
+def canonical_url(url):
+    """Forma canónica para comparar URLs: esquema y host en minúsculas, sin puerto por defecto,
+    sin fragmento y con los parámetros ordenados"""
+    url = url.strip()
+    match = _URL_RE.match(url)
+    if match is None or not match.group(2):
+        return url
+    scheme, authority, path, query = match.groups()
+    scheme = scheme.lower()
+    userinfo, at, host = authority.rpartition('@')
+    host = host.lower()
+    name, colon, port = host.rpartition(':')
+    if colon and port.isdigit() and int(port) == DEFAULT_PORTS.get(scheme) and ']' not in port:
+        host = name
+    canonical = f'{scheme}://{userinfo}{at}{host}{path or "/"}'
+    if query:
+        if '&' in query:
+            query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)), doseq=True)
+        canonical += f'?{query}'
+    return canonical
+
+
+def channel_key(name):
+    """'ESPN 2 HD [tvplusgratis2] 1080p H264 AAC' → 'espn2': sin acentos, etiquetas, calidad ni separadores"""
+    text = MEDIA_SUFFIX_RE.sub('', name or '')
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = text.casefold()
+    text = _QUALITY_RE.sub(' ', _BRACKETS_RE.sub(' ', text))
+    return _NON_ALNUM_RE.sub('', text)
+
+
+def entry_key(entry):
+    """Clave de canal de un M3UEntry; si el nombre no deja nada, tvg-id y en último caso la URL"""
+    key = channel_key(entry.tvg_name or entry.title)
+    if key:
+        return key
+    if entry.tvg_id:
+        return f'id:{entry.tvg_id.strip().casefold()}'
+    return f'url:{canonical_url(entry.url)}'
+
+
+def expand_inputs(patterns):
+    """Rutas y comodines (iptvfuenteprincipal_*.m3u) → lista de archivos sin repetir, en orden"""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isfile(path) and path not in paths:
+                paths.append(path)
+    return paths
+
+
+def _group(group, name):
+    """Se respeta el grupo de la lista salvo que falte o sea el genérico: entonces decide la tabla de reglas"""
+    if group and group != DEFAULT_GROUP:
+        return group
+    return classify_group(name)
+
+
+def _quote(value):
+    return (value or '').replace('"', "'")
+
+
+def format_merged_entry(record):
+    """Entrada #EXTINF con los metadatos unificados del canal + opciones del reproductor + URL"""
+    attrs = ''
+    if record['tvg_id']:
+        attrs += f' tvg-id="{_quote(record["tvg_id"])}"'
+    attrs += f' tvg-name="{_quote(record["tvg_name"])}" tvg-logo="{_quote(record["tvg_logo"])}"'
+    attrs += f' group-title="{_quote(record["group"])}"'
+    lines = [f'#EXTINF:-1{attrs},{record["title"]}']
+    lines += [f'#EXTVLCOPT:{key}={value}' for key, value in record['vlc_options'].items()]
+    lines += [f'#KODIPROP:{key}={value}' for key, value in record['kodi_props'].items()]
+    lines.append(record['url'])
+    return '\n'.join(lines) + '\n'
+
+
+class PlaylistMerger:
+    """Fusión en dos pasadas: indexar y volcar a cubos por canal, y escribir canal a canal
+
+    global_urls=True descarta una URL vista en cualquier canal; por defecto solo
+    dentro del mismo canal, porque algunas fuentes reutilizan la misma página
+    (chat.php) para canales distintos
+    """
+
+    def __init__(self, global_urls=False, max_alternates=None, bucket_channels=50000):
+        self.global_urls = global_urls
+        self.max_alternates = max_alternates
+        self.bucket_channels = bucket_channels
+        # hash(clave de canal) → id de canal (orden de primera aparición)
+        self.channel_ids = {}
+        # hash de la URL canónica (o de canal + URL) ya incluida
+        self.seen_urls = set()
+        self.alternates = []
+        self.stats = {'inputs': 0, 'entries': 0, 'duplicates': 0, 'dropped_alternates': 0,
+                      'channels': 0, 'written': 0, 'skipped_lines': 0}
+
+    def _channel_id(self, key):
+        key_hash = hash(key)
+        channel_id = self.channel_ids.get(key_hash)
+        if channel_id is None:
+            channel_id = self.channel_ids[key_hash] = len(self.channel_ids)
+            self.alternates.append(0)
+        return channel_id
+
+    def _spill(self, paths, workdir):
+        """Pasada 1: deduplica con los índices de hashes y reparte las entradas en cubos por id de canal"""
+        buckets = {}
+        try:
+            for path in paths:
+                stats = {}
+                for entry in iter_m3u(path, stats=stats):
+                    self.stats['entries'] += 1
+                    key = entry_key(entry)
+                    url = canonical_url(entry.url)
+                    url_hash = hash(url) if self.global_urls else hash((key, url))
+                    if url_hash in self.seen_urls:
+                        self.stats['duplicates'] += 1
+                        continue
+                    channel_id = self._channel_id(key)
+                    if self.max_alternates and self.alternates[channel_id] >= self.max_alternates:
+                        self.stats['dropped_alternates'] += 1
+                        continue
+                    self.seen_urls.add(url_hash)
+                    self.alternates[channel_id] += 1
+
+                    bucket = channel_id // self.bucket_channels
+                    handle = buckets.get(bucket)
+                    if handle is None:
+                        handle = buckets[bucket] = open(os.path.join(workdir, f'{bucket:06d}.jsonl'), 'w', encoding='utf-8')
+                    handle.write(json.dumps([
+                        channel_id, entry.url.strip(), entry.title, entry.tvg_id, entry.tvg_name, entry.tvg_logo,
+                        entry.group_title, entry.vlc_options, entry.kodi_props,
+                    ], ensure_ascii=False) + '\n')
+                self.stats['inputs'] += 1
+                self.stats['skipped_lines'] += stats['extinf_without_url']
+        finally:
+            for handle in buckets.values():
+                handle.close()
+        return sorted(buckets)
+
+    def _channels(self, workdir, buckets):
+        """Pasada 2: por cubo, agrupa las entradas de cada canal y unifica sus metadatos"""
+        for bucket in buckets:
+            channels = {}
+            with open(os.path.join(workdir, f'{bucket:06d}.jsonl'), 'r', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    channels.setdefault(record[0], []).append(record)
+            for channel_id in sorted(channels):
+                yield self._merge_channel(channels[channel_id])
+
+    def _merge_channel(self, records):
+        if len(records) == 1:
+            _, url, title, tvg_id, tvg_name, tvg_logo, group, vlc_options, kodi_props = records[0]
+            tvg_name = tvg_name or _BRACKETS_RE.sub('', title).strip() or title
+            return [{'tvg_id': tvg_id, 'tvg_name': tvg_name, 'tvg_logo': tvg_logo or '', 'group': _group(group, tvg_name),
+                     'url': url, 'title': title or tvg_name, 'vlc_options': vlc_options, 'kodi_props': kodi_props}]
+
+        def first(field):
+            return next((record[field] for record in records if record[field]), None)
+
+        tvg_name = first(4) or _BRACKETS_RE.sub('', records[0][2]).strip() or records[0][2]
+        group = next((record[6] for record in records if record[6] not in (None, '', DEFAULT_GROUP)), None)
+        shared = {'tvg_id': first(3), 'tvg_name': tvg_name, 'tvg_logo': first(5) or '',
+                  'group': _group(group, tvg_name)}
+        return [
+            {**shared, 'url': url, 'title': title or tvg_name, 'vlc_options': vlc_options, 'kodi_props': kodi_props}
+            for _, url, title, _, _, _, _, vlc_options, kodi_props in records
+        ]
+
+    def merge(self, inputs, output):
+        """Fusiona inputs (rutas o comodines) en output; devuelve la ruta o None si no hubo entradas"""
+        paths = [path for path in expand_inputs(inputs) if os.path.abspath(path) != os.path.abspath(output)]
+        started = time.time()
+        with tempfile.TemporaryDirectory(prefix='iptv_merge_') as workdir:
+            buckets = self._spill(paths, workdir)
+            self.stats['channels'] = len(self.channel_ids)
+            # Los índices ya no hacen falta: la segunda pasada solo lee los cubos
+            self.channel_ids.clear()
+            self.seen_urls.clear()
+
+            channels = self.stats['channels']
+
+            def header(total):
+                return (
+                    "#EXTM3U\n"
+                    f"# Fusionado por IPTV Merge - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                    f"# Listas de origen: {len(paths)}\n"
+                    f"# Total de canales: {channels} ({total} URLs)\n"
+                    "\n"
+                )
+
+            writer = StreamingM3UWriter(
+                output, format_merged_entry, section_of=lambda record: record['group'], header=header,
+                section_header=lambda group, count: f"# === {group.upper()} ({count} URLs) ===\n",
+                flush_every=0, resume=False,
+            )
+            try:
+                for entries in self._channels(workdir, buckets):
+                    writer.add_many(entries)
+            except BaseException:
+                writer.abort()
+                raise
+            self.stats['written'] = writer.count
+            result = writer.finalize()
+        self.stats['seconds'] = round(time.time() - started, 2)
+        return result
+
+    def report(self):
+        stats = self.stats
+        print(f"📚 Listas leídas: {stats['inputs']}")
+        print(f"📥 Entradas leídas: {stats['entries']}")
+        print(f"🔁 Duplicadas descartadas: {stats['duplicates']}")
+        if stats['dropped_alternates']:
+            print(f"✂️ Alternativas por encima del máximo: {stats['dropped_alternates']}")
+        print(f"📺 Canales únicos: {stats['channels']}")
+        print(f"🔗 URLs escritas: {stats['written']}")
+        if 'seconds' in stats:
+            print(f"⏱️ Tiempo: {stats['seconds']}s")
+
+
+def merge_playlists(inputs, output, global_urls=False, max_alternates=None):
+    """Atajo: fusiona y devuelve (ruta de salida o None, estadísticas)"""
+    merger = PlaylistMerger(global_urls=global_urls, max_alternates=max_alternates)
+    return merger.merge(inputs, output), merger.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fusiona y deduplica playlists M3U')
+    parser.add_argument('output', help='M3U consolidado a generar')
+    parser.add_argument('inputs', nargs='+', help='Playlists de entrada (admite comodines: iptv_*.m3u)')
+    parser.add_argument('--global-urls', action='store_true',
+                        help='Descartar una URL repetida aunque aparezca con otro nombre de canal')
+    parser.add_argument('--max-alternates', type=int, default=None, help='Máximo de URLs por canal')
+    args = parser.parse_args()
+
+    merger = PlaylistMerger(global_urls=args.global_urls, max_alternates=args.max_alternates)
+    result = merger.merge(args.inputs, args.output)
+    merger.report()
+    if result:
+        print(f"✅ Playlist consolidada: {result}")
+    else:
+        print("❌ No se encontraron entradas en las listas de entrada")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🩺 IPTV MONITOR - Monitor continuo de salud de una playlist
+Reverifica cada stream según un calendario con prioridades: los que fallan
+hace poco y los de mayor valor se revisan antes, los sanos cada vez menos,
+todo dentro de un presupuesto global de sondeos por minuto. El estado actual
+se vuelca a un archivo compacto (stream_status.json) que leen los exportadores
+(estado de verificación de cada canal) y el servidor de failover (elección de
+la candidata de cada canal)
+"""
+
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import time
+
+from iptv_verify import StreamVerifier, AIOHTTP_AVAILABLE
+from iptv_sampling import load_playlist_streams
+from iptv_cache import VerificationCache
+
+DEFAULT_STATUS_FILE = 'stream_status.json'
+STATUS_VERSION = 1
+# Por ronda se sacan de la cola como mucho POP_WINDOW × huecos entradas vencidas (las más atrasadas)
+# y entre ellas se eligen las prioritarias; el resto del atraso no se toca
+POP_WINDOW = 4
+
+
+class StreamState:
+    """Estado de salud de un stream y cuándo toca volver a mirarlo"""
+
+    __slots__ = ('url', 'name', 'source', 'value', 'online', 'status', 'checked_at', 'latency',
+                 'failures', 'successes', 'changed', 'due', 'in_flight')
+
+    def __init__(self, url, name='', source='', value=1.0):
+        self.url = url
+        self.name = name
+        self.source = source
+        self.value = value
+        self.online = None
+        self.status = 'unknown'
+        self.checked_at = 0.0
+        self.latency = None
+        self.failures = 0
+        self.successes = 0
+        self.changed = False
+        self.due = 0.0
+        self.in_flight = False
+
+    def record(self, result, now):
+        online = bool(result['online'])
+        self.changed = self.online is not None and online != self.online
+        self.online = online
+        if 'freshness' in result:
+            self.status = result['freshness']['status']
+        elif result.get('host_verdict'):
+            self.status = f"host:{result['host_verdict']}"
+        else:
+            self.status = 'online' if online else 'offline'
+        self.checked_at = now
+        self.latency = result.get('latency')
+        if online:
+            self.successes += 1
+            self.failures = 0
+        else:
+            self.failures += 1
+            self.successes = 0
+
+    def to_compact(self):
+        """[online 1/0/null, estado, epoch de la comprobación, fallos seguidos, latencia, próxima]"""
+        return [None if self.online is None else int(self.online), self.status, int(self.checked_at),
+                self.failures, self.latency, int(self.due)]
+
+
+def load_stream_status(path=DEFAULT_STATUS_FILE):
+    """Lee el archivo de estado del monitor: {url: {'online', 'status', 'checked_at', 'failures', 'latency'}}"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get('version') != STATUS_VERSION:
+        return {}
+
+    status = {}
+    for url, row in data.get('streams', {}).items():
+        online, state, checked_at, failures, latency = row[:5]
+        status[url] = {
+            'online': None if online is None else bool(online),
+            'status': state,
+            'checked_at': checked_at,
+            'failures': failures,
+            'latency': latency,
+        }
+    return status
+
+
+class HealthMonitor:
+    """Planificador de reverificaciones con cubo de tokens (budget sondeos/min) y cola de prioridad por vencimiento
+
+    Intervalos: un stream que acaba de cambiar de estado se confirma en min_interval;
+    uno caído se reintenta en failing_interval y, si sigue caído, con backoff
+    exponencial hasta max_interval; uno sano empieza en healthy_interval y se
+    espacia con cada éxito. Los favoritos (value > 1) dividen su intervalo por value
+    """
+
+    def __init__(self, playlist, status_file=DEFAULT_STATUS_FILE, budget=600, max_concurrency=32, per_host_limit=4,
+                 timeout=10, freshness=False, min_interval=30, failing_interval=60, healthy_interval=600,
+                 max_interval=3600, failing_retries=3, favorites=None, favorite_value=3.0, cache=None,
+                 save_interval=15, report_interval=60, tick=1.0):
+        self.playlist = playlist
+        self.status_file = status_file
+        self.budget = budget
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.freshness = freshness
+        self.min_interval = min_interval
+        self.failing_interval = failing_interval
+        self.healthy_interval = healthy_interval
+        self.max_interval = max_interval
+        self.failing_retries = failing_retries
+        self.favorites = [re.compile(pattern, re.IGNORECASE) for pattern in (favorites or [])]
+        self.favorite_value = favorite_value
+        self.cache = cache
+        self.save_interval = save_interval
+        self.report_interval = report_interval
+        self.tick = tick
+
+        self.states = {}
+        self.queue = []
+        self._sequence = itertools.count()
+        self.tokens = 0.0
+        self.in_flight = 0
+        self.playlist_mtime = None
+        self.dirty = False
+
+        self.probes = 0
+        self.started = None
+        # Un verificador y una sesión para todo run(): las rondas reutilizan conexiones keep-alive y DNS
+        self.verifier = None
+        self.session = None
+
+    @property
+    def mode(self):
+        return 'freshness' if self.freshness else 'liveness'
+
+    def stream_value(self, stream):
+        name = stream.get('name') or ''
+        if any(pattern.search(name) for pattern in self.favorites):
+            return self.favorite_value
+        return 1.0
+
+    def next_interval(self, state):
+        if state.changed:
+            interval = self.min_interval
+        elif state.failures:
+            extra = max(0, state.failures - self.failing_retries)
+            interval = self.failing_interval * (2 ** min(extra, 10))
+        else:
+            interval = self.healthy_interval * (1 + min(state.successes - 1, 8) / 4)
+        interval /= state.value
+        # Jitter ±10%: evita que los streams cargados juntos venzan siempre en la misma ronda
+        interval *= random.uniform(0.9, 1.1)
+        return max(self.min_interval, min(interval, self.max_interval))
+
+    def schedule(self, state, due):
+        state.due = due
+        heapq.heappush(self.queue, (due, next(self._sequence), state.url))
+
+    def load_playlist(self):
+        """(Re)carga la playlist: añade los streams nuevos y olvida los que ya no están"""
+        try:
+            mtime = os.path.getmtime(self.playlist)
+        except OSError as e:
+            print(f"⚠️ Playlist no accesible: {e}")
+            return False
+        if mtime == self.playlist_mtime:
+            return False
+        self.playlist_mtime = mtime
+
+        streams = load_playlist_streams(self.playlist)
+        previous = load_stream_status(self.status_file) if not self.states else {}
+        now = time.time()
+        urls = set()
+        added = 0
+        for stream in streams:
+            url = stream['url']
+            urls.add(url)
+            if url in self.states:
+                continue
+            state = StreamState(url, stream.get('name', ''), stream.get('source', ''), self.stream_value(stream))
+            known = previous.get(url)
+            if known and known['online'] is not None:
+                # Arranque en caliente: se conserva el historial y el calendario del último proceso
+                state.online = known['online']
+                state.status = known['status']
+                state.checked_at = known['checked_at']
+                state.failures = known['failures']
+                state.latency = known['latency']
+                state.successes = 1 if known['online'] else 0
+                due = known['checked_at'] + self.next_interval(state)
+            else:
+                due = now
+            self.states[url] = state
+            self.schedule(state, due)
+            added += 1
+
+        removed = [url for url in self.states if url not in urls]
+        for url in removed:
+            del self.states[url]
+        if added or removed:
+            self.dirty = True
+            print(f"📋 Playlist {self.playlist}: {len(self.states)} streams (+{added} / -{len(removed)})")
+        return True
+
+    def refill(self, elapsed):
+        capacity = max(1.0, self.budget / 60 * self.tick * 2)
+        self.tokens = min(capacity, self.tokens + elapsed * self.budget / 60)
+
+    def pop_due(self, now):
+        """Streams vencidos a sondear en esta ronda, como mucho los que permitan tokens y concurrencia"""
+        slots = min(int(self.tokens), self.max_concurrency - self.in_flight)
+        if slots <= 0 or not self.queue or self.queue[0][0] > now:
+            return []
+
+        due = []
+        while self.queue and self.queue[0][0] <= now and len(due) < slots * POP_WINDOW:
+            entry_due, _, url = heapq.heappop(self.queue)
+            state = self.states.get(url)
+            # Entradas obsoletas (stream eliminado o reprogramado) se descartan al salir
+            if state is not None and not state.in_flight and state.due == entry_due:
+                due.append(state)
+        if len(due) <= slots:
+            return due
+
+        # Sin presupuesto para todos: primero los que cambiaron o fallan, los favoritos y los más atrasados
+        def priority(state):
+            urgency = 2.0 if state.changed or state.failures else 1.0
+            return urgency * state.value * (now - state.due + self.tick)
+
+        chosen = heapq.nlargest(slots, due, key=priority)
+        chosen_urls = {state.url for state in chosen}
+        for state in due:
+            if state.url not in chosen_urls:
+                heapq.heappush(self.queue, (state.due, next(self._sequence), state.url))
+        return chosen
+
+    async def probe_batch(self, batch):
+        streams = [{'url': state.url, 'name': state.name} for state in batch]
+        try:
+            results = await self.verifier.verify(streams, session=self.session)
+        except Exception as e:
+            print(f"⚠️ Error en ronda de verificación: {e}")
+            results = []
+
+        now = time.time()
+        checked = set()
+        for result in results:
+            state = self.states.get(result['url'])
+            checked.add(result['url'])
+            if state is None:
+                continue
+            state.record(result, now)
+            if self.cache is not None:
+                self.cache.put_result(result, mode=self.mode)
+            if state.changed:
+                icon = '✅' if state.online else '❌'
+                print(f"{icon} {state.name or state.url[:60]}: ahora {state.status}")
+        for state in batch:
+            state.in_flight = False
+            if state.url in self.states:
+                self.schedule(state, now + (self.next_interval(state) if state.url in checked else self.min_interval))
+        self.in_flight -= len(batch)
+        self.dirty = True
+
+    def save(self):
+        """Escritura atómica del estado compacto (solo si hubo cambios)"""
+        if not self.dirty:
+            return
+        data = {
+            'version': STATUS_VERSION,
+            'updated': int(time.time()),
+            'playlist': self.playlist,
+            'streams': {url: state.to_compact() for url, state in self.states.items()},
+        }
+        temp_path = f'{self.status_file}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temp_path, self.status_file)
+            self.dirty = False
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el estado del monitor: {e}")
+        if self.cache is not None:
+            self.cache.save()
+
+    def stats(self):
+        online = sum(1 for state in self.states.values() if state.online)
+        offline = sum(1 for state in self.states.values() if state.online is False)
+        now = time.time()
+        overdue = sum(1 for state in self.states.values() if not state.in_flight and state.due <= now)
+        elapsed = max(now - (self.started or now), 1e-9)
+        return {
+            'streams': len(self.states),
+            'online': online,
+            'offline': offline,
+            'unknown': len(self.states) - online - offline,
+            'overdue': overdue,
+            'in_flight': self.in_flight,
+            'probes': self.probes,
+            'probes_per_minute': round(self.probes / elapsed * 60, 1),
+        }
+
+    def report(self):
+        s = self.stats()
+        print(f"🩺 {s['streams']} streams | ✅ {s['online']} | ❌ {s['offline']} | ❔ {s['unknown']} | "
+              f"⏳ {s['overdue']} vencidos | {s['probes_per_minute']} sondeos/min")
+
+    async def run(self, duration=None):
+        """Bucle principal; duration=None corre hasta cancelarlo (Ctrl+C)"""
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp no disponible (pip install aiohttp)")
+
+        self.started = time.time()
+        self.load_playlist()
+        print(f"🩺 Monitor iniciado: {len(self.states)} streams, presupuesto {self.budget} sondeos/min, "
+              f"estado en {self.status_file}")
+        self.verifier = StreamVerifier(
+            max_concurrency=self.max_concurrency,
+            per_host_limit=self.per_host_limit,
+            timeout=self.timeout,
+            use_ffprobe=False,
+            freshness=self.freshness,
+        )
+        async with self.verifier.create_session() as session:
+            self.session = session
+            try:
+                return await self._run_loop(duration)
+            finally:
+                self.session = None
+
+    async def _run_loop(self, duration):
+        tasks = set()
+        last_tick = last_save = last_report = last_reload = time.monotonic()
+        try:
+            while duration is None or time.time() - self.started < duration:
+                await asyncio.sleep(self.tick)
+                clock = time.monotonic()
+                self.refill(clock - last_tick)
+                last_tick = clock
+
+                batch = self.pop_due(time.time())
+                if batch:
+                    for state in batch:
+                        state.in_flight = True
+                    self.tokens -= len(batch)
+                    self.in_flight += len(batch)
+                    self.probes += len(batch)
+                    task = asyncio.create_task(self.probe_batch(batch))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+                if clock - last_reload >= self.save_interval:
+                    self.load_playlist()
+                    last_reload = clock
+                if clock - last_save >= self.save_interval:
+                    self.save()
+                    last_save = clock
+                if self.report_interval and clock - last_report >= self.report_interval:
+                    self.report()
+                    last_report = clock
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self.save()
+        return self.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='🩺 Monitor continuo de salud de streams IPTV')
+    parser.add_argument('playlist', help='archivo M3U a vigilar')
+    parser.add_argument('--status', default=DEFAULT_STATUS_FILE, help='archivo de estado compacto')
+    parser.add_argument('--budget', type=int, default=600, help='sondeos por minuto (global)')
+    parser.add_argument('--concurrency', type=int, default=32, help='sondeos simultáneos máximos')
+    parser.add_argument('--per-host', type=int, default=4, help='sondeos simultáneos por host')
+    parser.add_argument('--timeout', type=float, default=10, help='timeout por sondeo (s)')
+    parser.add_argument('--freshness', action='store_true', help='exigir que los HLS avancen (live/frozen/dead)')
+    parser.add_argument('--favorite', action='append', default=[], help='regex de nombres prioritarios (repetible)')
+    parser.add_argument('--healthy-interval', type=float, default=600, help='intervalo base de un stream sano (s)')
+    parser.add_argument('--max-interval', type=float, default=3600, help='intervalo máximo (s)')
+    parser.add_argument('--duration', type=float, default=None, help='segundos de ejecución (por defecto, indefinido)')
+    args = parser.parse_args()
+
+    monitor = HealthMonitor(
+        args.playlist, status_file=args.status, budget=args.budget, max_concurrency=args.concurrency,
+        per_host_limit=args.per_host, timeout=args.timeout, freshness=args.freshness, favorites=args.favorite,
+        healthy_interval=args.healthy_interval, max_interval=args.max_interval, cache=VerificationCache(),
+    )
+    try:
+        asyncio.run(monitor.run(duration=args.duration))
+    except KeyboardInterrupt:
+        print("\n⚠️ Monitor detenido por el usuario")
+    monitor.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🏁 IPTV RANKING - Puntuación de URLs candidatas de un mismo canal
+Mide en paralelo el tiempo hasta el primer byte del manifiesto, el throughput
+de descarga de segmentos y su estabilidad, y ordena principal + backups
+"""
+
+import asyncio
+import statistics
+import time
+
+from iptv_hls import (is_hls_url, parse_playlist, pick_probe_variant, read_capped, sniff_segment_format,
+                      MAX_MANIFEST_BYTES, TS_PACKET_SIZE, classify_network_error)
+from iptv_verify import AIOHTTP_AVAILABLE, DEFAULT_HEADERS
+
+if AIOHTTP_AVAILABLE:
+    import aiohttp
+
+RANK_SEGMENT_BYTES = 512 * 1024
+RANK_SEGMENTS = 2
+MAX_RANK_CANDIDATES = 5
+
+
+def new_measurement(url):
+    return {
+        'url': url,
+        'ok': False,
+        'ttfb': None,
+        'throughput': None,
+        'stability': None,
+        'score': None,
+        'segments': 0,
+        'error': None,
+    }
+
+
+def score_measurement(measurement):
+    """Mbit/s efectivos × estabilidad, penalizados por el TTFB del manifiesto (s)"""
+    if not measurement['ok'] or not measurement['throughput']:
+        return None
+    mbps = measurement['throughput'] * 8 / 1_000_000
+    return round(mbps * measurement['stability'] / (1 + measurement['ttfb']), 4)
+
+
+async def _timed_get(session, url, max_bytes, byte_range=None):
+    """GET con tiempos: (status, bytes, ttfb hasta cabeceras, segundos de descarga del cuerpo)"""
+    headers = {'Range': f'bytes=0-{byte_range - 1}'} if byte_range else None
+    started = time.monotonic()
+    async with session.get(url, headers=headers, allow_redirects=True) as response:
+        ttfb = time.monotonic() - started
+        if response.status not in (200, 206):
+            return response.status, b'', ttfb, 0.0
+        body_started = time.monotonic()
+        data = await read_capped(response, max_bytes)
+        return response.status, data, ttfb, time.monotonic() - body_started
+
+
+async def measure_candidate(session, url, segments=RANK_SEGMENTS, segment_bytes=RANK_SEGMENT_BYTES):
+    """TTFB del manifiesto + throughput de los últimos segmentos (o del propio stream si no es HLS)"""
+    measurement = new_measurement(url)
+    samples = []
+    attempts = 0
+    require_media = not is_hls_url(url)
+    non_media = 0
+
+    try:
+        if is_hls_url(url):
+            manifest_url = url
+            for _ in range(2):
+                status, body, ttfb, _ = await _timed_get(session, manifest_url, MAX_MANIFEST_BYTES)
+                if measurement['ttfb'] is None:
+                    measurement['ttfb'] = round(ttfb, 3)
+                if not body:
+                    measurement['error'] = f'HTTP {status}'
+                    return measurement
+                playlist = parse_playlist(body.decode('utf-8', errors='replace'), manifest_url)
+                if not playlist['valid']:
+                    measurement['error'] = 'sin #EXTM3U'
+                    return measurement
+                if not playlist['is_master']:
+                    break
+                manifest_url = pick_probe_variant(playlist['variants'])['url']
+            targets = [segment['url'] for segment in playlist['segments'][-segments:]]
+        else:
+            # Sin manifiesto que validar: un 200 rápido puede ser la página del reproductor, solo cuenta si es vídeo
+            targets = [url]
+
+        for target in targets:
+            attempts += 1
+            status, data, ttfb, elapsed = await _timed_get(session, target, segment_bytes, segment_bytes)
+            if measurement['ttfb'] is None:
+                measurement['ttfb'] = round(ttfb, 3)
+            if not data:
+                continue
+            # Menos de un paquete TS no es un segmento: mensaje de error o bloqueo servido con 200
+            is_media = len(data) >= TS_PACKET_SIZE and (
+                sniff_segment_format(data) if require_media else data.lstrip()[:1] != b'<')
+            if not is_media:
+                non_media += 1
+                continue
+            # Throughput de extremo a extremo: incluye la espera hasta el primer byte
+            samples.append(len(data) / max(ttfb + elapsed, 0.001))
+    except asyncio.TimeoutError:
+        measurement['error'] = 'timeout'
+    except Exception as e:
+        measurement['error'] = classify_network_error(e)
+
+    measurement['segments'] = len(samples)
+    if samples:
+        measurement['ok'] = True
+        measurement['throughput'] = round(statistics.mean(samples))
+        variation = statistics.pstdev(samples) / statistics.mean(samples) if len(samples) > 1 else 0.0
+        measurement['stability'] = round(len(samples) / attempts * (1 - min(variation, 1.0) / 2), 3)
+    elif measurement['error'] is None:
+        measurement['error'] = 'sin contenido de vídeo' if non_media else 'segmentos sin datos'
+    measurement['score'] = score_measurement(measurement)
+    return measurement
+
+
+async def rank_stream_urls(urls, headers=None, timeout=8, max_candidates=MAX_RANK_CANDIDATES):
+    """Mide las candidatas en paralelo y devuelve (urls ordenadas, mediciones); las que fallan van al final"""
+    if not AIOHTTP_AVAILABLE or len(urls) < 2:
+        return list(urls), []
+
+    candidates = list(dict.fromkeys(urls))[:max_candidates]
+    rest = [url for url in dict.fromkeys(urls) if url not in candidates]
+
+    connector = aiohttp.TCPConnector(limit=len(candidates) * 2, ssl=False)
+    session_headers = dict(DEFAULT_HEADERS, **(headers or {}))
+    async with aiohttp.ClientSession(connector=connector, headers=session_headers,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        measurements = await asyncio.gather(*(measure_candidate(session, url) for url in candidates))
+
+    working = sorted((m for m in measurements if m['score'] is not None), key=lambda m: -m['score'])
+    if not working:
+        # Nada respondió desde aquí: no hay base para cambiar el orden de extracción
+        return list(dict.fromkeys(urls)), measurements
+
+    failed = [m['url'] for m in measurements if m['score'] is None]
+    return [m['url'] for m in working] + failed + rest, measurements
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🔁 IPTV RELAY - Relay HLS local con caché de segmentos compartida
+Las playlists servidas en /relay/<nombre>.m3u apuntan a este proceso en
+lugar de al origen. Los manifiestos se reescriben para que variantes,
+segmentos, claves e init segments pasen también por aquí; cada segmento
+se descarga una sola vez (peticiones simultáneas esperan a la misma
+descarga) y se guarda en una LRU acotada en bytes que comparten todos
+los reproductores. Las conexiones al origen son keep-alive y, si el origen
+principal cae, el canal pasa a sus URLs de respaldo
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from urllib.parse import urljoin
+
+from iptv_export import load_failover_candidates
+from iptv_hls import is_hls_url, parse_playlist, read_capped
+from iptv_merge import channel_key
+from iptv_server import Representation
+from iptv_verify import AIOHTTP_AVAILABLE, DEFAULT_HEADERS
+
+if AIOHTTP_AVAILABLE:
+    import aiohttp
+    from aiohttp import web
+
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+MAX_MANIFEST_BYTES = 2 * 1024 * 1024
+HLS_CONTENT_TYPE = 'application/vnd.apple.mpegurl'
+# Etiquetas con URI="..." que también hay que reescribir (y si apuntan a una playlist o a bytes)
+_URI_TAGS = {
+    '#EXT-X-MEDIA:': 'playlist',
+    '#EXT-X-I-FRAME-STREAM-INF:': 'playlist',
+    '#EXT-X-KEY:': 'segment',
+    '#EXT-X-SESSION-KEY:': 'segment',
+    '#EXT-X-MAP:': 'segment',
+}
+_URI_ATTR_RE = re.compile(r'URI="([^"]*)"')
+
+
+class RelayError(Exception):
+    """El origen no respondió con algo utilizable (HTTP >= 400, red, manifiesto inválido)"""
+
+
+def _token(url):
+    return hashlib.blake2b(url.encode('utf-8'), digest_size=10).hexdigest()
+
+
+class SegmentCache:
+    """LRU acotada por bytes: token → (content-type, cuerpo)"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, max_item_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes or max_bytes // 8
+        self.items = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        item = self.items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return item
+
+    def put(self, key, content_type, body):
+        if len(body) > self.max_item_bytes:
+            return False
+        previous = self.items.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous[1])
+        self.items[key] = (content_type, body)
+        self.size += len(body)
+        while self.size > self.max_bytes and self.items:
+            _, (_, evicted) = self.items.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+        return True
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'items': len(self.items), 'bytes': self.size, 'max_bytes': self.max_bytes, 'hits': self.hits,
+                'misses': self.misses, 'hit_rate': round(self.hits / total, 3) if total else None,
+                'evictions': self.evictions}
+
+
+class RelayChannel:
+    """Un canal relayado: URL principal + respaldos y cuál está activa"""
+
+    __slots__ = ('cid', 'name', 'candidates', 'active', 'failures', 'failovers')
+
+    def __init__(self, cid, name, candidates):
+        self.cid = cid
+        self.name = name
+        self.candidates = candidates
+        self.active = 0
+        self.failures = 0
+        self.failovers = 0
+
+    @property
+    def url(self):
+        return self.candidates[self.active]
+
+
+class HLSRelay:
+    """Rutas /relay/... para PlaylistServer; un ClientSession keep-alive compartido con el origen"""
+
+    def __init__(self, cache_bytes=DEFAULT_CACHE_BYTES, manifest_ttl=1.0, vod_manifest_ttl=60.0, timeout=10,
+                 headers=None, max_failures=2, max_tokens=200000, per_host_limit=8):
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp no está instalado (pip install aiohttp)")
+        self.cache = SegmentCache(cache_bytes)
+        self.manifest_ttl = manifest_ttl
+        self.vod_manifest_ttl = vod_manifest_ttl
+        self.timeout = timeout
+        self.headers = headers or DEFAULT_HEADERS
+        self.max_failures = max_failures
+        self.max_tokens = max_tokens
+        self.per_host_limit = per_host_limit
+
+        self.channels = {}
+        self.tokens = OrderedDict()
+        self.manifests = {}
+        self.inflight = {}
+        self.playlists = {}
+        self.session = None
+        self.server = None
+        self.stats = {'manifest_requests': 0, 'manifest_fetches': 0, 'segment_requests': 0, 'segment_fetches': 0,
+                      'upstream_bytes': 0, 'served_bytes': 0, 'failovers': 0, 'errors': 0}
+
+    # --- Ciclo de vida ---
+
+    def add_routes(self, app, server):
+        self.server = server
+        app.router.add_get('/relay/{name}.m3u', self.handle_playlist)
+        app.router.add_get('/relay/{cid}/index.m3u8', self.handle_index)
+        app.router.add_get('/relay/{cid}/v/{variant}.m3u8', self.handle_variant)
+        app.router.add_get('/relay/{cid}/p/{token}.m3u8', self.handle_rendition)
+        app.router.add_get('/relay/{cid}/s/{token}', self.handle_segment)
+        app.on_startup.append(self.open)
+        app.on_cleanup.append(self.close)
+
+    async def open(self, app=None):
+        connector = aiohttp.TCPConnector(limit=100, limit_per_host=self.per_host_limit, keepalive_timeout=60,
+                                         ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=connector, headers=self.headers,
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def close(self, app=None):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    # --- Canales y playlists reescritas ---
+
+    def register(self, name, candidates):
+        cid = _token('\n'.join(candidates))[:12]
+        if cid not in self.channels:
+            self.channels[cid] = RelayChannel(cid, name, candidates)
+        return cid
+
+    def _relay_playlist(self, playlist, base):
+        """El M3U con cada URL HLS sustituida por /relay/<canal>/index.m3u8 (alternativas y respaldos = candidatos)"""
+        failover = load_failover_candidates(playlist.path)
+        parsed = []
+        by_key = {}
+        for _, _, text in playlist.entries:
+            lines = text.rstrip('\n').split('\n')
+            name = lines[0].rsplit(',', 1)[-1] if lines[0].startswith('#EXTINF') else lines[-1]
+            key = channel_key(name)
+            parsed.append((lines, key))
+            if key:
+                by_key.setdefault(key, []).append(lines[-1])
+
+        out = ['#EXTM3U']
+        for lines, key in parsed:
+            url = lines[-1]
+            if is_hls_url(url):
+                candidates = list(failover.get(url, [url]))
+                candidates += [other for other in by_key.get(key, []) if other not in candidates and is_hls_url(other)]
+                cid = self.register(lines[0].rsplit(',', 1)[-1], candidates)
+                lines = lines[:-1] + [f'{base}/relay/{cid}/index.m3u8']
+            out.extend(lines)
+        return '\n'.join(out) + '\n'
+
+    async def handle_playlist(self, request):
+        playlist = self.server.store.get(request.match_info['name'])
+        if playlist is None:
+            raise web.HTTPNotFound(text='Playlist no encontrada')
+        base = f'{request.scheme}://{request.host}'
+        key = (playlist.path, playlist.signature, base)
+        representation = self.playlists.get(key)
+        if representation is None:
+            body = self._relay_playlist(playlist, base).encode('utf-8')
+            representation = self.playlists[key] = Representation(body, len(playlist.entries))
+            # Solo la versión vigente de cada playlist (por host desde el que se pide)
+            for stale in [other for other in self.playlists if other[0] == playlist.path and other[1] != playlist.signature]:
+                del self.playlists[stale]
+        return self.server.respond(request, representation)
+
+    # --- Origen: descargas compartidas ---
+
+    async def _single_flight(self, key, factory):
+        """Una sola descarga por clave: las peticiones simultáneas esperan al mismo resultado"""
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, url, limit=None):
+        """Cuerpo completo del origen; con limit, RelayError si lo supera (nunca se sirve truncado)"""
+        try:
+            async with self.session.get(url, allow_redirects=True) as response:
+                if response.status >= 400:
+                    raise RelayError(f'HTTP {response.status}')
+                body = await (read_capped(response, limit + 1) if limit else response.read())
+                self.stats['upstream_bytes'] += len(body)
+                if limit and len(body) > limit:
+                    raise RelayError(f'respuesta de más de {limit} bytes')
+                return body, str(response.url), response.headers.get('Content-Type', 'application/octet-stream')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise RelayError(type(e).__name__) from e
+
+    async def _manifest(self, url):
+        """Manifiesto del origen con caché corta (los directos cambian cada pocos segundos)"""
+        cached = self.manifests.get(url)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1], cached[2]
+
+        async def load():
+            self.stats['manifest_fetches'] += 1
+            body, final_url, _ = await self._fetch(url, MAX_MANIFEST_BYTES)
+            text = body.decode('utf-8', 'replace')
+            if not text.lstrip('\ufeff \r\n\t').startswith('#EXTM3U'):
+                raise RelayError('no es un manifiesto HLS')
+            ttl = self.vod_manifest_ttl if '#EXT-X-ENDLIST' in text else self.manifest_ttl
+            if len(self.manifests) > 1000:
+                now = time.monotonic()
+                self.manifests = {key: value for key, value in self.manifests.items() if value[0] > now}
+            self.manifests[url] = (time.monotonic() + ttl, text, final_url)
+            return text, final_url
+
+        return await self._single_flight(('manifest', url), load)
+
+    def _fail_over(self, channel, reason):
+        if len(channel.candidates) < 2:
+            return False
+        channel.active = (channel.active + 1) % len(channel.candidates)
+        channel.failures = 0
+        channel.failovers += 1
+        self.stats['failovers'] += 1
+        print(f"🔀 {channel.name}: origen caído ({reason}), pasando a {channel.url[:60]}")
+        return True
+
+    async def _channel_manifest(self, channel):
+        """Manifiesto de la URL activa del canal, rotando por los respaldos si falla"""
+        last_error = None
+        for _ in range(len(channel.candidates)):
+            url = channel.url
+            try:
+                return await self._manifest(url)
+            except RelayError as e:
+                last_error = e
+                if not self._fail_over(channel, e):
+                    break
+        raise RelayError(str(last_error))
+
+    # --- Reescritura de manifiestos ---
+
+    def _remember(self, url):
+        token = _token(url)
+        self.tokens[token] = url
+        self.tokens.move_to_end(token)
+        if len(self.tokens) > self.max_tokens:
+            self.tokens.popitem(last=False)
+        return token
+
+    def rewrite_manifest(self, text, base_url, cid):
+        """URIs del manifiesto → rutas del relay (variantes por índice para que sobrevivan a un failover)"""
+        prefix = f'/relay/{cid}'
+        out = []
+        variant = 0
+        expect_variant = False
+        for raw_line in text.splitlines():
+            line = raw_line.strip()
+            if not line:
+                continue
+            if line.startswith('#'):
+                if line.startswith('#EXT-X-STREAM-INF:'):
+                    expect_variant = True
+                for tag, kind in _URI_TAGS.items():
+                    if line.startswith(tag):
+                        def replace(match, kind=kind):
+                            token = self._remember(urljoin(base_url, match.group(1)))
+                            path = f'{prefix}/p/{token}.m3u8' if kind == 'playlist' else f'{prefix}/s/{token}'
+                            return f'URI="{path}"'
+                        line = _URI_ATTR_RE.sub(replace, line)
+                        break
+                out.append(line)
+            elif expect_variant:
+                out.append(f'{prefix}/v/{variant}.m3u8')
+                variant += 1
+                expect_variant = False
+            else:
+                out.append(f'{prefix}/s/{self._remember(urljoin(base_url, line))}')
+        return '\n'.join(out) + '\n'
+
+    def _manifest_response(self, text):
+        self.stats['served_bytes'] += len(text)
+        return web.Response(text=text, content_type=HLS_CONTENT_TYPE, headers={'Cache-Control': 'no-cache'})
+
+    def _channel(self, request):
+        channel = self.channels.get(request.match_info['cid'])
+        if channel is None:
+            raise web.HTTPNotFound(text='Canal desconocido (recarga la playlist del relay)')
+        return channel
+
+    # --- Handlers ---
+
+    async def handle_index(self, request):
+        self.stats['manifest_requests'] += 1
+        channel = self._channel(request)
+        try:
+            text, final_url = await self._channel_manifest(channel)
+        except RelayError as e:
+            self.stats['errors'] += 1
+            raise web.HTTPBadGateway(text=f'Sin origen disponible: {e}')
+        return self._manifest_response(self.rewrite_manifest(text, final_url, channel.cid))
+
+    async def handle_variant(self, request):
+        """Variante n del master de la URL activa; si su playlist falla, se cambia de origen y se reintenta"""
+        self.stats['manifest_requests'] += 1
+        channel = self._channel(request)
+        try:
+            index = int(request.match_info['variant'])
+        except ValueError:
+            raise web.HTTPNotFound()
+        last_error = None
+        for _ in range(len(channel.candidates)):
+            try:
+                text, final_url = await self._channel_manifest(channel)
+                variants = parse_playlist(text, final_url)['variants']
+                if not variants:
+                    # El respaldo no es un master: su playlist de medios sirve directamente
+                    return self._manifest_response(self.rewrite_manifest(text, final_url, channel.cid))
+                variant_url = variants[min(index, len(variants) - 1)]['url']
+                media, media_url = await self._manifest(variant_url)
+                return self._manifest_response(self.rewrite_manifest(media, media_url, channel.cid))
+            except RelayError as e:
+                last_error = e
+                if not self._fail_over(channel, e):
+                    break
+        self.stats['errors'] += 1
+        raise web.HTTPBadGateway(text=f'Sin origen disponible: {last_error}')
+
+    async def handle_rendition(self, request):
+        """Pistas alternativas (#EXT-X-MEDIA: audio, subtítulos) e I-frames, por token"""
+        self.stats['manifest_requests'] += 1
+        channel = self._channel(request)
+        url = self.tokens.get(request.match_info['token'])
+        if url is None:
+            raise web.HTTPNotFound()
+        try:
+            text, final_url = await self._manifest(url)
+        except RelayError as e:
+            self.stats['errors'] += 1
+            raise web.HTTPBadGateway(text=str(e))
+        return self._manifest_response(self.rewrite_manifest(text, final_url, channel.cid))
+
+    async def handle_segment(self, request):
+        self.stats['segment_requests'] += 1
+        channel = self._channel(request)
+        token = request.match_info['token']
+        item = self.cache.get(token)
+        if item is None:
+            url = self.tokens.get(token)
+            if url is None:
+                raise web.HTTPNotFound()
+
+            async def load():
+                self.stats['segment_fetches'] += 1
+                body, _, content_type = await self._fetch(url)
+                self.cache.put(token, content_type, body)
+                return content_type, body
+
+            try:
+                item = await self._single_flight(('segment', token), load)
+                channel.failures = 0
+            except RelayError as e:
+                self.stats['errors'] += 1
+                channel.failures += 1
+                # Varios segmentos seguidos sin llegar: el siguiente manifiesto ya saldrá del respaldo
+                if channel.failures >= self.max_failures:
+                    self._fail_over(channel, e)
+                raise web.HTTPBadGateway(text=str(e))
+        content_type, body = item
+        self.stats['served_bytes'] += len(body)
+        return web.Response(body=body, content_type=content_type.split(';')[0],
+                            headers={'Cache-Control': 'max-age=60'})
+
+    def report(self):
+        stats = self.stats
+        cache = self.cache.stats()
+        print(f"🔁 Relay: {len(self.channels)} canales, {stats['segment_requests']} segmentos pedidos, "
+              f"{stats['segment_fetches']} descargados del origen")
+        if stats['segment_requests']:
+            # Aciertos de la LRU + peticiones que se unieron a una descarga ya en curso
+            saved = 1 - stats['segment_fetches'] / stats['segment_requests']
+            print(f"   💾 Caché: {saved:.0%} servido sin ir al origen, {cache['bytes'] / 1024 / 1024:.1f} MB en "
+                  f"{cache['items']} segmentos")
+        print(f"   📥 Origen: {stats['upstream_bytes'] / 1024 / 1024:.1f} MB  📤 Servido: "
+              f"{stats['served_bytes'] / 1024 / 1024:.1f} MB  🔀 Failovers: {stats['failovers']}")
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📊 IPTV SAMPLING - Verificación por muestreo estratificado
+Estratos por fuente y host, sondeo concurrente por rondas (asignación de
+Neyman), intervalos de confianza de Wilson por estrato y parada temprana
+cuando la estimación global alcanza la precisión pedida
+"""
+
+import asyncio
+import math
+import random
+import re
+import time
+from collections import defaultdict, deque
+
+from iptv_verify import StreamVerifier, stream_host, run_sync
+
+Z_SCORES = {0.80: 1.2816, 0.90: 1.6449, 0.95: 1.9600, 0.98: 2.3263, 0.99: 2.5758}
+OTHER_HOSTS = '*otros*'
+UNKNOWN_SOURCE = 'desconocida'
+
+_SECTION_RE = re.compile(r'^#\s*===\s*(.+?)\s*\(\d+\s+canales\)\s*===')
+_TITLE_SOURCE_RE = re.compile(r'\[([^\]]+)\]')
+_GROUP_RE = re.compile(r'group-title="([^"]*)"')
+
+
+def z_score(confidence):
+    return Z_SCORES.get(round(confidence, 2), 1.96)
+
+
+def wilson_interval(successes, n, z=1.96):
+    """Intervalo de Wilson para una proporción (se comporta bien con n pequeño y p cerca de 0 o 1)"""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def load_playlist_streams(m3u_file):
+    """Entradas de un M3U con su fuente (cabecera '# === FUENTE', '[fuente]' del título o group-title)"""
+    streams = []
+    section = None
+    pending = None
+    with open(m3u_file, 'r', encoding='utf-8', errors='replace') as f:
+        for raw_line in f:
+            line = raw_line.strip()
+            if not line:
+                continue
+            match = _SECTION_RE.match(line)
+            if match:
+                section = match.group(1).lower()
+            elif line.startswith('#EXTINF'):
+                title = line.rsplit(',', 1)[-1].strip()
+                title_source = _TITLE_SOURCE_RE.findall(title)
+                group = _GROUP_RE.search(line)
+                pending = {
+                    'name': title,
+                    'source': section or (title_source[-1].lower() if title_source else None)
+                              or (group.group(1) if group else None) or UNKNOWN_SOURCE,
+                }
+            elif not line.startswith('#') and line.startswith(('http://', 'https://')):
+                entry = pending or {'name': line, 'source': section or UNKNOWN_SOURCE}
+                entry['url'] = line
+                streams.append(entry)
+                pending = None
+    return streams
+
+
+class Stratum:
+    """Un estrato (fuente, host) con su orden aleatorio de sondeo y su recuento de éxitos"""
+
+    def __init__(self, key, streams, rng):
+        self.key = key
+        self.streams = list(streams)
+        rng.shuffle(self.streams)
+        self.population = len(self.streams)
+        self.drawn = 0
+        self.observed = 0
+        self.successes = 0
+
+    @property
+    def remaining(self):
+        return self.population - self.drawn
+
+    @property
+    def label(self):
+        source, host = self.key
+        return f"{source} / {host}"
+
+    def take(self, count):
+        batch = self.streams[self.drawn:self.drawn + count]
+        self.drawn += len(batch)
+        return batch
+
+    def record(self, online):
+        self.observed += 1
+        if online:
+            self.successes += 1
+
+    @property
+    def rate(self):
+        return self.successes / self.observed if self.observed else None
+
+    def smoothed_rate(self):
+        """Agresti-Coull: evita varianza 0 con pocas muestras todas OK o todas KO"""
+        return (self.successes + 2) / (self.observed + 4)
+
+    def variance_term(self):
+        """Varianza de la proporción del estrato con corrección por población finita"""
+        if self.observed == 0:
+            return 0.25
+        p = self.smoothed_rate()
+        fpc = 1 - self.observed / self.population if self.population > 1 else 0
+        return p * (1 - p) / self.observed * fpc
+
+
+def build_strata(streams, min_host_share=0.05, min_host_size=20, seed=None):
+    """Estratos por fuente y host; los hosts pequeños de una fuente se juntan en '*otros*'"""
+    rng = random.Random(seed)
+    by_source = defaultdict(list)
+    for stream in streams:
+        by_source[stream.get('source') or UNKNOWN_SOURCE].append(stream)
+
+    strata = []
+    for source, items in by_source.items():
+        host_counts = defaultdict(int)
+        for stream in items:
+            host_counts[stream_host(stream['url'])] += 1
+        threshold = max(min_host_size, min_host_share * len(items))
+
+        groups = defaultdict(list)
+        for stream in items:
+            host = stream_host(stream['url'])
+            groups[host if host_counts[host] >= threshold else OTHER_HOSTS].append(stream)
+        strata.extend(Stratum((source, host), group, rng) for host, group in groups.items())
+    return strata
+
+
+class StratifiedSampleVerifier:
+    """Muestreo por rondas: mínimo por estrato, luego asignación de Neyman hasta alcanzar la precisión"""
+
+    def __init__(self, precision=0.05, confidence=0.95, max_probes=500, min_per_stratum=3, batch_size=64,
+                 max_concurrency=32, per_host_limit=4, timeout=10, freshness=False, cache=None,
+                 force_refresh=False, seed=None, on_round=None):
+        self.precision = precision
+        self.confidence = confidence
+        self.z = z_score(confidence)
+        self.max_probes = max_probes
+        self.min_per_stratum = min_per_stratum
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.freshness = freshness
+        self.cache = cache
+        self.force_refresh = force_refresh
+        self.seed = seed
+        self.on_round = on_round
+
+        self.strata = []
+        self.probes = 0
+        self.cache_hits = 0
+
+    @property
+    def mode(self):
+        return 'freshness' if self.freshness else 'liveness'
+
+    def estimate(self):
+        """Proporción global estratificada (pesos N_h/N) y su semiamplitud"""
+        population = sum(stratum.population for stratum in self.strata)
+        if not population:
+            return None, 1.0
+        estimate = 0.0
+        variance = 0.0
+        for stratum in self.strata:
+            weight = stratum.population / population
+            rate = stratum.rate if stratum.observed else 0.5
+            estimate += weight * rate
+            variance += weight * weight * stratum.variance_term()
+        return estimate, self.z * math.sqrt(variance)
+
+    def minimums_met(self):
+        return all(stratum.observed >= min(self.min_per_stratum, stratum.population) for stratum in self.strata)
+
+    def allocate(self, budget):
+        """Reparte 'budget' sondeos: primero los mínimos, luego Neyman (N_h · sqrt(p_h(1-p_h)))"""
+        allocation = defaultdict(int)
+        for stratum in self.strata:
+            missing = min(self.min_per_stratum, stratum.population) - stratum.drawn
+            if missing > 0 and budget > 0:
+                allocation[stratum] = min(missing, budget)
+                budget -= allocation[stratum]
+        if budget <= 0 or allocation:
+            return allocation
+
+        weights = {}
+        for stratum in self.strata:
+            if stratum.remaining > 0:
+                p = stratum.smoothed_rate()
+                weights[stratum] = stratum.population * math.sqrt(p * (1 - p))
+        total_weight = sum(weights.values())
+        if not total_weight:
+            return allocation
+
+        allocated = 0
+        for stratum, weight in sorted(weights.items(), key=lambda item: -item[1]):
+            share = min(max(1, round(budget * weight / total_weight)), stratum.remaining, budget - allocated)
+            if share > 0:
+                allocation[stratum] = share
+                allocated += share
+            if allocated >= budget:
+                break
+        return allocation
+
+    async def run(self, streams):
+        """Ejecuta el muestreo y devuelve el informe (estimación, IC, estratos, motivo de parada)"""
+        started = time.monotonic()
+        self.strata = build_strata(streams, seed=self.seed)
+        self.probes = 0
+        self.cache_hits = 0
+        stopped = 'exhausted'
+
+        while True:
+            estimate, half_width = self.estimate()
+            if self.minimums_met() and half_width <= self.precision:
+                stopped = 'precision'
+                break
+            budget = min(self.batch_size, self.max_probes - self.probes)
+            if budget <= 0:
+                stopped = 'budget'
+                break
+            allocation = self.allocate(budget)
+            if not allocation:
+                break
+            await self.run_round(allocation)
+            if self.on_round:
+                self.on_round(self)
+
+        return self.report(stopped, time.monotonic() - started)
+
+    async def run_round(self, allocation):
+        pending = deque()
+        owners = defaultdict(deque)
+        for stratum, count in allocation.items():
+            for stream in stratum.take(count):
+                if self.cache is not None:
+                    entry = self.cache.get(stream['url'], mode=self.mode, force_refresh=self.force_refresh)
+                    if entry:
+                        # Una observación gratis: ya se verificó hace poco
+                        stratum.record(entry['online'])
+                        self.cache_hits += 1
+                        continue
+                owners[stream['url']].append(stratum)
+                pending.append(stream)
+
+        if not pending:
+            return
+        verifier = StreamVerifier(
+            max_concurrency=self.max_concurrency,
+            per_host_limit=self.per_host_limit,
+            timeout=self.timeout,
+            freshness=self.freshness,
+        )
+        for result in await verifier.verify(list(pending)):
+            owners[result['url']].popleft().record(result['online'])
+            if self.cache is not None:
+                self.cache.put_result(result, mode=self.mode)
+        self.probes += len(pending)
+
+    def report(self, stopped, elapsed):
+        estimate, half_width = self.estimate()
+        strata = []
+        for stratum in sorted(self.strata, key=lambda item: -item.population):
+            low, high = wilson_interval(stratum.successes, stratum.observed, self.z)
+            strata.append({
+                'source': stratum.key[0],
+                'host': stratum.key[1],
+                'population': stratum.population,
+                'observed': stratum.observed,
+                'successes': stratum.successes,
+                'rate': stratum.rate,
+                'interval': (low, high),
+            })
+        return {
+            'estimate': estimate,
+            'interval': (max(0.0, estimate - half_width), min(1.0, estimate + half_width)) if estimate is not None else (0.0, 1.0),
+            'half_width': half_width,
+            'confidence': self.confidence,
+            'population': sum(stratum.population for stratum in self.strata),
+            'probes': self.probes,
+            'cache_hits': self.cache_hits,
+            'strata': strata,
+            'stopped': stopped,
+            'elapsed': round(elapsed, 2),
+        }
+
+
+def verify_sample_stratified(streams, **kwargs):
+    """Wrapper síncrono de StratifiedSampleVerifier.run"""
+    return run_sync(StratifiedSampleVerifier(**kwargs).run(streams))
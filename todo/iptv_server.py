@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🌐 IPTV SERVER - Servidor HTTP local de playlists
+Sirve los M3U generados desde memoria con ETag fuerte (If-None-Match → 304),
+gzip precomprimido y rangos de bytes, y filtra por grupo o fuente con
+parámetros (?group=Deportes&source=tvplusgratis2). Vigila el directorio:
+cuando se publica una playlist nueva (rename atómico del writer) la recarga
+sin reiniciar. Un refresco de un reproductor que ya tiene la lista cuesta
+una comparación de ETag y una respuesta 304 vacía
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import gzip
+import hashlib
+import os
+import re
+from collections import OrderedDict
+
+try:
+    from aiohttp import web
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+M3U_CONTENT_TYPE = 'audio/x-mpegurl'
+DEFAULT_PATTERN = '*.m3u'
+_SECTION_RE = re.compile(r'^#\s*===\s*(.+?)\s*\(\d+\s+\w+\)\s*===')
+_GROUP_RE = re.compile(r'group-title="([^"]*)"')
+_TITLE_SOURCE_RE = re.compile(r'\[([^\]]+)\]')
+_RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+def strong_etag(data):
+    return '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+
+
+def _keys(value):
+    return {part.strip().casefold() for part in value.split(',') if part.strip()} if value else set()
+
+
+class Representation:
+    """Un cuerpo servible: bytes en claro y gzip (ambos precalculados) con sus ETags"""
+
+    __slots__ = ('body', 'gzip_body', 'etag', 'gzip_etag', 'entries')
+
+    def __init__(self, body, entries):
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6)
+        self.etag = strong_etag(body)
+        # Cada codificación es una representación distinta: su ETag fuerte también
+        self.gzip_etag = self.etag[:-1] + '-gz"'
+        self.entries = entries
+
+
+class Playlist:
+    """M3U cargado en memoria: bytes originales + entradas con grupo y fuente para filtrar"""
+
+    def __init__(self, path, stat):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        self.mtime = stat.st_mtime
+        with open(path, 'rb') as f:
+            body = f.read()
+        self.group_names = set()
+        self.entries = self._split(body.decode('utf-8', 'replace'), self.group_names)
+        self.full = Representation(body, len(self.entries))
+        self.filtered = OrderedDict()
+
+    @staticmethod
+    def _split(text, group_names):
+        """Bloques (grupo, fuente, texto) en orden: #EXTINF + opciones + URL; grupo y fuente en minúsculas"""
+        entries = []
+        section = None
+        block = []
+        group = source = None
+        for line in text.splitlines():
+            stripped = line.strip()
+            if not stripped:
+                continue
+            match = _SECTION_RE.match(stripped)
+            if match:
+                section = match.group(1)
+                continue
+            if stripped.startswith('#EXTINF'):
+                block = [stripped]
+                found = _GROUP_RE.search(stripped)
+                group = found.group(1) if found else ''
+                if group:
+                    group_names.add(group)
+                title_sources = _TITLE_SOURCE_RE.findall(stripped.rsplit(',', 1)[-1])
+                source = section or (title_sources[-1] if title_sources else '')
+            elif stripped.startswith('#'):
+                if block:
+                    block.append(stripped)
+            else:
+                block.append(stripped)
+                entries.append(((group or '').casefold(), (source or section or '').casefold(), '\n'.join(block) + '\n'))
+                block = []
+                group = source = None
+        return entries
+
+    def groups(self):
+        return sorted(self.group_names)
+
+    def select(self, groups=None, sources=None, max_cached=32):
+        """Representación completa o filtrada (las filtradas se cachean por combinación de filtros)"""
+        if not groups and not sources:
+            return self.full
+        key = (frozenset(groups or ()), frozenset(sources or ()))
+        representation = self.filtered.get(key)
+        if representation is not None:
+            self.filtered.move_to_end(key)
+            return representation
+
+        chosen = [text for group, source, text in self.entries
+                  if (not groups or group in groups)
+                  and (not sources or any(wanted in source for wanted in sources))]
+        body = ('#EXTM3U\n' + ''.join(chosen)).encode('utf-8')
+        representation = self.filtered[key] = Representation(body, len(chosen))
+        if len(self.filtered) > max_cached:
+            self.filtered.popitem(last=False)
+        return representation
+
+
+class PlaylistStore:
+    """Las playlists de un directorio en memoria; refresh() recarga solo las que cambiaron"""
+
+    def __init__(self, directory='.', pattern=DEFAULT_PATTERN):
+        self.directory = directory
+        self.pattern = pattern
+        self.playlists = {}
+        self.reloads = 0
+
+    def refresh(self):
+        """Relee lo nuevo o modificado (mtime, tamaño, inodo) y olvida lo borrado; devuelve los recargados"""
+        # Se construye un diccionario nuevo y se sustituye de golpe: los handlers lo leen desde otro hilo
+        playlists = {}
+        changed = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            names = []
+        for filename in names:
+            if not fnmatch.fnmatch(filename, self.pattern):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            name = os.path.splitext(filename)[0]
+            current = self.playlists.get(name)
+            if current is not None and current.signature == (stat.st_mtime_ns, stat.st_size, stat.st_ino):
+                playlists[name] = current
+                continue
+            try:
+                playlists[name] = Playlist(path, stat)
+            except OSError:
+                continue
+            changed.append(name)
+        self.playlists = playlists
+        self.reloads += len(changed)
+        return changed
+
+    def get(self, name):
+        if name == 'latest':
+            return max(self.playlists.values(), key=lambda playlist: playlist.mtime, default=None)
+        return self.playlists.get(name)
+
+    def catalog(self):
+        return [
+            {'name': playlist.name, 'url': f'/{playlist.name}.m3u', 'entries': playlist.full.entries,
+             'bytes': len(playlist.full.body), 'etag': playlist.full.etag, 'groups': playlist.groups(),
+             'modified': playlist.mtime}
+            for playlist in sorted(self.playlists.values(), key=lambda playlist: playlist.name)
+        ]
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in {candidate.strip() for candidate in header.split(',')}
+
+
+def accepts_gzip(header):
+    """True si Accept-Encoding admite gzip con q > 0 ('gzip;q=0' lo rechaza; '*' vale si gzip no aparece)"""
+    qualities = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def parse_range(header, size):
+    """'bytes=a-b' (un solo rango) → (inicio, fin inclusivo); None si no aplica; ValueError si es insatisfacible"""
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError('rango vacío')
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('rango fuera del archivo')
+    return start, end
+
+
+class PlaylistServer:
+    """Servidor aiohttp: / (catálogo JSON), /<nombre>.m3u y /latest.m3u con filtros ?group= y ?source="""
+
+    def __init__(self, directory='.', host='0.0.0.0', port=8080, pattern=DEFAULT_PATTERN, poll_interval=2.0, relay=None,
+                 failover=None):
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp no está instalado (pip install aiohttp)")
+        self.store = PlaylistStore(directory, pattern)
+        self.host = host
+        self.port = port
+        self.poll_interval = poll_interval
+        # HLSRelay opcional: añade /relay/<nombre>.m3u y las rutas de manifiestos y segmentos
+        self.relay = relay
+        # FailoverRedirector opcional: añade /failover/<nombre>.m3u y /go/<nombre>/<canal>
+        self.failover = failover
+        self.stats = {'requests': 0, 'not_modified': 0, 'partial': 0, 'gzip': 0, 'bytes_sent': 0}
+        self.runner = None
+        self._watcher = None
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_get('/', self.handle_catalog)
+        app.router.add_get('/{name}.m3u', self.handle_playlist)
+        app.router.add_get('/{name}.m3u8', self.handle_playlist)
+        if self.relay is not None:
+            self.relay.add_routes(app, self)
+        if self.failover is not None:
+            self.failover.add_routes(app, self)
+        return app
+
+    async def handle_catalog(self, request):
+        return web.json_response({'playlists': self.store.catalog(), 'stats': self.stats})
+
+    async def handle_playlist(self, request):
+        self.stats['requests'] += 1
+        playlist = self.store.get(request.match_info['name'])
+        if playlist is None:
+            raise web.HTTPNotFound(text='Playlist no encontrada')
+        representation = playlist.select(_keys(request.query.get('group')), _keys(request.query.get('source')))
+        return self.respond(request, representation)
+
+    def respond(self, request, representation):
+        """304 / 206 / 200 (gzip o en claro) para una representación, según las cabeceras del cliente"""
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if range_header and if_range and if_range.strip() != representation.etag:
+            # El cliente tiene otra versión: los rangos no casarían, se envía entera
+            range_header = None
+        # Los rangos se sirven sobre la representación en claro; el gzip, solo para descargas completas
+        use_gzip = not range_header and accepts_gzip(request.headers.get('Accept-Encoding'))
+        etag = representation.gzip_etag if use_gzip else representation.etag
+        headers = {
+            'ETag': etag,
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding',
+            'Accept-Ranges': 'bytes',
+            'X-Playlist-Entries': str(representation.entries),
+        }
+
+        if_none_match = request.headers.get('If-None-Match')
+        if etag_matches(if_none_match, representation.etag) or etag_matches(if_none_match, representation.gzip_etag):
+            self.stats['not_modified'] += 1
+            return web.Response(status=304, headers=headers)
+
+        body = representation.body
+        if range_header:
+            try:
+                selected = parse_range(range_header, len(body))
+            except ValueError:
+                headers['Content-Range'] = f'bytes */{len(body)}'
+                return web.Response(status=416, headers=headers)
+            if selected is not None:
+                start, end = selected
+                self.stats['partial'] += 1
+                self.stats['bytes_sent'] += end - start + 1
+                headers['Content-Range'] = f'bytes {start}-{end}/{len(body)}'
+                return web.Response(status=206, body=body[start:end + 1], headers=headers,
+                                    content_type=M3U_CONTENT_TYPE, charset='utf-8')
+
+        if use_gzip:
+            body = representation.gzip_body
+            headers['Content-Encoding'] = 'gzip'
+            self.stats['gzip'] += 1
+        self.stats['bytes_sent'] += len(body)
+        return web.Response(body=body, headers=headers, content_type=M3U_CONTENT_TYPE, charset='utf-8')
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            # La lectura y el gzip de una lista grande no deben bloquear las respuestas en curso
+            changed = await asyncio.to_thread(self.store.refresh)
+            if changed:
+                print(f"🔄 Playlists recargadas: {', '.join(sorted(changed))}")
+
+    async def start(self):
+        loaded = await asyncio.to_thread(self.store.refresh)
+        self.runner = web.AppRunner(self.build_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self._watcher = asyncio.create_task(self._watch())
+        print(f"🌐 Servidor de playlists en http://{self.host}:{self.port}/ ({len(loaded)} playlists)")
+        return self
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def run(self):
+        """Sirve hasta que se cancele (Ctrl+C)"""
+        await self.start()
+        try:
+            while True:
+                await asyncio.sleep(3600)
+        finally:
+            await self.stop()
+
+    def report(self):
+        stats = self.stats
+        print(f"📨 Peticiones: {stats['requests']} (304: {stats['not_modified']}, rangos: {stats['partial']}, "
+              f"gzip: {stats['gzip']})")
+        print(f"📤 Enviado: {stats['bytes_sent'] / 1024:.1f} KB")
+        if self.relay is not None:
+            self.relay.report()
+        if self.failover is not None:
+            self.failover.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor HTTP local de playlists M3U')
+    parser.add_argument('--dir', default='.', help='Directorio con las playlists')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--pattern', default=DEFAULT_PATTERN, help='Archivos a servir (comodín)')
+    parser.add_argument('--poll', type=float, default=2.0, help='Segundos entre comprobaciones de cambios')
+    parser.add_argument('--relay', action='store_true', help='Activar el relay HLS (/relay/<nombre>.m3u)')
+    parser.add_argument('--cache-mb', type=int, default=256, help='Tamaño de la caché de segmentos del relay')
+    parser.add_argument('--no-failover', action='store_true', help='Sin /failover/<nombre>.m3u ni redirecciones /go/')
+    parser.add_argument('--verification-cache', default='verification_cache.json',
+                        help='Caché de verificación con la que se elige la candidata de cada canal')
+    args = parser.parse_args()
+
+    if not AIOHTTP_AVAILABLE:
+        print("❌ aiohttp no está instalado (pip install aiohttp)")
+        return
+    relay = None
+    if args.relay:
+        from iptv_relay import HLSRelay
+        relay = HLSRelay(cache_bytes=args.cache_mb * 1024 * 1024)
+    failover = None
+    if not args.no_failover:
+        from iptv_cache import VerificationCache
+        from iptv_failover import FailoverRedirector
+        failover = FailoverRedirector(VerificationCache(args.verification_cache))
+    server = PlaylistServer(args.dir, args.host, args.port, args.pattern, args.poll, relay=relay, failover=failover)
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        print("\n⚠️ Servidor detenido")
+    server.report()
+
+
+if __name__ == "__main__":
+    main()
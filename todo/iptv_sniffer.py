@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🔬 IPTV SNIFFER - Metadatos de vídeo sin ffprobe
+Lee las cabeceras de un segmento MPEG-TS (PAT/PMT + SPS H.264/H.265/MPEG-2)
+o fMP4 (moov/stsd: avc1, hvc1, mp4a...) y devuelve codec, resolución y perfil
+con el mismo formato de claves que iptv_ffprobe
+"""
+
+import struct
+
+SNIFF_BYTES = 384 * 1024
+TS_PACKET_SIZE = 188
+
+# stream_type de la PMT → codec (nombres como los de ffprobe)
+TS_VIDEO_TYPES = {
+    0x01: 'mpeg1video',
+    0x02: 'mpeg2video',
+    0x10: 'mpeg4',
+    0x1B: 'h264',
+    0x24: 'hevc',
+}
+TS_AUDIO_TYPES = {
+    0x03: 'mp2',
+    0x04: 'mp2',
+    0x0F: 'aac',
+    0x11: 'aac_latm',
+    0x81: 'ac3',
+    0x87: 'eac3',
+}
+# Descriptores de la PMT para audio en stream_type 0x06 (PES privado, DVB)
+TS_AUDIO_DESCRIPTORS = {0x6A: 'ac3', 0x7A: 'eac3'}
+
+MP4_CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+MP4_VIDEO_ENTRIES = {
+    b'avc1': 'h264', b'avc3': 'h264',
+    b'hvc1': 'hevc', b'hev1': 'hevc',
+    b'av01': 'av1', b'vp09': 'vp9',
+}
+MP4_AUDIO_ENTRIES = {
+    b'mp4a': 'aac', b'ac-3': 'ac3', b'ec-3': 'eac3', b'Opus': 'opus', b'.mp3': 'mp3',
+}
+
+H264_PROFILES = {
+    66: 'Baseline', 77: 'Main', 88: 'Extended', 100: 'High',
+    110: 'High 10', 122: 'High 4:2:2', 244: 'High 4:4:4 Predictive',
+}
+# Perfiles H.264 cuya SPS incluye chroma_format_idc, bit depth y scaling lists
+H264_HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+HEVC_PROFILES = {1: 'Main', 2: 'Main 10', 3: 'Main Still Picture', 4: 'Rext'}
+
+
+def new_media_info(container):
+    return {
+        'container': container,
+        'video_codec': None,
+        'profile': None,
+        'level': None,
+        'width': None,
+        'height': None,
+        'audio_codec': None,
+        'source': 'sniff',
+    }
+
+
+class BitReader:
+    """Lector de bits MSB-first con Exp-Golomb (ue/se) para parsear SPS"""
+
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def u(self, bits):
+        value = 0
+        for _ in range(bits):
+            byte = self.data[self.position >> 3]
+            value = (value << 1) | ((byte >> (7 - (self.position & 7))) & 1)
+            self.position += 1
+        return value
+
+    def skip(self, bits):
+        self.position += bits
+
+    def ue(self):
+        zeros = 0
+        while self.u(1) == 0:
+            zeros += 1
+            if zeros > 31:
+                raise ValueError('Exp-Golomb inválido')
+        return (1 << zeros) - 1 + self.u(zeros)
+
+    def se(self):
+        value = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+def _unescape_rbsp(nal):
+    """Quita los bytes de prevención de emulación (00 00 03 → 00 00)"""
+    return nal.replace(b'\x00\x00\x03', b'\x00\x00')
+
+
+def _iter_nal_units(stream):
+    """NAL units de un elementary stream Annex B (separados por 00 00 01)"""
+    start = stream.find(b'\x00\x00\x01')
+    while start != -1:
+        start += 3
+        end = stream.find(b'\x00\x00\x01', start)
+        nal = stream[start:end] if end != -1 else stream[start:]
+        yield nal.rstrip(b'\x00')
+        start = end
+
+
+def _skip_scaling_list(reader, size):
+    last_scale = next_scale = 8
+    for _ in range(size):
+        if next_scale != 0:
+            next_scale = (last_scale + reader.se() + 256) % 256
+        last_scale = next_scale or last_scale
+
+
+def parse_h264_sps(nal):
+    """SPS H.264 (NAL tipo 7, con cabecera) → perfil, nivel y resolución con cropping"""
+    reader = BitReader(_unescape_rbsp(nal[1:]))
+    profile_idc = reader.u(8)
+    reader.skip(8)  # constraint flags
+    level_idc = reader.u(8)
+    reader.ue()  # seq_parameter_set_id
+
+    chroma_format_idc = 1
+    if profile_idc in H264_HIGH_PROFILES:
+        chroma_format_idc = reader.ue()
+        if chroma_format_idc == 3:
+            reader.skip(1)  # separate_colour_plane_flag
+        reader.ue()  # bit_depth_luma_minus8
+        reader.ue()  # bit_depth_chroma_minus8
+        reader.skip(1)  # qpprime_y_zero_transform_bypass_flag
+        if reader.u(1):  # seq_scaling_matrix_present_flag
+            for index in range(8 if chroma_format_idc != 3 else 12):
+                if reader.u(1):
+                    _skip_scaling_list(reader, 16 if index < 6 else 64)
+
+    reader.ue()  # log2_max_frame_num_minus4
+    pic_order_cnt_type = reader.ue()
+    if pic_order_cnt_type == 0:
+        reader.ue()
+    elif pic_order_cnt_type == 1:
+        reader.skip(1)
+        reader.se()
+        reader.se()
+        for _ in range(reader.ue()):
+            reader.se()
+
+    reader.ue()  # max_num_ref_frames
+    reader.skip(1)  # gaps_in_frame_num_value_allowed_flag
+    width_in_mbs = reader.ue() + 1
+    height_in_map_units = reader.ue() + 1
+    frame_mbs_only = reader.u(1)
+    if not frame_mbs_only:
+        reader.skip(1)  # mb_adaptive_frame_field_flag
+    reader.skip(1)  # direct_8x8_inference_flag
+
+    width = width_in_mbs * 16
+    height = (2 - frame_mbs_only) * height_in_map_units * 16
+    if reader.u(1):  # frame_cropping_flag
+        left, right, top, bottom = reader.ue(), reader.ue(), reader.ue(), reader.ue()
+        crop_x = 1 if chroma_format_idc in (0, 3) else 2
+        crop_y = (2 - frame_mbs_only) * (2 if chroma_format_idc == 1 else 1)
+        width -= crop_x * (left + right)
+        height -= crop_y * (top + bottom)
+
+    return {
+        'profile': H264_PROFILES.get(profile_idc, str(profile_idc)),
+        'level': f'{level_idc / 10:.1f}',
+        'width': width,
+        'height': height,
+    }
+
+
+def parse_hevc_sps(nal):
+    """SPS H.265 (NAL tipo 33, con cabecera de 2 bytes) → perfil, nivel y resolución"""
+    reader = BitReader(_unescape_rbsp(nal[2:]))
+    reader.skip(4)  # sps_video_parameter_set_id
+    max_sub_layers_minus1 = reader.u(3)
+    reader.skip(1)  # sps_temporal_id_nesting_flag
+
+    # profile_tier_level(1, max_sub_layers_minus1)
+    reader.skip(2 + 1)  # general_profile_space, general_tier_flag
+    profile_idc = reader.u(5)
+    reader.skip(32 + 48)  # compatibility flags + constraint flags
+    level_idc = reader.u(8)
+    sub_layer_flags = [(reader.u(1), reader.u(1)) for _ in range(max_sub_layers_minus1)]
+    if max_sub_layers_minus1 > 0:
+        reader.skip(2 * (8 - max_sub_layers_minus1))
+    for profile_present, level_present in sub_layer_flags:
+        if profile_present:
+            reader.skip(88)
+        if level_present:
+            reader.skip(8)
+
+    reader.ue()  # sps_seq_parameter_set_id
+    chroma_format_idc = reader.ue()
+    if chroma_format_idc == 3:
+        reader.skip(1)
+    width = reader.ue()
+    height = reader.ue()
+    if reader.u(1):  # conformance_window_flag
+        left, right, top, bottom = reader.ue(), reader.ue(), reader.ue(), reader.ue()
+        sub_width = 2 if chroma_format_idc in (1, 2) else 1
+        sub_height = 2 if chroma_format_idc == 1 else 1
+        width -= sub_width * (left + right)
+        height -= sub_height * (top + bottom)
+
+    return {
+        'profile': HEVC_PROFILES.get(profile_idc, str(profile_idc)),
+        'level': f'{level_idc / 30:.1f}',
+        'width': width,
+        'height': height,
+    }
+
+
+def parse_mpeg2_sequence_header(stream):
+    """Cabecera de secuencia MPEG-1/2 (00 00 01 B3): 12 bits de ancho y 12 de alto"""
+    position = stream.find(b'\x00\x00\x01\xb3')
+    if position == -1 or position + 7 > len(stream):
+        return None
+    size = stream[position + 4:position + 7]
+    return {
+        'width': (size[0] << 4) | (size[1] >> 4),
+        'height': ((size[1] & 0x0F) << 8) | size[2],
+    }
+
+
+def parse_video_elementary_stream(codec, stream):
+    """Busca la SPS/cabecera de secuencia en un elementary stream de vídeo"""
+    if codec in ('mpeg1video', 'mpeg2video'):
+        return parse_mpeg2_sequence_header(stream)
+
+    for nal in _iter_nal_units(stream):
+        if not nal:
+            continue
+        try:
+            if codec == 'h264' and nal[0] & 0x1F == 7:
+                return parse_h264_sps(nal)
+            if codec == 'hevc' and (nal[0] >> 1) & 0x3F == 33:
+                return parse_hevc_sps(nal)
+        except (IndexError, ValueError):
+            # SPS truncada (el rango leído cortó la NAL): probar con la siguiente
+            continue
+    return None
+
+
+def _ts_sync_offset(data):
+    """Primer desplazamiento con 0x47 en él y en los paquetes siguientes presentes (al menos dos)"""
+    for offset in range(max(0, min(TS_PACKET_SIZE, len(data) - TS_PACKET_SIZE))):
+        following = range(offset, min(len(data), offset + TS_PACKET_SIZE * 4), TS_PACKET_SIZE)
+        if all(data[position] == 0x47 for position in following):
+            return offset
+    return None
+
+
+def _ts_packets(data, offset):
+    """(pid, payload_unit_start, payload) de cada paquete TS"""
+    for position in range(offset, len(data) - TS_PACKET_SIZE + 1, TS_PACKET_SIZE):
+        packet = data[position:position + TS_PACKET_SIZE]
+        if packet[0] != 0x47:
+            continue
+        payload_start = bool(packet[1] & 0x40)
+        pid = ((packet[1] & 0x1F) << 8) | packet[2]
+        adaptation = (packet[3] >> 4) & 0x03
+        start = 4
+        if adaptation & 0x02:
+            start += 1 + packet[4]
+        if not adaptation & 0x01 or start >= TS_PACKET_SIZE:
+            continue
+        yield pid, payload_start, packet[start:]
+
+
+def _psi_section(payload):
+    """Sección PSI tras el pointer_field; None si está incompleta"""
+    section = payload[1 + payload[0]:]
+    if len(section) < 3:
+        return None
+    length = ((section[1] & 0x0F) << 8) | section[2]
+    if len(section) < 3 + length:
+        return None
+    return section[:3 + length]
+
+
+def _parse_pat(section):
+    """program_number → PID de la PMT"""
+    pmt_pids = []
+    for position in range(8, len(section) - 4, 4):
+        program_number = (section[position] << 8) | section[position + 1]
+        pid = ((section[position + 2] & 0x1F) << 8) | section[position + 3]
+        if program_number != 0:
+            pmt_pids.append(pid)
+    return pmt_pids
+
+
+def _parse_pmt(section):
+    """[(stream_type, pid, descriptores)] de una sección PMT"""
+    streams = []
+    program_info_length = ((section[10] & 0x0F) << 8) | section[11]
+    position = 12 + program_info_length
+    end = len(section) - 4
+    while position + 5 <= end:
+        stream_type = section[position]
+        pid = ((section[position + 1] & 0x1F) << 8) | section[position + 2]
+        info_length = ((section[position + 3] & 0x0F) << 8) | section[position + 4]
+        descriptors = section[position + 5:position + 5 + info_length]
+        streams.append((stream_type, pid, descriptors))
+        position += 5 + info_length
+    return streams
+
+
+def _descriptor_tags(descriptors):
+    tags = set()
+    position = 0
+    while position + 2 <= len(descriptors):
+        tags.add(descriptors[position])
+        position += 2 + descriptors[position + 1]
+    return tags
+
+
+def _strip_pes_header(payload):
+    """Elimina la cabecera PES (00 00 01 stream_id ...) del primer paquete de cada PES"""
+    if len(payload) < 9 or payload[:3] != b'\x00\x00\x01':
+        return payload
+    return payload[9 + payload[8]:]
+
+
+def sniff_ts(data, max_video_bytes=SNIFF_BYTES):
+    """PAT → PMT → elementary stream de vídeo → SPS"""
+    offset = _ts_sync_offset(data)
+    if offset is None:
+        return None
+
+    info = new_media_info('ts')
+    pmt_pids = set()
+    video_pid = None
+    video_stream = bytearray()
+    collecting = False
+
+    for pid, payload_start, payload in _ts_packets(data, offset):
+        if pid == 0 and payload_start and not pmt_pids:
+            section = _psi_section(payload)
+            if section and section[0] == 0x00:
+                pmt_pids.update(_parse_pat(section))
+
+        elif pid in pmt_pids and payload_start and video_pid is None:
+            section = _psi_section(payload)
+            if not section or section[0] != 0x02:
+                continue
+            for stream_type, stream_pid, descriptors in _parse_pmt(section):
+                if stream_type in TS_VIDEO_TYPES and video_pid is None:
+                    video_pid = stream_pid
+                    info['video_codec'] = TS_VIDEO_TYPES[stream_type]
+                elif info['audio_codec'] is None:
+                    if stream_type in TS_AUDIO_TYPES:
+                        info['audio_codec'] = TS_AUDIO_TYPES[stream_type]
+                    elif stream_type == 0x06:
+                        tags = _descriptor_tags(descriptors) & set(TS_AUDIO_DESCRIPTORS)
+                        if tags:
+                            info['audio_codec'] = TS_AUDIO_DESCRIPTORS[tags.pop()]
+            if video_pid is None:
+                # Solo audio: la PMT ya lo dice todo
+                return info
+
+        elif pid == video_pid and video_pid is not None:
+            if payload_start:
+                # Un PES completo ya acumulado: la SPS suele ir en el primero (keyframe)
+                if video_stream:
+                    found = parse_video_elementary_stream(info['video_codec'], bytes(video_stream))
+                    if found:
+                        info.update(found)
+                        return info
+                collecting = True
+                payload = _strip_pes_header(payload)
+            if collecting:
+                video_stream += payload
+                if len(video_stream) >= max_video_bytes:
+                    break
+
+    if info['video_codec'] and video_stream and info['width'] is None:
+        found = parse_video_elementary_stream(info['video_codec'], bytes(video_stream))
+        if found:
+            info.update(found)
+    return info
+
+
+def _iter_boxes(data, start=0, end=None):
+    """(tipo, inicio del contenido, fin) de cada box ISO-BMFF en data[start:end]"""
+    end = len(data) if end is None else end
+    position = start
+    while position + 8 <= end:
+        size, box_type = struct.unpack('>I4s', data[position:position + 8])
+        header = 8
+        if size == 1 and position + 16 <= end:
+            size = struct.unpack('>Q', data[position + 8:position + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header:
+            return
+        yield box_type, position + header, min(position + size, end)
+        position += size
+
+
+def _parse_sample_entries(data, start, end, info):
+    """Entradas de stsd: dimensiones del VisualSampleEntry + avcC/hvcC para perfil y nivel"""
+    # stsd es un full box: version/flags (4) + entry_count (4)
+    for entry_type, content, entry_end in _iter_boxes(data, start + 8, end):
+        if entry_type in MP4_VIDEO_ENTRIES and info['video_codec'] is None:
+            info['video_codec'] = MP4_VIDEO_ENTRIES[entry_type]
+            if content + 28 <= entry_end:
+                info['width'], info['height'] = struct.unpack('>HH', data[content + 24:content + 28])
+            # Los boxes hijos empiezan tras los 78 bytes del VisualSampleEntry
+            for child_type, child, child_end in _iter_boxes(data, content + 78, entry_end):
+                config = data[child:child_end]
+                if child_type == b'avcC' and len(config) >= 4:
+                    info['profile'] = H264_PROFILES.get(config[1], str(config[1]))
+                    info['level'] = f'{config[3] / 10:.1f}'
+                elif child_type == b'hvcC' and len(config) >= 13:
+                    info['profile'] = HEVC_PROFILES.get(config[1] & 0x1F, str(config[1] & 0x1F))
+                    info['level'] = f'{config[12] / 30:.1f}'
+        elif entry_type in MP4_AUDIO_ENTRIES and info['audio_codec'] is None:
+            info['audio_codec'] = MP4_AUDIO_ENTRIES[entry_type]
+
+
+def sniff_fmp4(data):
+    """Recorre moov/trak/.../stsd del init segment (o de un MP4 con moov)"""
+    info = new_media_info('fmp4')
+
+    def walk(start, end):
+        for box_type, content, box_end in _iter_boxes(data, start, end):
+            if box_type in MP4_CONTAINER_BOXES:
+                walk(content, box_end)
+            elif box_type == b'stsd':
+                _parse_sample_entries(data, content, box_end, info)
+
+    walk(0, len(data))
+    return info
+
+
+def sniff_media(data, init_data=None):
+    """Metadatos de un segmento (TS o fMP4); init_data es el EXT-X-MAP de los fMP4"""
+    if not data and not init_data:
+        return None
+    if data and _ts_sync_offset(data) is not None:
+        return sniff_ts(data)
+
+    for candidate in (init_data, data):
+        if candidate and len(candidate) >= 8 and candidate[4:8] in (b'ftyp', b'styp', b'moov', b'moof', b'sidx'):
+            info = sniff_fmp4(candidate)
+            if info and (info['video_codec'] or info['audio_codec']):
+                return info
+    if data and len(data) >= 8 and data[4:8] in (b'ftyp', b'styp', b'moof', b'sidx'):
+        # Segmento de medios sin init: solo sabemos el contenedor
+        return new_media_info('fmp4')
+    return None
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+✅ IPTV VERIFY - Verificador asíncrono de streams
+Reutiliza conexiones por host, limita la concurrencia global y por host,
+y entrega cada resultado en cuanto está listo mediante un callback
+En modo frescura los HLS se clasifican live/frozen/dead (el manifiesto debe avanzar)
+Los streams se agrupan por host: si los primeros fallan por DNS, conexión
+rechazada o TLS, el resto del host se marca offline sin sondearlo
+Los slots se reparten por turnos entre hosts (FairLimiter): un origen con
+miles de entradas seguidas no acapara la concurrencia global
+"""
+
+import asyncio
+import itertools
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+from iptv_hls import is_hls_url, probe_hls, probe_media, check_freshness, classify_network_error, HOST_ERROR_KINDS
+from iptv_ffprobe import FFprobePool
+from iptv_autotune import ConcurrencyTuner
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+# Señales de que vamos demasiado rápido (para el auto-ajuste): no cuentan los 404 ni los DNS caídos
+TRANSIENT_ERROR_KINDS = {'timeout', 'connect'}
+BLOCK_STATUSES = {429, 503}
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': '*/*',
+    'Connection': 'keep-alive',
+}
+
+
+def stream_host(url):
+    """Host (netloc en minúsculas) de una URL de stream"""
+    return urlparse(url).netloc.lower()
+
+
+def stream_origin(url):
+    """Esquema + host: un fallo TLS en https://host no dice nada de http://host"""
+    parts = urlparse(url)
+    return f'{parts.scheme.lower()}://{parts.netloc.lower()}'
+
+
+def run_sync(coroutine):
+    """asyncio.run que también funciona si ya hay un event loop en marcha (main async)"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def interleave_by_host(items, key=lambda item: item['url']):
+    """Reordena por turnos entre hosts (a1 b1 c1 a2 b2 ...) conservando el orden dentro de cada host"""
+    by_host = OrderedDict()
+    for item in items:
+        by_host.setdefault(stream_host(key(item)), []).append(item)
+    rounds = itertools.zip_longest(*by_host.values())
+    return [item for batch in rounds for item in batch if item is not None]
+
+
+class FairLimiter:
+    """Tope global + tope por host, con los slots libres concedidos por turno rotatorio entre hosts
+
+    Con dos semáforos anidados, las tareas de un host saturado retienen slots
+    globales mientras esperan el suyo y los demás hosts se quedan sin sondear.
+    Aquí solo se concede un slot cuando el host tiene hueco, y los hosts con
+    tareas en espera se atienden en round-robin
+    """
+
+    def __init__(self, max_concurrency, per_host_limit):
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.active = 0
+        self.host_active = {}
+        self.waiters = {}
+        # Hosts con tareas en espera y hueco propio, en orden de turno
+        self.ready = OrderedDict()
+
+    def _grant(self, host):
+        self.active += 1
+        self.host_active[host] = self.host_active.get(host, 0) + 1
+
+    async def acquire(self, host):
+        if self.active < self.max_concurrency and self.host_active.get(host, 0) < self.per_host_limit:
+            self._grant(host)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(host, deque()).append(future)
+        if self.host_active.get(host, 0) < self.per_host_limit:
+            self.ready[host] = None
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # El slot llegó a concederse: devolverlo
+                self.release(host)
+            raise
+
+    def release(self, host):
+        self.active -= 1
+        self.host_active[host] -= 1
+        if not self.host_active[host]:
+            del self.host_active[host]
+        if self.waiters.get(host) and host not in self.ready:
+            self.ready[host] = None
+        self._dispatch()
+
+    def set_limit(self, max_concurrency):
+        """Cambia el tope global en caliente (auto-ajuste); al subirlo se despierta a los que esperan"""
+        self.max_concurrency = max_concurrency
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.active < self.max_concurrency and self.ready:
+            host, _ = self.ready.popitem(last=False)
+            queue = self.waiters.get(host)
+            while queue and queue[0].done():
+                queue.popleft()
+            if not queue:
+                self.waiters.pop(host, None)
+                continue
+            if self.host_active.get(host, 0) >= self.per_host_limit:
+                continue
+            self._grant(host)
+            queue.popleft().set_result(None)
+            if not queue:
+                del self.waiters[host]
+            elif self.host_active[host] < self.per_host_limit:
+                self.ready[host] = None
+
+    @asynccontextmanager
+    async def slot(self, host):
+        await self.acquire(host)
+        try:
+            yield
+        finally:
+            self.release(host)
+
+
+class StreamVerifier:
+    """Verificador asíncrono: HEAD/GET con sesión compartida y ffprobe como último recurso
+
+    sniff=True lee las cabeceras TS/fMP4 en proceso (codec, resolución, perfil en
+    result['media']); deep_probe=True recurre a ffprobe solo si el sniffer no bastó
+    """
+
+    def __init__(self, max_concurrency=50, per_host_limit=4, timeout=10, use_ffprobe=True, on_result=None,
+                 freshness=False, freshness_max_wait=10, ffprobe_workers=4, deep_probe=False, sniff=False,
+                 host_scouts=2, autotune=False):
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.ffprobe = FFprobePool(max_workers=ffprobe_workers, timeout=timeout)
+        self.use_ffprobe = use_ffprobe and self.ffprobe.available
+        self.deep_probe = deep_probe
+        self.sniff = sniff
+        self.on_result = on_result
+        self.freshness = freshness
+        self.freshness_max_wait = freshness_max_wait
+        self.host_scouts = host_scouts
+        # autotune=True: max_concurrency es el punto de partida y el tuner lo mueve entre per_host_limit y 4×
+        self.autotune = autotune
+        self.tuner = None
+        self._limiter = None
+
+        self.total = 0
+        self.checked = 0
+        self.online = 0
+        self.short_circuited = 0
+        self.down_hosts = {}
+
+    def create_session(self):
+        """Sesión aiohttp con los límites del verificador, para reutilizarla entre llamadas a verify()"""
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency * 4 if self.autotune else self.max_concurrency,
+            limit_per_host=self.per_host_limit,
+            ttl_dns_cache=300,
+            ssl=False,
+        )
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=DEFAULT_HEADERS)
+
+    async def verify(self, streams, session=None):
+        """Verifica una lista de streams ({'url', 'name'}) y devuelve los resultados en orden de llegada
+
+        session: sesión de create_session() que el llamador mantiene abierta (monitor continuo);
+        sin ella se abre una para esta llamada y se cierra al terminar
+        """
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp no disponible (pip install aiohttp)")
+
+        self.total = len(streams)
+        self.checked = 0
+        self.online = 0
+        self.short_circuited = 0
+        self.down_hosts = {}
+        results = []
+
+        by_host = {}
+        for stream in streams:
+            by_host.setdefault(stream_origin(stream['url']), []).append(stream)
+
+        self.tuner = None
+        if self.autotune:
+            self.tuner = ConcurrencyTuner(self.max_concurrency, min_limit=max(2, self.per_host_limit),
+                                          max_limit=self.max_concurrency * 4)
+        limiter = self._limiter = FairLimiter(self.max_concurrency, self.per_host_limit)
+
+        if session is None:
+            async with self.create_session() as session:
+                await self._verify_all(session, by_host, limiter, results)
+        else:
+            await self._verify_all(session, by_host, limiter, results)
+        return results
+
+    async def _verify_all(self, session, by_host, limiter, results):
+        async def run(stream):
+            host = stream_host(stream['url'])
+            if self.freshness and is_hls_url(stream['url']):
+                # Las dos lecturas toman el límite por separado: la espera entre ellas no ocupa slot
+                result = await self.check_stream_freshness(session, stream, lambda: limiter.slot(host))
+            else:
+                async with limiter.slot(host):
+                    result = await self.check_stream(session, stream)
+            self._record(result)
+            results.append(result)
+            return result
+
+        async def run_host(host, host_streams):
+            if not self.host_scouts or len(host_streams) <= self.host_scouts:
+                await asyncio.gather(*(run(stream) for stream in host_streams))
+                return
+
+            # Exploradores primero: si el host entero está caído no se gasta un timeout por stream
+            scouts = await asyncio.gather(*(run(stream) for stream in host_streams[:self.host_scouts]))
+            verdict = self.host_verdict(scouts)
+            if verdict is None:
+                await asyncio.gather(*(run(stream) for stream in host_streams[self.host_scouts:]))
+                return
+
+            self.down_hosts[host] = verdict
+            for stream in host_streams[self.host_scouts:]:
+                result = self.host_down_result(stream, verdict)
+                self.short_circuited += 1
+                self._record(result)
+                results.append(result)
+
+        await asyncio.gather(*(run_host(host, host_streams) for host, host_streams in by_host.items()))
+
+    @staticmethod
+    def host_verdict(scouts):
+        """Tipo de error común si todos los exploradores fallaron por un problema del host"""
+        kinds = {result.get('error_kind') for result in scouts}
+        if any(result['online'] for result in scouts) or len(kinds) != 1 or not kinds <= HOST_ERROR_KINDS:
+            return None
+        return kinds.pop()
+
+    @staticmethod
+    def host_down_result(stream, verdict):
+        return {
+            'url': stream['url'],
+            'name': stream.get('name', ''),
+            'online': False,
+            'http_status': None,
+            'method': 'host',
+            'error': f'host caído ({verdict})',
+            'error_kind': verdict,
+            'host_verdict': verdict,
+            'latency': 0.0,
+            'media': None,
+        }
+
+    def _record(self, result):
+        """Contabilidad de progreso compartida + callback de resultados en streaming"""
+        self.checked += 1
+        if result['online']:
+            self.online += 1
+        if self.tuner is not None and result.get('method') != 'host':
+            latency = result.get('latency')
+            if latency is not None and 'freshness' in result:
+                # La pausa deliberada entre las dos lecturas de frescura no es lentitud del host
+                latency = max(0.0, latency - (result['freshness'].get('waited') or 0.0))
+            self.tuner.record(latency, ok=result.get('error_kind') not in TRANSIENT_ERROR_KINDS,
+                              blocked=result.get('http_status') in BLOCK_STATUSES)
+            if self.tuner.ready():
+                self._limiter.set_limit(self.tuner.adjust())
+        if self.on_result:
+            try:
+                self.on_result(result, self.checked, self.total)
+            except Exception as e:
+                print(f"\n⚠️ Error en callback de verificación: {e}")
+
+    async def check_stream(self, session, stream):
+        """Verifica un stream: sonda HLS nativa para .m3u8; HEAD/GET parcial y ffprobe para el resto"""
+        url = stream['url']
+        started = time.monotonic()
+        result = {
+            'url': url,
+            'name': stream.get('name', ''),
+            'online': False,
+            'http_status': None,
+            'method': None,
+            'error': None,
+            'latency': None,
+            'media': None,
+            'error_kind': None,
+        }
+
+        if is_hls_url(url):
+            # La sonda HLS es concluyente por sí sola: nunca hace falta ffprobe
+            probe = await probe_hls(session, url, sniff=self.sniff)
+            result.update({
+                'online': probe['status'] == 'online',
+                'http_status': probe['http_status'],
+                'method': 'hls',
+                'error': probe['error'],
+                'error_kind': probe.get('error_kind'),
+                'media': probe['media'],
+                'hls': probe,
+            })
+            if result['online'] and self.needs_deep_probe(result):
+                await self.check_ffprobe(url, result)
+            result['latency'] = round(time.monotonic() - started, 3)
+            return result
+
+        try:
+            async with session.head(url, allow_redirects=True) as response:
+                result['http_status'] = response.status
+                if response.status in (200, 206):
+                    result['online'] = True
+                    result['method'] = 'head'
+
+            # Muchos orígenes rechazan HEAD (403/405): probar un GET de pocos bytes
+            if not result['online']:
+                async with session.get(url, headers={'Range': 'bytes=0-1023'}, allow_redirects=True) as response:
+                    result['http_status'] = response.status
+                    if response.status in (200, 206):
+                        await response.content.read(1024)
+                        result['online'] = True
+                        result['method'] = 'get'
+
+        except asyncio.TimeoutError:
+            result['error'] = 'timeout'
+            result['error_kind'] = 'timeout'
+        except aiohttp.ClientError as e:
+            result['error'] = type(e).__name__
+            result['error_kind'] = classify_network_error(e)
+        except Exception as e:
+            result['error'] = str(e)[:80]
+            result['error_kind'] = classify_network_error(e)
+
+        if result['online'] and self.sniff:
+            result['media'] = (await probe_media(session, url))['media']
+
+        # ffprobe no arregla un DNS caído ni una conexión rechazada: solo se usa si el host respondió
+        host_failed = result['error_kind'] in HOST_ERROR_KINDS
+        if (not result['online'] and self.use_ffprobe and not host_failed) or (result['online'] and self.needs_deep_probe(result)):
+            await self.check_ffprobe(url, result)
+
+        result['latency'] = round(time.monotonic() - started, 3)
+        return result
+
+    def needs_deep_probe(self, result):
+        """ffprobe solo cuando se pidió y el sniffer no sacó la resolución"""
+        media = result.get('media')
+        return self.deep_probe and self.use_ffprobe and not (media and (media['width'] or media['audio_codec']))
+
+    async def check_stream_freshness(self, session, stream, limiter=None):
+        """Frescura del live edge: online solo si el media sequence avanzó entre dos lecturas"""
+        freshness = await check_freshness(session, stream['url'], max_wait=self.freshness_max_wait, limiter=limiter)
+        return {
+            'url': stream['url'],
+            'name': stream.get('name', ''),
+            'online': freshness['status'] == 'live',
+            'http_status': freshness['http_status'],
+            'method': 'freshness',
+            'error': freshness['error'],
+            'error_kind': freshness['error_kind'],
+            'latency': freshness['latency'],
+            'freshness': freshness,
+        }
+
+    async def check_ffprobe(self, url, result):
+        """ffprobe en el pool acotado; vuelca codec/resolución/bitrate en result['media']"""
+        probe = await self.ffprobe.probe(url)
+        if not probe['ok']:
+            return False
+        result['media'] = probe['metadata']
+        if not result['online']:
+            result['online'] = True
+            result['method'] = 'ffprobe'
+        return True
+
+
+def verify_streams_async(streams, max_concurrency=50, per_host_limit=4, timeout=10, on_result=None, freshness=False,
+                         deep_probe=False, sniff=False, host_scouts=2, autotune=False):
+    """Wrapper síncrono: ejecuta StreamVerifier en su propio event loop (autotune: informa del límite final)"""
+    verifier = StreamVerifier(
+        max_concurrency=max_concurrency,
+        per_host_limit=per_host_limit,
+        timeout=timeout,
+        on_result=on_result,
+        freshness=freshness,
+        deep_probe=deep_probe,
+        sniff=sniff,
+        host_scouts=host_scouts,
+        autotune=autotune,
+    )
+    results = run_sync(verifier.verify(streams))
+    if verifier.tuner is not None:
+        print(f"\n🎛️ Concurrencia auto-ajustada: {verifier.tuner.describe()}")
+    return results
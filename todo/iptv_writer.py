@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+✍️ IPTV WRITER - Escritura incremental de playlists M3U
+Cada canal se escribe en cuanto se resuelve, en un segmento temporal por
+sección (fuente), a través de un archivo con buffer. Al terminar, los
+segmentos se concatenan en orden con sus cabeceras de sección y el M3U
+final aparece de golpe con un rename atómico. Si el proceso muere a mitad,
+recover() monta la playlist con lo que ya estaba en disco
+"""
+
+import glob
+import json
+import os
+import shutil
+from datetime import datetime
+
+SECTIONS_FILE = 'sections.json'
+
+
+def default_header(total):
+    return (
+        "#EXTM3U\n"
+        f"# Generado por IPTV Extractor Definitivo - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        f"# Total de canales: {total}\n"
+        "\n"
+    )
+
+
+def default_section_header(section, count):
+    return f"# === {section.upper()} ({count} canales) ===\n"
+
+
+def _count_entries(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return sum(1 for line in f if line.startswith('#EXTINF'))
+
+
+class StreamingM3UWriter:
+    """Playlist que se va escribiendo: add(canal) por canal resuelto, finalize() al acabar
+
+    format_entry(canal) devuelve el texto de la entrada (#EXTINF + URL) o None
+    para omitirla; section_of(canal) decide la sección. Como context manager,
+    finaliza también si el bloque termina con una excepción (mejor una lista
+    parcial que ninguna)
+    """
+
+    def __init__(self, path, format_entry, section_of=None, header=default_header,
+                 section_header=default_section_header, flush_every=1, buffer_size=64 * 1024, resume=True):
+        self.path = path
+        self.parts_dir = f'{path}.parts'
+        self.format_entry = format_entry
+        self.section_of = section_of or (lambda channel: channel.get('source', 'Unknown'))
+        self.header = header
+        self.section_header = section_header
+        self.flush_every = flush_every
+        self.buffer_size = buffer_size
+
+        self.sections = []
+        self.counts = {}
+        self.handles = {}
+        self.count = 0
+        self.finalized = False
+        if not resume:
+            shutil.rmtree(self.parts_dir, ignore_errors=True)
+        os.makedirs(self.parts_dir, exist_ok=True)
+        self._load_sections()
+
+    def _load_sections(self):
+        """Retoma un directorio de segmentos existente (reanudar tras un fallo)"""
+        try:
+            with open(os.path.join(self.parts_dir, SECTIONS_FILE), 'r', encoding='utf-8') as f:
+                self.sections = json.load(f)
+        except (OSError, ValueError):
+            self.sections = []
+        for section in self.sections:
+            part = self._part_path(section)
+            self.counts[section] = _count_entries(part) if os.path.exists(part) else 0
+        self.count = sum(self.counts.values())
+
+    def _save_sections(self):
+        temp_path = os.path.join(self.parts_dir, f'{SECTIONS_FILE}.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.sections, f, ensure_ascii=False)
+        os.replace(temp_path, os.path.join(self.parts_dir, SECTIONS_FILE))
+
+    def _part_path(self, section):
+        return os.path.join(self.parts_dir, f'{self.sections.index(section):04d}.part')
+
+    def _handle(self, section):
+        handle = self.handles.get(section)
+        if handle is None:
+            if section not in self.sections:
+                self.sections.append(section)
+                self.counts[section] = 0
+                self._save_sections()
+            handle = open(self._part_path(section), 'a', encoding='utf-8', buffering=self.buffer_size)
+            self.handles[section] = handle
+        return handle
+
+    def add(self, channel):
+        """Escribe un canal en el segmento de su sección; devuelve False si format_entry lo descartó"""
+        if self.finalized:
+            raise RuntimeError("El M3U ya se finalizó")
+        entry = self.format_entry(channel)
+        if not entry:
+            return False
+        section = self.section_of(channel)
+        handle = self._handle(section)
+        handle.write(entry)
+        self.counts[section] += 1
+        self.count += 1
+        if self.flush_every and self.count % self.flush_every == 0:
+            handle.flush()
+        return True
+
+    def add_many(self, channels):
+        return sum(1 for channel in channels if self.add(channel))
+
+    def _close_handles(self):
+        for handle in self.handles.values():
+            handle.close()
+        self.handles = {}
+
+    def finalize(self):
+        """Concatena cabecera + secciones en <path>.tmp y lo renombra a <path>; None si no hubo canales"""
+        if self.finalized:
+            return self.path if self.count else None
+        self._close_handles()
+        self.finalized = True
+        if not self.count:
+            shutil.rmtree(self.parts_dir, ignore_errors=True)
+            return None
+
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as out:
+            out.write(self.header(self.count))
+            for section in self.sections:
+                if not self.counts.get(section):
+                    continue
+                out.write(self.section_header(section, self.counts[section]))
+                with open(self._part_path(section), 'r', encoding='utf-8') as part:
+                    shutil.copyfileobj(part, out, self.buffer_size)
+                out.write("\n")
+        os.replace(temp_path, self.path)
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        return self.path
+
+    def abort(self):
+        """Descarta los segmentos sin generar nada"""
+        self._close_handles()
+        self.finalized = True
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+
+    @classmethod
+    def recover(cls, path, **kwargs):
+        """Monta <path> con los segmentos que dejó una ejecución interrumpida (None si no hay)"""
+        if not os.path.isdir(f'{path}.parts'):
+            return None
+        return cls(path, format_entry=lambda channel: None, **kwargs).finalize()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.finalize()
+        return False
+
+
+def recover_interrupted(directory='.'):
+    """Publica los M3U que dejaron a medias ejecuciones anteriores en directory; devuelve sus rutas"""
+    recovered = []
+    for parts_dir in sorted(glob.glob(os.path.join(directory, '*.parts'))):
+        path = StreamingM3UWriter.recover(parts_dir[:-len('.parts')])
+        if path:
+            recovered.append(path)
+    return recovered
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Detección de contenedor y resolución de URIs del manifiesto"""
+
+import time
+
+from iptv_hls import TS_PACKET_SIZE, _probe_steps, new_probe_result, parse_playlist, sniff_segment_format
+
+
+def ts_packets(count, garbage=b''):
+    return garbage + (b'\x47' + b'\x00' * (TS_PACKET_SIZE - 1)) * count
+
+
+def test_sniff_ts_with_leading_garbage():
+    assert sniff_segment_format(ts_packets(4)) == 'ts'
+    assert sniff_segment_format(ts_packets(4, garbage=b'\x00' * 17)) == 'ts'
+
+
+def test_sniff_short_text_is_not_ts():
+    # Cuerpo de bloqueo geográfico: la 'G' suelta no es un byte de sincronía
+    assert sniff_segment_format(b'Geo-blocked: this content is not available') is None
+    assert sniff_segment_format(b'G' + b' ' * (TS_PACKET_SIZE - 1)) is None
+    assert sniff_segment_format(ts_packets(1)) is None
+
+
+def test_sniff_html_error_page():
+    assert sniff_segment_format(b'  <html><body>403</body></html>' + b'G' * 400) is None
+    assert sniff_segment_format(b'') is None
+
+
+def test_sniff_fmp4_and_audio():
+    assert sniff_segment_format(b'\x00\x00\x00\x18ftypiso6' + b'\x00' * 16) == 'fmp4'
+    assert sniff_segment_format(b'\x00\x00\x00\x10moof' + b'\x00' * 8) == 'fmp4'
+    assert sniff_segment_format(b'ID3\x04\x00' + b'\x00' * 20) == 'id3'
+    assert sniff_segment_format(b'\xff\xf1\x50\x80' + b'\x00' * 20) == 'aac'
+
+
+MEDIA_PLAYLIST = (
+    '#EXTM3U\n#EXT-X-TARGETDURATION:4\n#EXT-X-MEDIA-SEQUENCE:7\n'
+    '#EXT-X-MAP:URI="init.mp4"\n'
+    '#EXTINF:4.0,\nseg7.ts\n#EXTINF:4.0,\n/abs/seg8.ts\n#EXTINF:4.0,\nhttps://other.example/seg9.ts\n'
+)
+
+
+def test_parse_playlist_resolves_against_redirected_base():
+    playlist = parse_playlist(MEDIA_PLAYLIST, 'https://edge3.cdn.example/tok=abc/live/index.m3u8')
+    assert [segment['url'] for segment in playlist['segments']] == [
+        'https://edge3.cdn.example/tok=abc/live/seg7.ts',
+        'https://edge3.cdn.example/abs/seg8.ts',
+        'https://other.example/seg9.ts',
+    ]
+    assert playlist['init_segment'] == 'https://edge3.cdn.example/tok=abc/live/init.mp4'
+    assert playlist['media_sequence'] == 7
+    assert playlist['target_duration'] == 4.0
+
+
+def test_parse_master_playlist():
+    text = ('#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=2000000,RESOLUTION=1280x720,CODECS="avc1.64001f,mp4a.40.2"\n'
+            'hi/index.m3u8\n#EXT-X-STREAM-INF:BANDWIDTH=800000\nlo/index.m3u8\n')
+    playlist = parse_playlist(text, 'http://origin.example/ch/master.m3u8')
+    assert playlist['is_master']
+    assert [variant['url'] for variant in playlist['variants']] == [
+        'http://origin.example/ch/hi/index.m3u8', 'http://origin.example/ch/lo/index.m3u8']
+    assert playlist['variants'][0]['codecs'] == 'avc1.64001f,mp4a.40.2'
+
+
+def test_parse_playlist_without_header_is_invalid():
+    assert not parse_playlist('<html>404</html>', 'http://x/')['valid']
+
+
+def test_probe_steps_follow_the_final_url():
+    """El segmento se pide a la URL tras la redirección, no a la original"""
+    result = new_probe_result('http://portal.example/ch.m3u8')
+    steps = _probe_steps(result, time.monotonic(), 4096, 2)
+
+    assert next(steps)[0] == 'http://portal.example/ch.m3u8'
+    request = steps.send((200, MEDIA_PLAYLIST.encode(), 'https://edge3.cdn.example/tok=abc/live/index.m3u8'))
+    assert request[0] == 'https://edge3.cdn.example/tok=abc/live/seg7.ts'
+    try:
+        steps.send((206, ts_packets(8), request[0]))
+    except StopIteration:
+        pass
+    assert result['status'] == 'online'
+    assert result['segment_format'] == 'ts'
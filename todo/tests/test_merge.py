@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Deduplicación de PlaylistMerger por canal y URL canónica"""
+
+from iptv_merge import PlaylistMerger, canonical_url, channel_key
+
+
+def write_m3u(path, entries):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('#EXTM3U\n')
+        for name, url in entries:
+            f.write(f'#EXTINF:-1 group-title="Deportes",{name}\n{url}\n')
+    return str(path)
+
+
+def merged_urls(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def test_channel_key_ignores_tags_quality_and_probed_media():
+    assert channel_key('ESPN 2 HD [tvplusgratis2]') == 'espn2'
+    assert channel_key('ESPN 2 (Opción 2) [x] 1080p H264 AAC') == 'espn2'
+    assert channel_key('Telemundo Puerto Rico') == 'telemundopuertorico'
+
+
+def test_canonical_url():
+    assert canonical_url('HTTP://Example.COM:80/live/a.m3u8?b=2&a=1#x') == 'http://example.com/live/a.m3u8?a=1&b=2'
+    assert canonical_url('https://example.com:8443/a') == 'https://example.com:8443/a'
+
+
+def test_merge_dedupes_within_channel(tmp_path):
+    first = write_m3u(tmp_path / 'a.m3u', [
+        ('ESPN [s1]', 'http://cdn.example/espn.m3u8?a=1&b=2'),
+        ('Fox Sports [s1]', 'http://cdn.example/fox.m3u8'),
+    ])
+    second = write_m3u(tmp_path / 'b.m3u', [
+        ('ESPN HD [s2]', 'HTTP://CDN.example:80/espn.m3u8?b=2&a=1'),
+        ('ESPN [s2]', 'http://backup.example/espn.m3u8'),
+        ('Fox Sports [s2]', 'http://cdn.example/fox.m3u8'),
+        ('Otro canal', 'http://cdn.example/fox.m3u8'),
+    ])
+    output = tmp_path / 'merged.m3u'
+
+    merger = PlaylistMerger()
+    assert merger.merge([first, second], str(output)) is not None
+
+    urls = merged_urls(output)
+    assert urls.count('http://cdn.example/fox.m3u8') == 2  # mismo URL en otro canal se conserva
+    assert 'http://cdn.example/espn.m3u8?a=1&b=2' in urls
+    assert 'http://backup.example/espn.m3u8' in urls
+    assert len(urls) == 4
+    assert merger.stats['duplicates'] == 2
+    assert merger.stats['channels'] == 3
+
+
+def test_merge_global_urls_and_max_alternates(tmp_path):
+    source = write_m3u(tmp_path / 'a.m3u', [
+        ('ESPN', 'http://a.example/1.m3u8'),
+        ('ESPN', 'http://a.example/2.m3u8'),
+        ('ESPN', 'http://a.example/3.m3u8'),
+        ('Otro canal', 'http://a.example/1.m3u8'),
+    ])
+    output = tmp_path / 'merged.m3u'
+
+    merger = PlaylistMerger(global_urls=True, max_alternates=2)
+    merger.merge([source], str(output))
+
+    assert merged_urls(output) == ['http://a.example/1.m3u8', 'http://a.example/2.m3u8']
+    assert merger.stats['duplicates'] == 1
+    assert merger.stats['dropped_alternates'] == 1
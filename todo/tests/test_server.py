@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Cabeceras Range y Accept-Encoding del servidor de playlists"""
+
+import pytest
+
+from iptv_server import accepts_gzip, parse_range
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=100-', (100, 999)),
+    ('bytes=-200', (800, 999)),
+    ('bytes=-5000', (0, 999)),
+    ('bytes=900-5000', (900, 999)),
+    (None, None),
+    ('', None),
+    ('bytes=-', None),
+    ('bytes=0-10,20-30', None),
+    ('items=0-10', None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=50-10', 'bytes=-0'])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, deflate, br', True),
+    ('GZIP', True),
+    ('deflate;q=1.0, gzip;q=0.5', True),
+    ('gzip;q=0', False),
+    ('gzip;q=0.000', False),
+    ('gzip;q=abc', False),
+    ('*', True),
+    ('*;q=0', False),
+    ('gzip;q=0, *', False),
+    ('x-gzip', True),
+    ('identity', False),
+    ('', False),
+    (None, False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
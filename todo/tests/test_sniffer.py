@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Parser de SPS H.264 con SPS sintéticas (Exp-Golomb escrito a mano)"""
+
+from iptv_sniffer import parse_h264_sps
+
+
+def u(value, bits):
+    return format(value, f'0{bits}b')
+
+
+def ue(value):
+    code = format(value + 1, 'b')
+    return '0' * (len(code) - 1) + code
+
+
+def sps_nal(bits):
+    """Cabecera NAL tipo 7 + RBSP con bit de parada y prevención de emulación"""
+    bits += '1'
+    bits += '0' * (-len(bits) % 8)
+    payload = bytes(int(bits[i:i + 8], 2) for i in range(0, len(bits), 8))
+    escaped = bytearray()
+    zeros = 0
+    for byte in payload:
+        if zeros >= 2 and byte <= 3:
+            escaped.append(3)
+            zeros = 0
+        escaped.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return b'\x67' + bytes(escaped)
+
+
+def test_baseline_720p():
+    bits = (u(66, 8) + u(0, 8) + u(31, 8) + ue(0)
+            + ue(0) + ue(2)          # log2_max_frame_num_minus4, pic_order_cnt_type
+            + ue(1) + '0'            # max_num_ref_frames, gaps
+            + ue(79) + ue(44)        # 80×45 macrobloques
+            + '1' + '1' + '0' + '0')  # frame_mbs_only, direct_8x8, sin cropping, sin VUI
+    assert parse_h264_sps(sps_nal(bits)) == {'profile': 'Baseline', 'level': '3.1', 'width': 1280, 'height': 720}
+
+
+def test_high_1080p_with_cropping():
+    bits = (u(100, 8) + u(0, 8) + u(40, 8) + ue(0)
+            + ue(1) + ue(0) + ue(0) + '0' + '0'  # chroma 4:2:0, bit depths, bypass, sin scaling matrix
+            + ue(0) + ue(0) + ue(2)              # log2_max_frame_num, poc tipo 0 + log2_max_poc_lsb
+            + ue(4) + '0'
+            + ue(119) + ue(67)                   # 1920×1088
+            + '1' + '1'
+            + '1' + ue(0) + ue(0) + ue(0) + ue(4)  # cropping: 8 líneas abajo
+            + '0')
+    assert parse_h264_sps(sps_nal(bits)) == {'profile': 'High', 'level': '4.0', 'width': 1920, 'height': 1080}
+
+
+def test_interlaced_height_doubles_map_units():
+    bits = (u(77, 8) + u(0, 8) + u(30, 8) + ue(0)
+            + ue(0) + ue(2) + ue(1) + '0'
+            + ue(44) + ue(17)        # 720×(2×18×16)
+            + '0' + '0' + '1'        # campos: mb_adaptive, direct_8x8
+            + '1' + ue(0) + ue(0) + ue(0) + ue(0)
+            + '0')
+    assert parse_h264_sps(sps_nal(bits)) == {'profile': 'Main', 'level': '3.0', 'width': 720, 'height': 576}